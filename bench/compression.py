@@ -0,0 +1,94 @@
+import argparse
+import json
+import os
+import random
+import time
+import zlib
+
+# Sama dengan server/protocol.py
+COMPRESS_MIN = 512
+
+WORDS = ("halo apa kabar semua orang sudah makan belum nanti sore kita rapat "
+         "di kampus tolong kirim file tugas kemarin ya terima kasih banyak "
+         "oke siap besok pagi jam delapan jangan lupa bawa laptop").split()
+
+
+def chat_frame(rng, size):
+    text = " ".join(rng.choice(WORDS) for _ in range(size // 5))[:size]
+    return f"2026-01-01 10:00:00|user{rng.randint(1, 500)}|{text}".encode()
+
+
+def payloads(rng):
+    # Contoh body frame yang benar-benar lewat di server
+    source = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          "..", "server", "server.py")
+    with open(source, "rb") as f:
+        text_file = f.read()
+    return {
+        "chat 80B": [chat_frame(rng, 80) for _ in range(200)],
+        "chat 600B": [chat_frame(rng, 600) for _ in range(200)],
+        "chat 4KB": [chat_frame(rng, 4096) for _ in range(100)],
+        "user list 500": [("[USER_LIST] " + ",".join(
+            f"user{i}" for i in range(500))).encode()],
+        "file info": [json.dumps({
+            "hash": os.urandom(32).hex(), "name": "laporan.txt",
+            "size": 12345, "sender": "user1", "private": False,
+        }).encode()],
+        "text file 64KB": [text_file[i:i + 65536]
+                           for i in range(0, len(text_file), 65536)],
+        "random 64KB": [rng.randbytes(65536) for _ in range(20)],
+    }
+
+
+def measure(bodies, level, repeat):
+    raw = sum(len(b) for b in bodies)
+    sent = 0
+    started = time.process_time()
+    for _ in range(repeat):
+        sent = 0
+        for body in bodies:
+            if len(body) < COMPRESS_MIN:
+                sent += len(body)
+                continue
+            packed = zlib.compress(body, level)
+            sent += min(len(packed), len(body))
+    cpu = (time.process_time() - started) / repeat
+    return {
+        "raw_bytes": raw,
+        "sent_bytes": sent,
+        "saved_pct": round((raw - sent) / raw * 100, 1),
+        "cpu_us_per_frame": round(cpu / len(bodies) * 1e6, 2),
+        "cpu_us_per_kb_saved": (round(cpu * 1e6 / ((raw - sent) / 1024), 2)
+                                if raw > sent else None),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Ukur byte yang dihemat vs CPU untuk kompresi frame")
+    parser.add_argument("--levels", default="1,6,9")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="simpan hasil ke file JSON")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    levels = [int(level) for level in args.levels.split(",")]
+    report = {}
+    print(f"{'payload':<16}{'level':>6}{'hemat %':>9}"
+          f"{'us/frame':>10}{'us/KB hemat':>13}")
+    for name, bodies in payloads(rng).items():
+        for level in levels:
+            result = measure(bodies, level, args.repeat)
+            report[f"{name} L{level}"] = result
+            per_kb = result["cpu_us_per_kb_saved"]
+            print(f"{name:<16}{level:>6}{result['saved_pct']:>9}"
+                  f"{result['cpu_us_per_frame']:>10}"
+                  f"{per_kb if per_kb is not None else '-':>13}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
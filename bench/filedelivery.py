@@ -0,0 +1,114 @@
+import argparse
+import asyncio
+import os
+import time
+
+from loadgen import HEADER, spawn_server, process_usage
+
+FILE = 3
+READ_SIZE = 256 * 1024
+
+
+async def connect(port, nickname):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    await reader.readexactly(4)  # NICK
+    writer.write(nickname.encode('utf-8'))
+    await writer.drain()
+    return reader, writer
+
+
+async def receive_files(reader, done):
+    # Body file dibaca per potongan lalu dibuang; done menerima ukurannya
+    while True:
+        msg_type, length = HEADER.unpack(
+            await reader.readexactly(HEADER.size))
+        remaining = length
+        while remaining:
+            remaining -= len(await reader.read(min(remaining, READ_SIZE)))
+        if msg_type == FILE:
+            done.put_nowait(length)
+
+
+async def sample_rss(pid, peak, stop):
+    while not stop.is_set():
+        rss, _ = process_usage(pid)
+        if rss:
+            peak[0] = max(peak[0], rss)
+        await asyncio.sleep(0.02)
+
+
+async def run(args, pid):
+    done = asyncio.Queue()
+    receivers = []
+    for i in range(args.receivers):
+        reader, writer = await connect(args.port, f"recv{i}")
+        receivers.append(writer)
+        asyncio.create_task(receive_files(reader, done))
+    # pengirim ikut menerima file-nya sendiri (anggota room yang sama) dan
+    # harus dibaca juga, kalau tidak server berhenti membaca upload-nya
+    # selama sendfile ke pengirim belum selesai
+    reader, sender = await connect(args.port, "sender")
+    asyncio.create_task(receive_files(reader, asyncio.Queue()))
+    await asyncio.sleep(0.5)
+    rows = []
+    for size_mb in args.sizes:
+        data = os.urandom(int(size_mb * 1024 * 1024))
+        body = b"bench.bin|" + data
+        base_rss, cpu_before = process_usage(pid)
+        peak = [base_rss or 0]
+        stop = asyncio.Event()
+        sampler = asyncio.create_task(sample_rss(pid, peak, stop))
+        started = time.perf_counter()
+        sender.writelines((HEADER.pack(FILE, len(body)), body))
+        await sender.drain()
+        for _ in range(args.receivers):
+            await done.get()
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await sampler
+        _, cpu_after = process_usage(pid)
+        rows.append((size_mb, elapsed, peak[0] - (base_rss or 0),
+                     (cpu_after - cpu_before) if cpu_before is not None
+                     else None))
+        # beri waktu token bucket byte server terisi lagi
+        await asyncio.sleep(len(data) / (8 * 1024 * 1024))
+    for writer in receivers + [sender]:
+        writer.close()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="RSS/CPU server saat satu file (tipe 3) dikirim ke "
+                    "banyak penerima, per ukuran file")
+    parser.add_argument("--port", type=int, default=65432)
+    parser.add_argument("--spawn", choices=("thread", "async"),
+                        help="jalankan server lokal sendiri")
+    parser.add_argument("--pid", type=int, help="pid server untuk RSS/CPU")
+    parser.add_argument("--receivers", type=int, default=20)
+    parser.add_argument("--sizes", default="1,4,12",
+                        help="ukuran file dalam MB, dipisah koma (di bawah "
+                             "16, batas frame tipe 3)")
+    args = parser.parse_args()
+    args.sizes = [float(s) for s in args.sizes.split(",")]
+    if max(args.sizes) >= 16:
+        parser.error("--sizes harus di bawah 16 MB")
+
+    proc = None
+    pid = args.pid
+    if args.spawn:
+        proc = spawn_server(args.spawn, args.port)
+        pid = proc.pid
+    try:
+        rows = asyncio.run(run(args, pid))
+    finally:
+        if proc is not None:
+            proc.kill()
+    print(f"{'MB':>6} {'detik':>8} {'RSS naik KB':>12} {'CPU ms':>8}")
+    for size_mb, elapsed, rss_kb, cpu in rows:
+        cpu_ms = f"{cpu * 1000:.0f}" if cpu is not None else "-"
+        print(f"{size_mb:>6g} {elapsed:>8.3f} {rss_kb:>12} {cpu_ms:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+HEADER = struct.Struct("!II")
+FILE_START = 6
+FILE_CHUNK = 7
+FILE_END = 8
+CHUNK_SIZE = 64 * 1024
+
+SERVERS = {
+    "thread": "server.py",
+    "async": "async_server.py",
+    "cluster": "cluster.py",
+}
+
+
+class Stats:
+    def __init__(self):
+        self.connect_ms = []
+        self.latency_ms = []
+        self.sent = {}
+        self.received = {}
+        self.bytes_out = 0
+        self.bytes_in = 0
+        self.errors = 0
+
+    def count_sent(self, msg_type, size):
+        self.sent[msg_type] = self.sent.get(msg_type, 0) + 1
+        self.bytes_out += HEADER.size + size
+
+    def count_received(self, msg_type, size):
+        self.received[msg_type] = self.received.get(msg_type, 0) + 1
+        self.bytes_in += HEADER.size + size
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def process_usage(pid):
+    # (RSS dalam KB, waktu CPU dalam detik) dari /proc, hanya di linux.
+    # Proses anak langsung ikut dijumlah (worker mode cluster).
+    try:
+        rss = cpu = 0
+        for p in [pid] + child_pids(pid):
+            with open(f"/proc/{p}/status") as f:
+                rss += next(int(line.split()[1]) for line in f
+                            if line.startswith("VmRSS:"))
+            with open(f"/proc/{p}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            cpu += (int(fields[11]) + int(fields[12])) / os.sysconf(
+                "SC_CLK_TCK")
+        return rss, cpu
+    except (OSError, StopIteration, ValueError):
+        return None, None
+
+
+def child_pids(pid):
+    pids = []
+    for name in os.listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{name}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            pids.append(int(name))
+    return pids
+
+
+class User:
+    # Satu user simulasi yang bicara dengan protokol asli server
+    def __init__(self, index, args, run_id, stats):
+        self.nickname = f"bench{index}"
+        self.args = args
+        self.run_id = run_id
+        self.stats = stats
+        self.rng = random.Random(args.seed * 100003 + index)
+        self.ready = asyncio.Event()
+        self.transfer_id = 0
+
+    async def connect(self):
+        started = time.perf_counter()
+        self.reader, self.writer = await asyncio.open_connection(
+            self.args.host, self.args.port)
+        await self.reader.readexactly(4)  # "NICK"
+        # presence sebagai delta seperti client baru, bukan snapshot penuh
+        self.writer.write(self.nickname.encode('utf-8') + b'\n{"delta": 1}')
+        self.listener = asyncio.create_task(self.listen())
+        # Dianggap tersambung setelah frame pertama (daftar user) datang
+        await self.ready.wait()
+        self.stats.connect_ms.append((time.perf_counter() - started) * 1000)
+
+    async def listen(self):
+        marker = f"|bench {self.run_id} ".encode('utf-8')
+        try:
+            while True:
+                msg_type, length = HEADER.unpack(
+                    await self.reader.readexactly(HEADER.size))
+                data = await self.reader.readexactly(length)
+                received_at = time.perf_counter_ns()
+                self.stats.count_received(msg_type, length)
+                self.ready.set()
+                if msg_type not in (1, 2):
+                    continue
+                pos = data.find(marker)
+                if pos < 0:
+                    continue
+                sent_at = int(data[pos + len(marker):].split(b" ", 1)[0])
+                self.stats.latency_ms.append((received_at - sent_at) / 1e6)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+
+    def send(self, msg_type, payload):
+        self.writer.write(HEADER.pack(msg_type, len(payload)))
+        self.writer.write(payload)
+        self.stats.count_sent(msg_type, len(payload))
+
+    def text(self):
+        body = f"bench {self.run_id} {time.perf_counter_ns()} "
+        padding = max(0, self.args.message_size - len(body))
+        return body + "x" * padding
+
+    async def upload(self):
+        self.transfer_id += 1
+        size = self.args.file_size
+        self.send(FILE_START, json.dumps({
+            "id": self.transfer_id, "name": f"{self.nickname}.bin",
+            "size": size,
+        }).encode('utf-8'))
+        chunk = self.rng.randbytes(min(size, CHUNK_SIZE))
+        sent = 0
+        while sent < size:
+            part = chunk[:size - sent]
+            self.send(FILE_CHUNK, struct.pack("!I", self.transfer_id) + part)
+            sent += len(part)
+            await self.writer.drain()
+        self.send(FILE_END, struct.pack("!IB", self.transfer_id, 0))
+
+    async def run(self, users, deadline):
+        rate = self.args.rate
+        while time.perf_counter() < deadline:
+            await asyncio.sleep(self.rng.expovariate(rate) if rate else 1)
+            roll = self.rng.random()
+            if roll < self.args.file_ratio:
+                await self.upload()
+            elif roll < self.args.file_ratio + self.args.pm_ratio:
+                target = self.rng.choice(users).nickname
+                self.send(2, f"{target} {self.text()}".encode('utf-8'))
+            else:
+                self.send(1, self.text().encode('utf-8'))
+            await self.writer.drain()
+
+    def close(self):
+        self.listener.cancel()
+        self.writer.close()
+
+
+async def run_benchmark(args, pid):
+    stats = Stats()
+    run_id = f"{args.seed}-{os.getpid()}"
+    users = [User(i, args, run_id, stats) for i in range(args.users)]
+    setup_started = time.perf_counter()
+    for i in range(0, len(users), args.connect_batch):
+        await asyncio.gather(*(u.connect()
+                               for u in users[i:i + args.connect_batch]))
+    setup_s = time.perf_counter() - setup_started
+
+    rss_before, cpu_before = process_usage(pid) if pid else (None, None)
+    started = time.perf_counter()
+    deadline = started + args.duration
+    await asyncio.gather(*(u.run(users, deadline) for u in users))
+    await asyncio.sleep(args.drain)  # tunggu pesan yang masih di jalan
+    elapsed = time.perf_counter() - started
+    rss_after, cpu_after = process_usage(pid) if pid else (None, None)
+    for u in users:
+        u.close()
+
+    report = {
+        "users": args.users,
+        "duration_s": round(elapsed, 3),
+        "setup_s": round(setup_s, 3),
+        "connect_ms": {p: round(percentile(stats.connect_ms, p), 3)
+                       for p in (50, 99, 99.9)},
+        "latency_ms": {p: round(percentile(stats.latency_ms, p), 3)
+                       for p in (50, 99, 99.9)},
+        "sent": stats.sent,
+        "received": stats.received,
+        "msgs_out_per_s": round(sum(stats.sent.values()) / elapsed, 1),
+        "msgs_in_per_s": round(sum(stats.received.values()) / elapsed, 1),
+        "bytes_out": stats.bytes_out,
+        "bytes_in": stats.bytes_in,
+        "server_rss_kb": rss_after,
+        "server_rss_growth_kb": (rss_after - rss_before
+                                 if rss_after and rss_before else None),
+        "server_cpu_pct": (round((cpu_after - cpu_before) / elapsed * 100, 1)
+                           if cpu_after is not None and cpu_before is not None
+                           else None),
+    }
+    return report
+
+
+def spawn_server(kind, port, workers=None):
+    # Server dijalankan di direktori sementara supaya history, log dan
+    # received_files dari run sebelumnya tidak ikut terukur
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          "..", "server", SERVERS[kind])
+    workdir = tempfile.mkdtemp(prefix="chatbench-")
+    env = dict(os.environ)
+    if workers:
+        env["CHAT_WORKERS"] = str(workers)
+    proc = subprocess.Popen(
+        [sys.executable, os.path.abspath(script)], cwd=workdir, env=env,
+        stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL, text=True)
+    proc.stdin.write(f"127.0.0.1\n{port}\n")
+    proc.stdin.flush()
+    time.sleep(1)
+    return proc
+
+
+def print_report(report):
+    print(f"users            : {report['users']}")
+    print(f"durasi           : {report['duration_s']} s "
+          f"(setup {report['setup_s']} s)")
+    c = report["connect_ms"]
+    print(f"connect ms       : p50 {c[50]}  p99 {c[99]}  p999 {c[99.9]}")
+    lat = report["latency_ms"]
+    print(f"latency ms       : p50 {lat[50]}  p99 {lat[99]}  p999 {lat[99.9]}")
+    print(f"pesan keluar/s   : {report['msgs_out_per_s']}")
+    print(f"pesan masuk/s    : {report['msgs_in_per_s']}")
+    print(f"bytes keluar/masuk: {report['bytes_out']} / {report['bytes_in']}")
+    print(f"server rss KB    : {report['server_rss_kb']} "
+          f"(naik {report['server_rss_growth_kb']})")
+    print(f"server cpu %     : {report['server_cpu_pct']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Load generator headless untuk ChatServer")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=65432)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--rate", type=float, default=1.0,
+                        help="pesan per detik per user")
+    parser.add_argument("--message-size", type=int, default=64)
+    parser.add_argument("--pm-ratio", type=float, default=0.1)
+    parser.add_argument("--file-ratio", type=float, default=0.0)
+    parser.add_argument("--file-size", type=int, default=256 * 1024)
+    parser.add_argument("--connect-batch", type=int, default=50)
+    parser.add_argument("--drain", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--spawn", choices=sorted(SERVERS),
+                        help="jalankan server lokal sendiri")
+    parser.add_argument("--workers", type=int,
+                        help="jumlah worker untuk --spawn cluster")
+    parser.add_argument("--pid", type=int,
+                        help="pid server untuk mengukur RSS/CPU")
+    parser.add_argument("--json", help="simpan hasil ke file JSON")
+    args = parser.parse_args()
+
+    proc = (spawn_server(args.spawn, args.port, args.workers)
+            if args.spawn else None)
+    pid = proc.pid if proc else args.pid
+    try:
+        report = asyncio.run(run_benchmark(args, pid))
+    finally:
+        if proc:
+            proc.kill()
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+import argparse
+import os
+import sys
+import timeit
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "server"))
+
+from protocol import (HEADER, V2_HEADER, make_message, parse_v2_header,  # noqa: E402
+                      format_timestamp)
+
+TEXT = "halo apa kabar semua, nanti sore jadi rapat di kampus? " * 2
+
+
+def encode_v1(sender, text):
+    # Cara lama: strftime per pesan lalu body "timestamp|sender|text"
+    from datetime import datetime
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    body = f"{timestamp}|{sender}|{text}".encode('utf-8')
+    return HEADER.pack(1, len(body)), body
+
+
+def encode_v2(sender, text):
+    return make_message(1, sender, text).v2()
+
+
+def decode_v1(frame):
+    header, body = frame
+    HEADER.unpack(header)
+    timestamp, sender, text = str(body, 'utf-8').split("|", 2)
+    return timestamp, sender, text
+
+
+def decode_v2(frame):
+    header, names, body = frame
+    _, _, timestamp, sender_len, _, _ = parse_v2_header(header)
+    return (format_timestamp(timestamp), bytes(names[:sender_len]).decode(),
+            str(body, 'utf-8'))
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Biaya encode/decode satu pesan chat, protokol v1 vs v2")
+    parser.add_argument("--number", type=int, default=100000)
+    args = parser.parse_args()
+
+    v1 = encode_v1("user42", TEXT)
+    v2 = encode_v2("user42", TEXT)
+    print(f"ukuran frame     : v1 {sum(map(len, v1))} byte, "
+          f"v2 {sum(map(len, v2))} byte (header v2 {V2_HEADER.size} byte)")
+    cases = [
+        ("encode v1", lambda: encode_v1("user42", TEXT)),
+        ("encode v2", lambda: encode_v2("user42", TEXT)),
+        ("decode v1", lambda: decode_v1(v1)),
+        ("decode v2", lambda: decode_v2(v2)),
+    ]
+    for name, func in cases:
+        best = min(timeit.repeat(func, number=args.number, repeat=3))
+        print(f"{name:<17}: {best / args.number * 1e6:.2f} us/pesan")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,395 @@
+import argparse
+import asyncio
+import heapq
+import json
+import os
+import re
+import sys
+import time
+from collections import deque
+
+from loadgen import SERVERS, spawn_server, process_usage, percentile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "server"))
+
+from protocol import (HEADER, V2_HEADER, VERSION_2, COMPRESSED,  # noqa: E402
+                      parse_v2_header, inflate, PING, PONG, FILE_GET,
+                      FILE_DATA, ROOM_JOIN)
+from capture import read_trace, OPEN, FRAME, CLOSE, REDACTED  # noqa: E402
+
+TYPE_NAMES = {1: "text", 2: "pm", 3: "file", 4: "file-pm", 5: "control",
+              6: "file-start", 7: "file-chunk", 8: "file-end",
+              9: "file-info", 10: "file-get", 11: "file-data",
+              12: "room-join", 13: "room-leave", 14: "file-offset",
+              15: "ping", 16: "pong"}
+FILLER = b"x"
+READ_SIZE = 256 * 1024
+# Body sebesar ini dibaca utuh untuk dicari marker-nya, yang lebih besar
+# dibuang per potongan
+INSPECT_MAX = 64 * 1024
+DIGEST_SIZE = 32
+
+
+def merged_records(paths):
+    # Semua trace digabung menurut waktu absolut (detik sejak trace paling
+    # awal); id koneksi dibedakan per file karena tiap worker cluster
+    # menulis trace sendiri
+    traces = [read_trace(path) for path in paths]
+    base = min(started for started, _, _ in traces)
+
+    def timed(index, started, records):
+        offset = started - base
+        for record in records:
+            yield offset + record.time_us / 1_000_000, index, record
+
+    redacted = any(flags & REDACTED for _, flags, _ in traces)
+    return redacted, heapq.merge(
+        *(timed(i, started, records)
+          for i, (started, _, records) in enumerate(traces)),
+        key=lambda item: item[0])
+
+
+class Stats:
+    def __init__(self):
+        self.sent = {}      # msg_type -> [frame, byte]
+        self.received = {}
+        self.latency = {}   # msg_type yang dikirim -> [detik]
+        self.connections = 0
+        self.errors = 0
+        self.last_received = None
+
+    def count(self, table, msg_type, size):
+        entry = table.setdefault(msg_type, [0, 0])
+        entry[0] += 1
+        entry[1] += size
+
+    def sample(self, msg_type, seconds):
+        self.latency.setdefault(msg_type, []).append(seconds)
+
+
+class Connection:
+    def __init__(self, nickname, reader, writer, version):
+        self.nickname = nickname
+        self.reader = reader
+        self.writer = writer
+        self.version = version
+        self.opened_at = time.perf_counter()
+        self.pings = deque()  # waktu kirim PING, dijawab PONG berurutan
+        self.gets = {}        # hash FILE_GET -> waktu kirim
+        self.markers = set()  # marker pesan sendiri yang belum kembali
+        self.closing = False
+
+    def waiting(self):
+        return bool(self.markers or self.pings or self.gets)
+
+
+class Replayer:
+    # Memutar record trace ke server: OPEN membuka koneksi dengan
+    # handshake yang sama, FRAME dikirim ulang sebagai frame v1/v2 sesuai
+    # protokol koneksinya, CLOSE menutupnya. Latency diukur dari marker
+    # yang disisipkan ke pesan text/PM, PING -> PONG dan FILE_GET ->
+    # FILE_DATA.
+    def __init__(self, host, port, stats, defer_close=False):
+        self.host = host
+        self.port = port
+        self.stats = stats
+        self.conns = {}  # (indeks trace, id koneksi) -> Connection
+        # Kecepatan maksimal: CLOSE bisa datang sebelum balasan frame
+        # terakhir koneksi itu (pesannya sendiri, PONG, FILE_DATA) sampai.
+        # Koneksinya ditutup setelah semuanya diterima, paling lambat saat
+        # close_all.
+        self.defer_close = defer_close
+        self.closing = set()
+        self.tasks = []
+        # marker unik per run supaya pesan run sebelumnya di history server
+        # tidak ikut terhitung
+        self.run_id = os.urandom(3).hex().encode()
+        self.marker = re.compile(rb"\[r" + self.run_id + rb"-(\d+)\]")
+        self.next_marker = 0
+        self.sent_at = {}  # nomor marker -> (msg_type, waktu kirim)
+
+    async def open(self, key, record):
+        for conn in list(self.closing):
+            # nickname yang sama tersambung lagi: yang lama harus lepas dulu
+            if conn.nickname == record.target:
+                self.finish_close(conn)
+        options = json.loads(record.body)
+        rooms = options.pop("rooms", [])
+        try:
+            reader, writer = await asyncio.open_connection(self.host,
+                                                           self.port)
+            await reader.readexactly(4)  # NICK
+            writer.write(record.target + b"\n" +
+                         json.dumps(options).encode('utf-8'))
+            # tunggu [CAPS] (selalu ada karena opsi resume): frame pertama
+            # tidak boleh terbaca bersama handshake
+            msg_type, length = HEADER.unpack(
+                await reader.readexactly(HEADER.size))
+            body = await reader.readexactly(length)
+        except (OSError, asyncio.IncompleteReadError):
+            self.stats.errors += 1
+            return
+        if not body.startswith(b"[CAPS]"):
+            # nickname masih dipakai, dsb.
+            self.stats.errors += 1
+            writer.close()
+            return
+        version = VERSION_2 if options.get("proto") == VERSION_2 else 1
+        conn = self.conns[key] = Connection(record.target, reader, writer,
+                                            version)
+        self.stats.connections += 1
+        self.tasks.append(asyncio.create_task(self.receive(conn)))
+        for room in rooms:
+            self.send(conn, ROOM_JOIN, room.encode('utf-8'))
+
+    async def frame(self, key, record):
+        conn = self.conns.get(key)
+        if conn is None:
+            return
+        body = record.body
+        if len(body) < record.length:
+            body += FILLER * (record.length - len(body))
+        msg_type = record.msg_type
+        now = time.perf_counter()
+        if msg_type in (1, 2):
+            self.next_marker += 1
+            marker = b"[r%s-%d]" % (self.run_id, self.next_marker)
+            if msg_type == 2 and conn.version == 1:
+                name, _, text = body.partition(b" ")
+                body = name + b" " + marker + text
+            else:
+                body = marker + body
+            self.sent_at[self.next_marker] = (msg_type, now)
+            conn.markers.add(self.next_marker)
+        elif msg_type == PING:
+            conn.pings.append(now)
+        elif msg_type == FILE_GET:
+            try:
+                conn.gets[json.loads(body)["hash"]] = now
+            except (ValueError, KeyError, TypeError):
+                pass
+        self.send(conn, msg_type, body, record.target)
+        try:
+            await conn.writer.drain()
+        except ConnectionError:
+            self.stats.errors += 1
+            self.conns.pop(key, None)
+
+    def send(self, conn, msg_type, body, target=b""):
+        if conn.version == VERSION_2:
+            header = V2_HEADER.pack(VERSION_2, 0, msg_type, 0, 0, 0,
+                                    len(target), len(body)) + target
+        else:
+            header = HEADER.pack(msg_type, len(body))
+        conn.writer.writelines((header, body))
+        self.stats.count(self.stats.sent, msg_type, len(header) + len(body))
+
+    def close(self, key):
+        conn = self.conns.pop(key, None)
+        if conn is None:
+            return
+        if self.defer_close and conn.waiting():
+            conn.closing = True
+            self.closing.add(conn)
+        else:
+            conn.writer.close()
+
+    def finish_close(self, conn):
+        self.closing.discard(conn)
+        conn.writer.close()
+
+    async def receive(self, conn):
+        reader = conn.reader
+        try:
+            while True:
+                header = await reader.readexactly(HEADER.size)
+                if header[0] == VERSION_2:
+                    header += await reader.readexactly(
+                        V2_HEADER.size - HEADER.size)
+                    msg_type, _, _, sender_len, target_len, length = (
+                        parse_v2_header(header))
+                    header += await reader.readexactly(sender_len +
+                                                       target_len)
+                else:
+                    msg_type, length = HEADER.unpack(header)
+                compressed = msg_type & COMPRESSED
+                msg_type &= ~COMPRESSED
+                now = time.perf_counter()
+                self.stats.last_received = now
+                self.stats.count(self.stats.received, msg_type,
+                                 len(header) + length)
+                if msg_type in (1, 2, 5) and length <= INSPECT_MAX:
+                    body = await reader.readexactly(length)
+                    if compressed:
+                        body = inflate(body)
+                    self.match_markers(conn, body, now)
+                    length = 0
+                elif msg_type == PONG and conn.pings:
+                    self.stats.sample(PING, now - conn.pings.popleft())
+                elif msg_type == FILE_DATA and length >= DIGEST_SIZE:
+                    digest = (await reader.readexactly(DIGEST_SIZE)).hex()
+                    length -= DIGEST_SIZE
+                    sent = conn.gets.pop(digest, None)
+                    if sent is not None:
+                        self.stats.sample(FILE_GET, now - sent)
+                while length:
+                    length -= len(await reader.read(min(length, READ_SIZE)))
+                if conn.closing and not conn.waiting():
+                    self.finish_close(conn)
+                    return
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            pass
+
+    def match_markers(self, conn, body, now):
+        # Satu sampel per penerima: latency fan-out, bukan hanya penerima
+        # pertama. Pesan yang terkirim sebelum koneksi ini dibuka datang
+        # dari history, bukan dari pengiriman langsung.
+        for match in self.marker.finditer(body):
+            number = int(match.group(1))
+            conn.markers.discard(number)
+            sent = self.sent_at.get(number)
+            if sent is not None and sent[1] >= conn.opened_at:
+                self.stats.sample(sent[0], now - sent[1])
+
+    async def close_all(self):
+        for key in list(self.conns):
+            self.close(key)
+        for conn in list(self.closing):
+            self.finish_close(conn)
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+
+
+async def replay(args, stats):
+    redacted, records = merged_records(args.traces)
+    replayer = Replayer(args.host, args.port, stats,
+                        defer_close=args.speed <= 0)
+    started = time.perf_counter()
+    trace_span = 0.0
+    for at, index, record in records:
+        trace_span = at
+        if args.speed > 0:
+            delay = started + at / args.speed - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            else:
+                await asyncio.sleep(0)
+        else:
+            # kecepatan maksimal: tetap beri giliran pembaca balasan
+            await asyncio.sleep(0)
+        key = (index, record.conn)
+        if record.event == OPEN:
+            await replayer.open(key, record)
+        elif record.event == FRAME:
+            await replayer.frame(key, record)
+        elif record.event == CLOSE:
+            replayer.close(key)
+    elapsed = time.perf_counter() - started
+    await asyncio.sleep(args.drain)
+    await replayer.close_all()
+    received_span = ((stats.last_received or started) - started) or elapsed
+    return redacted, started, elapsed, trace_span, received_span
+
+
+def build_report(args, stats, timings, usage_before, usage_after):
+    redacted, _, elapsed, trace_span, received_span = timings
+    types = {}
+    for msg_type in sorted(set(stats.sent) | set(stats.received)):
+        sent = stats.sent.get(msg_type, [0, 0])
+        received = stats.received.get(msg_type, [0, 0])
+        latency = [s * 1000 for s in stats.latency.get(msg_type, ())]
+        types[TYPE_NAMES.get(msg_type, str(msg_type))] = {
+            "sent": sent[0], "sent_bytes": sent[1],
+            "sent_per_s": round(sent[0] / elapsed, 1) if elapsed else 0,
+            "received": received[0], "received_bytes": received[1],
+            "received_per_s": (round(received[0] / received_span, 1)
+                               if received_span else 0),
+            "latency_samples": len(latency),
+            "latency_ms": {p: round(percentile(latency, p), 3)
+                           for p in (50, 99, 99.9)},
+        }
+    rss_before, cpu_before = usage_before
+    rss_after, cpu_after = usage_after
+    return {
+        "traces": args.traces,
+        "redacted": redacted,
+        "speed": args.speed,
+        "connections": stats.connections,
+        "errors": stats.errors,
+        "trace_s": round(trace_span, 3),
+        "duration_s": round(elapsed, 3),
+        "types": types,
+        "server_rss_kb": rss_after,
+        "server_rss_growth_kb": (rss_after - rss_before
+                                 if rss_before and rss_after else None),
+        "server_cpu_pct": (round((cpu_after - cpu_before) / elapsed * 100, 1)
+                           if cpu_before is not None and elapsed else None),
+    }
+
+
+def print_report(report):
+    speed = f"{report['speed']:g}x" if report["speed"] > 0 else "maksimal"
+    redacted = " (diredaksi)" if report["redacted"] else ""
+    print(f"trace            : {', '.join(report['traces'])}{redacted}")
+    print(f"durasi           : {report['duration_s']} s "
+          f"(trace {report['trace_s']} s, kecepatan {speed})")
+    print(f"koneksi          : {report['connections']} "
+          f"(gagal {report['errors']})")
+    print(f"{'tipe':<12} {'kirim':>8} {'kirim/s':>9} {'terima':>8} "
+          f"{'terima/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'p999 ms':>8}")
+    for name, row in report["types"].items():
+        lat = row["latency_ms"]
+        cells = ([f"{lat[p]:.2f}" for p in (50, 99, 99.9)]
+                 if row["latency_samples"] else ["-"] * 3)
+        print(f"{name:<12} {row['sent']:>8} {row['sent_per_s']:>9} "
+              f"{row['received']:>8} {row['received_per_s']:>9} "
+              f"{cells[0]:>8} {cells[1]:>8} {cells[2]:>8}")
+    print(f"server rss KB    : {report['server_rss_kb']} "
+          f"(naik {report['server_rss_growth_kb']})")
+    print(f"server cpu %     : {report['server_cpu_pct']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Putar ulang trace /capture ke server lokal dan ukur "
+                    "latency serta throughput per tipe frame")
+    parser.add_argument("traces", nargs="+",
+                        help="file trace; trace per worker cluster "
+                             "digabung menurut waktu")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=65432)
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="kelipatan kecepatan rekaman (0 = maksimal)")
+    parser.add_argument("--drain", type=float, default=2.0,
+                        help="detik menunggu balasan setelah record terakhir")
+    parser.add_argument("--spawn", choices=sorted(SERVERS),
+                        help="jalankan server lokal sendiri")
+    parser.add_argument("--workers", type=int,
+                        help="jumlah worker untuk --spawn cluster")
+    parser.add_argument("--pid", type=int,
+                        help="pid server untuk mengukur RSS/CPU")
+    parser.add_argument("--json", help="simpan hasil ke file JSON")
+    args = parser.parse_args()
+
+    proc = (spawn_server(args.spawn, args.port, args.workers)
+            if args.spawn else None)
+    pid = proc.pid if proc else args.pid
+    stats = Stats()
+    try:
+        usage_before = process_usage(pid) if pid else (None, None)
+        timings = asyncio.run(replay(args, stats))
+        usage_after = process_usage(pid) if pid else (None, None)
+    finally:
+        if proc:
+            proc.kill()
+    report = build_report(args, stats, timings, usage_before, usage_after)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,772 @@
+import asyncio
+import hashlib
+import itertools
+import json
+import os
+import queue
+import socket
+import struct
+import threading
+import zlib
+from collections import namedtuple
+from datetime import datetime
+
+from filecache import FileCache
+
+# Protokol chat, sama dengan server/protocol.py
+HEADER = struct.Struct("!II")
+TEXT = 1
+PRIVATE = 2
+FILE = 3
+PRIVATE_FILE = 4
+CONTROL = 5
+FILE_START = 6
+FILE_CHUNK = 7
+FILE_END = 8
+FILE_INFO = 9
+FILE_GET = 10
+FILE_DATA = 11
+ROOM_JOIN = 12
+ROOM_LEAVE = 13
+FILE_OFFSET = 14
+PING = 15  # server -> client saat koneksi diam, dijawab PONG otomatis
+PONG = 16
+DEFAULT_ROOM = "lobby"
+
+CHUNK_SIZE = 64 * 1024
+DIGEST_SIZE = 32
+TRANSFER_ID = struct.Struct("!I")
+FILE_END_BODY = struct.Struct("!IB")
+END_OK = 0
+END_ABORT = 1
+# Lama menunggu FILE_OFFSET sebelum upload yang bisa dilanjutkan dibatalkan
+RESUME_TIMEOUT = 30
+PART_SUFFIX = ".part"  # unduhan yang belum lengkap, dilanjutkan dari ukurannya
+
+# Kompresi per frame (dinegosiasi lewat handshake), sama dengan server
+COMPRESSED = 0x80000000
+COMPRESS_MIN = 512
+COMPRESS_LEVEL = 1
+PACKED_EXTENSIONS = {
+    ".zip", ".gz", ".tgz", ".bz2", ".xz", ".7z", ".rar", ".zst",
+    ".png", ".jpg", ".jpeg", ".gif", ".webp", ".heic",
+    ".mp3", ".ogg", ".m4a", ".mp4", ".mkv", ".avi", ".mov", ".webm",
+    ".pdf", ".docx", ".xlsx", ".pptx", ".apk", ".jar",
+}
+
+# Protokol v2 (dinegosiasi lewat opsi "proto"), sama dengan server: header
+# tetap lalu sender, target dan body. Byte pertama header v1 tidak pernah 2.
+V2_HEADER = struct.Struct("!BBHQQHHI")
+VERSION_2 = 2
+FLAG_COMPRESSED = 0x01
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Event yang dihasilkan dari frame server
+# room hanya terisi dari frame v2 (pesan publik)
+TextMessage = namedtuple("TextMessage", "timestamp sender text private room",
+                         defaults=("",))
+# tipe 3/4, isi di FileCache
+FileMessage = namedtuple("FileMessage", "sender name key size private")
+FileOffer = namedtuple("FileOffer", "hash name size sender private room",
+                       defaults=("",))
+FileSaved = namedtuple("FileSaved", "hash name path size")
+UserList = namedtuple("UserList", "users")
+UserDelta = namedtuple("UserDelta", "changes")
+RoomList = namedtuple("RoomList", "rooms")  # room yang sedang diikuti
+FileResume = namedtuple("FileResume", "id offset")  # None = upload ditolak
+Control = namedtuple("Control", "kind text")  # [ERROR], [INFO], [HISTORY], ...
+
+
+def make_hello(nickname, options=None):
+    # Jawaban untuk "NICK"; opsi tambahan dikirim sebagai JSON di baris kedua
+    hello = nickname
+    if options:
+        hello += "\n" + json.dumps(options)
+    return hello.encode('utf-8')
+
+
+_clock = (None, "")
+
+
+def format_timestamp(timestamp_ms):
+    # Timestamp v2 (epoch ms) ke teks seperti v1; strftime sekali per detik
+    global _clock
+    if not timestamp_ms:
+        return ""
+    second, text = _clock
+    if timestamp_ms // 1000 != second:
+        second = timestamp_ms // 1000
+        text = datetime.fromtimestamp(second).strftime(TIMESTAMP_FORMAT)
+        _clock = (second, text)
+    return text
+
+
+def parse_v2_header(header):
+    # (msg_type dengan bit COMPRESSED bila perlu, panjang body, timestamp,
+    #  panjang sender, panjang target)
+    _, flags, msg_type, _, timestamp, sender_len, target_len, length = (
+        V2_HEADER.unpack(header))
+    if flags & FLAG_COMPRESSED:
+        msg_type |= COMPRESSED
+    return msg_type, length, timestamp, sender_len, target_len
+
+
+def split_names(names, sender_len, timestamp):
+    # fields frame v2: (timestamp ms, sender, target)
+    names = bytes(names)
+    return (timestamp, names[:sender_len].decode('utf-8'),
+            names[sender_len:].decode('utf-8'))
+
+
+def parse_event(msg_type, body, fields=None):
+    # body boleh memoryview ke buffer yang dipakai ulang, jadi semua yang
+    # disimpan di event harus disalin dulu. fields hanya ada di frame v2.
+    if msg_type in (TEXT, PRIVATE) and fields is not None:
+        # target: nama room untuk pesan publik, tujuan untuk PM
+        timestamp, sender, target = fields
+        private = msg_type == PRIVATE
+        return TextMessage(format_timestamp(timestamp), sender,
+                           str(body, 'utf-8'), private,
+                           "" if private else target)
+    if msg_type in (TEXT, PRIVATE):
+        message = str(body, 'utf-8')
+        try:
+            timestamp, sender, text = message.split("|", 2)
+        except ValueError:
+            timestamp, sender, text = "", "", message
+        return TextMessage(timestamp, sender, text, msg_type == PRIVATE)
+    if msg_type == FILE_INFO:
+        info = json.loads(bytes(body))
+        return FileOffer(info["hash"], info["name"], info["size"],
+                         info["sender"], info["private"],
+                         info.get("room") or "")
+    if msg_type == FILE_OFFSET:
+        info = json.loads(bytes(body))
+        return FileResume(info["id"], info["offset"])
+    if msg_type == CONTROL:
+        text = str(body, 'utf-8')
+        kind = ""
+        if text.startswith("[") and "]" in text:
+            kind, text = text[1:].split("]", 1)
+            text = text.strip()
+        if kind == "USER_LIST":
+            return UserList([u for u in text.split(",") if u])
+        if kind == "USER_DELTA":
+            return UserDelta([c for c in text.split(",") if c])
+        if kind == "ROOMS":
+            return RoomList([r for r in text.split(",") if r])
+        return Control(kind, text)
+    return None
+
+
+def split_file_head(head):
+    # "sender|name|awal isi" dari frame tipe 3/4; None kalau belum lengkap
+    if head.count(b"|") < 2:
+        return None
+    sender, name, data = head.split(b"|", 2)
+    return sender.decode('utf-8'), name.decode('utf-8'), data
+
+
+def compressible_name(file_name):
+    return os.path.splitext(file_name)[1].lower() not in PACKED_EXTENSIONS
+
+
+def deflate(payload):
+    # Payload terkompresi, atau None kalau kecil atau tidak menghemat
+    if len(payload) < COMPRESS_MIN:
+        return None
+    packed = zlib.compress(payload, COMPRESS_LEVEL)
+    if len(packed) >= len(payload):
+        return None
+    return packed
+
+
+def frame_header(version, msg_type, length, compressed=False, target=b""):
+    # Header frame keluar; di v2 target ikut sebagai field (sender diisi
+    # server, begitu juga seq dan timestamp)
+    if version == VERSION_2:
+        flags = FLAG_COMPRESSED if compressed else 0
+        return V2_HEADER.pack(VERSION_2, flags, msg_type, 0, 0, 0,
+                              len(target), length) + target
+    if compressed:
+        msg_type |= COMPRESSED
+    return HEADER.pack(msg_type, length)
+
+
+def inflate_parts(inflater, data):
+    # Hasil dekompresi satu potongan input, per bagian maksimal CHUNK_SIZE
+    while data:
+        yield inflater.decompress(data, CHUNK_SIZE)
+        data = inflater.unconsumed_tail
+
+
+def hello_options(options, compress, version):
+    options = dict(options or {})
+    if compress:
+        options["compress"] = ["zlib"]
+    if version == VERSION_2:
+        options["proto"] = VERSION_2
+    options["resume"] = 1
+    options["ping"] = 1
+    options["delta"] = 1
+    options["files"] = 1
+    return options
+
+
+def server_caps(text):
+    # (kompresi, versi protokol, upload/unduhan bisa dilanjutkan) dari
+    # jawaban [CAPS]
+    caps = text.split()
+    version = VERSION_2 if f"proto={VERSION_2}" in caps else 1
+    return "compress=zlib" in caps, version, "resume=1" in caps
+
+
+def file_start_payload(transfer_id, path, target=None, room=None,
+                       file_hash=None):
+    meta = {"id": transfer_id, "name": os.path.basename(path),
+            "size": os.path.getsize(path)}
+    if target:
+        meta["target"] = target
+    elif room:
+        meta["room"] = room
+    if file_hash:
+        meta["hash"] = file_hash
+    return json.dumps(meta).encode('utf-8')
+
+
+def file_get_payload(file_hash, offset=0):
+    request = {"hash": file_hash}
+    if offset:
+        request["offset"] = offset
+    return json.dumps(request).encode('utf-8')
+
+
+def file_digest(path):
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def part_path(download_dir, file_hash):
+    return os.path.join(download_dir, file_hash + PART_SUFFIX)
+
+
+def part_offset(download_dir, file_hash):
+    # Ukuran .part dari unduhan yang terputus, 0 kalau belum ada
+    try:
+        return os.path.getsize(part_path(download_dir, file_hash))
+    except OSError:
+        return 0
+
+
+def open_part(path, offset):
+    # (file, hasher) untuk menulis sisa unduhan setelah offset; isi yang
+    # sudah ada dihash ulang supaya digest bisa dicek terhadap seluruh file
+    hasher = hashlib.sha256()
+    if not offset:
+        return open(path, "wb"), hasher
+    f = open(path, "a+b")
+    f.truncate(offset)
+    f.seek(0)
+    while chunk := f.read(CHUNK_SIZE):
+        hasher.update(chunk)
+    return f, hasher
+
+
+def finish_part(part, path, file_hash, hasher):
+    # Unduhan lengkap: dipindah ke nama aslinya kalau digest cocok
+    if hasher.hexdigest() != file_hash:
+        os.remove(part)
+        return False
+    os.replace(part, path)
+    return True
+
+
+class ChatConnection:
+    # API blocking. Satu thread membaca lewat events(), thread lain boleh
+    # mengirim kapan saja (pengiriman dijaga lock).
+    def __init__(self, download_dir="downloads", cache=None, compress=True,
+                 version=VERSION_2):
+        self.sock = None
+        self.download_dir = download_dir
+        self.cache = cache or FileCache()
+        # compress/version: yang diminta saat handshake; server_compress dan
+        # server_version baru berubah setelah server menjawab [CAPS]
+        self.compress = compress
+        self.version = version
+        self.server_compress = False
+        self.server_version = 1
+        self.server_resume = False
+        # room aktif di server: tujuan pesan v1 yang tanpa nama room
+        self.room = DEFAULT_ROOM
+        self.send_lock = threading.Lock()
+        self.transfer_ids = itertools.count(1)
+        # nama file per hash, dari FILE_INFO, untuk menamai hasil unduhan
+        self.file_names = {}
+        # id transfer -> antrian yang menerima offset dari FILE_OFFSET
+        self.resume_waiters = {}
+        # hash -> offset unduhan yang diminta dilanjutkan
+        self.download_offsets = {}
+        self.buf = bytearray(CHUNK_SIZE + 64)
+
+    def connect(self, host, port, nickname, options=None):
+        self.sock = socket.create_connection((host, port))
+        if bytes(self.recv_exact(4)) != b"NICK":
+            raise ConnectionError("Handshake NICK tidak valid")
+        options = hello_options(options, self.compress, self.version)
+        self.sock.sendall(make_hello(nickname, options))
+
+    def note_event(self, event):
+        if isinstance(event, FileOffer):
+            self.file_names[event.hash] = event.name
+        elif isinstance(event, FileResume):
+            waiter = self.resume_waiters.get(event.id)
+            if waiter is not None:
+                waiter.put(event.offset)
+        elif isinstance(event, Control) and event.kind == "CAPS":
+            (self.server_compress, self.server_version,
+             self.server_resume) = server_caps(event.text)
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            self.sock.close()
+
+    def recv_exact(self, n):
+        # Dibaca ke buffer yang sama terus (recv_into), hasilnya memoryview
+        # yang hanya berlaku sampai pembacaan berikutnya
+        if n > len(self.buf):
+            self.buf = bytearray(n)
+        view = memoryview(self.buf)
+        got = 0
+        while got < n:
+            more = self.sock.recv_into(view[got:n])
+            if not more:
+                raise ConnectionResetError("Koneksi ke server terputus")
+            got += more
+        return view[:n]
+
+    def read_header(self):
+        # (msg_type, panjang body, fields); versi frame dikenali dari byte
+        # pertama, fields (timestamp, sender, target) hanya ada di v2
+        header = bytes(self.recv_exact(HEADER.size))
+        if header[0] != VERSION_2:
+            msg_type, length = HEADER.unpack(header)
+            return msg_type, length, None
+        header += self.recv_exact(V2_HEADER.size - HEADER.size)
+        msg_type, length, timestamp, sender_len, target_len = (
+            parse_v2_header(header))
+        names = self.recv_exact(sender_len + target_len)
+        return msg_type, length, split_names(names, sender_len, timestamp)
+
+    def read_event(self):
+        msg_type, length, fields = self.read_header()
+        compressed = bool(msg_type & COMPRESSED)
+        msg_type &= ~COMPRESSED
+        if msg_type == FILE_DATA:
+            return self.save_download(length)
+        if msg_type in (FILE, PRIVATE_FILE):
+            return self.save_file_message(msg_type, length, compressed,
+                                          fields)
+        body = self.recv_exact(length)
+        if msg_type == PING:
+            self.send_frame(PONG, bytes(body), False)
+            return None
+        if compressed:
+            body = zlib.decompress(body)
+        event = parse_event(msg_type, body, fields)
+        if len(self.buf) > 4 * CHUNK_SIZE:  # jangan tahan buffer frame raksasa
+            self.buf = bytearray(CHUNK_SIZE + 64)
+        self.note_event(event)
+        return event
+
+    def events(self):
+        while True:
+            event = self.read_event()
+            if event is not None:
+                yield event
+
+    def save_download(self, length):
+        # Isi file langsung ditulis ke disk per potongan, ke file .part
+        # dulu; kalau koneksi putus, request_file melanjutkan dari sana
+        file_hash = bytes(self.recv_exact(DIGEST_SIZE)).hex()
+        name = os.path.basename(self.file_names.get(file_hash, file_hash))
+        os.makedirs(self.download_dir, exist_ok=True)
+        path = os.path.join(self.download_dir, name)
+        part = part_path(self.download_dir, file_hash)
+        offset = self.download_offsets.pop(file_hash, 0)
+        remaining = length - DIGEST_SIZE
+        f, hasher = open_part(part, offset)
+        with f:
+            while remaining:
+                chunk = self.recv_exact(min(CHUNK_SIZE, remaining))
+                f.write(chunk)
+                hasher.update(chunk)
+                remaining -= len(chunk)
+        if not finish_part(part, path, file_hash, hasher):
+            return Control("ERROR", f"Checksum {name} tidak cocok")
+        return FileSaved(file_hash, name, path, offset + length - DIGEST_SIZE)
+
+    def body_chunks(self, length, compressed=False):
+        # Body frame per potongan; yang terkompresi di-inflate sambil jalan
+        inflater = zlib.decompressobj() if compressed else None
+        remaining = length
+        while remaining:
+            chunk = self.recv_exact(min(CHUNK_SIZE, remaining))
+            remaining -= len(chunk)
+            if inflater is None:
+                yield chunk
+            else:
+                yield from inflate_parts(inflater, chunk)
+        if inflater is not None:
+            yield inflater.flush()
+
+    def save_file_message(self, msg_type, length, compressed=False,
+                          fields=None):
+        # File lama (tipe 3/4) tidak pernah utuh di RAM: setelah sender dan
+        # nama terbaca, sisanya langsung ditulis ke cache per potongan.
+        # Di v2 sender dan nama sudah ada di header, body hanya isi file.
+        chunks = self.body_chunks(length, compressed)
+        if fields is not None:
+            _, sender, name = fields
+            data = b""
+        else:
+            head = b""
+            for chunk in chunks:
+                head += bytes(chunk)
+                if (parts := split_file_head(head)) is not None:
+                    break
+            else:
+                raise ConnectionError("Frame file tidak valid")
+            sender, name, data = parts
+        key, path = self.cache.begin(name)
+        size = len(data)
+        try:
+            with open(path, "wb") as f:
+                f.write(data)
+                for chunk in chunks:
+                    f.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            self.cache.remove(path)
+            raise
+        self.cache.add(key, path, size)
+        return FileMessage(sender, name, key, size, msg_type == PRIVATE_FILE)
+
+    def send_frame(self, msg_type, payload, compressible=True, target=b""):
+        packed = None
+        if self.server_compress and compressible:
+            packed = deflate(payload)
+        if packed is not None:
+            payload = packed
+        header = frame_header(self.server_version, msg_type, len(payload),
+                              packed is not None, target)
+        with self.send_lock:
+            self.sock.sendall(header)
+            self.sock.sendall(payload)
+
+    def send_text(self, text, room=None):
+        # room None: room aktif. Di v2 nama room ikut di field target, di v1
+        # room aktif server dipindah dulu dengan ROOM_JOIN.
+        if self.server_version == VERSION_2:
+            self.send_frame(TEXT, text.encode('utf-8'),
+                            target=(room or "").encode('utf-8'))
+            return
+        if room and room != self.room:
+            self.join_room(room)
+        self.send_frame(TEXT, text.encode('utf-8'))
+
+    def join_room(self, room):
+        self.send_frame(ROOM_JOIN, room.encode('utf-8'))
+        self.room = room
+
+    def leave_room(self, room):
+        self.send_frame(ROOM_LEAVE, room.encode('utf-8'))
+        if self.room == room:
+            self.room = None
+
+    def send_private(self, target, text):
+        if self.server_version == VERSION_2:
+            self.send_frame(PRIVATE, text.encode('utf-8'),
+                            target=target.encode('utf-8'))
+        else:
+            self.send_frame(PRIVATE, f"{target} {text}".encode('utf-8'))
+
+    def upload_file(self, path, target=None, room=None):
+        # Dikirim per potongan, file tidak pernah dibaca utuh ke memori.
+        # Server yang mendukung resume menjawab offset byte yang sudah ia
+        # punya (events() harus sedang dibaca thread lain) dan hanya sisanya
+        # yang dikirim.
+        transfer_id = next(self.transfer_ids)
+        file_hash = file_digest(path) if self.server_resume else None
+        offset = 0
+        if file_hash:
+            self.resume_waiters[transfer_id] = queue.Queue(1)
+        try:
+            self.send_frame(FILE_START, file_start_payload(
+                transfer_id, path, target, room, file_hash))
+            if file_hash:
+                offset = self.resume_waiters[transfer_id].get(
+                    timeout=RESUME_TIMEOUT)
+        except queue.Empty:
+            raise TimeoutError("Server tidak menjawab FILE_OFFSET")
+        finally:
+            self.resume_waiters.pop(transfer_id, None)
+        if offset is None:  # ditolak, alasannya datang sebagai [ERROR]
+            return
+        # isi zip/jpg/mp4 dan sejenisnya tidak perlu dicoba dikompresi
+        compressible = compressible_name(path)
+        status = END_OK
+        try:
+            with open(path, "rb") as f:
+                f.seek(offset)
+                while chunk := f.read(CHUNK_SIZE):
+                    self.send_frame(
+                        FILE_CHUNK, TRANSFER_ID.pack(transfer_id) + chunk,
+                        compressible)
+        except OSError:
+            status = END_ABORT
+            raise
+        finally:
+            self.send_frame(FILE_END,
+                            FILE_END_BODY.pack(transfer_id, status))
+
+    def request_file(self, file_hash):
+        # Unduhan yang terputus dilanjutkan kalau server mendukung
+        offset = 0
+        if self.server_resume:
+            offset = part_offset(self.download_dir, file_hash)
+        self.download_offsets[file_hash] = offset
+        self.send_frame(FILE_GET, file_get_payload(file_hash, offset))
+
+
+class AsyncChatConnection:
+    # API asyncio dengan perilaku yang sama seperti ChatConnection
+    def __init__(self, download_dir="downloads", cache=None, compress=True,
+                 version=VERSION_2):
+        self.reader = None
+        self.writer = None
+        self.download_dir = download_dir
+        self.cache = cache or FileCache()
+        self.compress = compress
+        self.version = version
+        self.server_compress = False
+        self.server_version = 1
+        self.server_resume = False
+        self.room = DEFAULT_ROOM
+        self.transfer_ids = itertools.count(1)
+        self.file_names = {}
+        self.resume_waiters = {}  # id transfer -> Future offset
+        self.download_offsets = {}
+
+    async def connect(self, host, port, nickname, options=None):
+        self.reader, self.writer = await asyncio.open_connection(host, port)
+        if await self.reader.readexactly(4) != b"NICK":
+            raise ConnectionError("Handshake NICK tidak valid")
+        options = hello_options(options, self.compress, self.version)
+        self.writer.write(make_hello(nickname, options))
+        await self.writer.drain()
+
+    def note_event(self, event):
+        if isinstance(event, FileOffer):
+            self.file_names[event.hash] = event.name
+        elif isinstance(event, FileResume):
+            waiter = self.resume_waiters.get(event.id)
+            if waiter is not None and not waiter.done():
+                waiter.set_result(event.offset)
+        elif isinstance(event, Control) and event.kind == "CAPS":
+            (self.server_compress, self.server_version,
+             self.server_resume) = server_caps(event.text)
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            await self.writer.wait_closed()
+
+    async def read_header(self):
+        header = await self.reader.readexactly(HEADER.size)
+        if header[0] != VERSION_2:
+            msg_type, length = HEADER.unpack(header)
+            return msg_type, length, None
+        header += await self.reader.readexactly(V2_HEADER.size - HEADER.size)
+        msg_type, length, timestamp, sender_len, target_len = (
+            parse_v2_header(header))
+        names = await self.reader.readexactly(sender_len + target_len)
+        return msg_type, length, split_names(names, sender_len, timestamp)
+
+    async def read_event(self):
+        try:
+            msg_type, length, fields = await self.read_header()
+            compressed = bool(msg_type & COMPRESSED)
+            msg_type &= ~COMPRESSED
+            if msg_type == FILE_DATA:
+                return await self.save_download(length)
+            if msg_type in (FILE, PRIVATE_FILE):
+                return await self.save_file_message(
+                    msg_type, length, compressed, fields)
+            body = await self.reader.readexactly(length)
+        except asyncio.IncompleteReadError:
+            raise ConnectionResetError("Koneksi ke server terputus")
+        if msg_type == PING:
+            await self.send_frame(PONG, body, False)
+            return None
+        if compressed:
+            body = zlib.decompress(body)
+        event = parse_event(msg_type, body, fields)
+        self.note_event(event)
+        return event
+
+    async def events(self):
+        while True:
+            event = await self.read_event()
+            if event is not None:
+                yield event
+
+    async def save_download(self, length):
+        file_hash = (await self.reader.readexactly(DIGEST_SIZE)).hex()
+        name = os.path.basename(self.file_names.get(file_hash, file_hash))
+        os.makedirs(self.download_dir, exist_ok=True)
+        path = os.path.join(self.download_dir, name)
+        part = part_path(self.download_dir, file_hash)
+        offset = self.download_offsets.pop(file_hash, 0)
+        remaining = length - DIGEST_SIZE
+        f, hasher = open_part(part, offset)
+        with f:
+            while remaining:
+                chunk = await self.reader.readexactly(
+                    min(CHUNK_SIZE, remaining))
+                f.write(chunk)
+                hasher.update(chunk)
+                remaining -= len(chunk)
+        if not finish_part(part, path, file_hash, hasher):
+            return Control("ERROR", f"Checksum {name} tidak cocok")
+        return FileSaved(file_hash, name, path, offset + length - DIGEST_SIZE)
+
+    async def body_chunks(self, length, compressed=False):
+        inflater = zlib.decompressobj() if compressed else None
+        remaining = length
+        while remaining:
+            chunk = await self.reader.readexactly(min(CHUNK_SIZE, remaining))
+            remaining -= len(chunk)
+            if inflater is None:
+                yield chunk
+                continue
+            for part in inflate_parts(inflater, chunk):
+                yield part
+        if inflater is not None:
+            yield inflater.flush()
+
+    async def save_file_message(self, msg_type, length, compressed=False,
+                                fields=None):
+        chunks = self.body_chunks(length, compressed)
+        if fields is not None:
+            _, sender, name = fields
+            data = b""
+        else:
+            head = b""
+            async for chunk in chunks:
+                head += chunk
+                if (parts := split_file_head(head)) is not None:
+                    break
+            else:
+                raise ConnectionError("Frame file tidak valid")
+            sender, name, data = parts
+        key, path = self.cache.begin(name)
+        size = len(data)
+        try:
+            with open(path, "wb") as f:
+                f.write(data)
+                async for chunk in chunks:
+                    f.write(chunk)
+                    size += len(chunk)
+        except BaseException:
+            self.cache.remove(path)
+            raise
+        self.cache.add(key, path, size)
+        return FileMessage(sender, name, key, size, msg_type == PRIVATE_FILE)
+
+    async def send_frame(self, msg_type, payload, compressible=True,
+                         target=b""):
+        packed = None
+        if self.server_compress and compressible:
+            packed = deflate(payload)
+        if packed is not None:
+            payload = packed
+        header = frame_header(self.server_version, msg_type, len(payload),
+                              packed is not None, target)
+        self.writer.writelines((header, payload))
+        await self.writer.drain()
+
+    async def send_text(self, text, room=None):
+        if self.server_version == VERSION_2:
+            await self.send_frame(TEXT, text.encode('utf-8'),
+                                  target=(room or "").encode('utf-8'))
+            return
+        if room and room != self.room:
+            await self.join_room(room)
+        await self.send_frame(TEXT, text.encode('utf-8'))
+
+    async def join_room(self, room):
+        await self.send_frame(ROOM_JOIN, room.encode('utf-8'))
+        self.room = room
+
+    async def leave_room(self, room):
+        await self.send_frame(ROOM_LEAVE, room.encode('utf-8'))
+        if self.room == room:
+            self.room = None
+
+    async def send_private(self, target, text):
+        if self.server_version == VERSION_2:
+            await self.send_frame(PRIVATE, text.encode('utf-8'),
+                                  target=target.encode('utf-8'))
+        else:
+            await self.send_frame(PRIVATE,
+                                  f"{target} {text}".encode('utf-8'))
+
+    async def upload_file(self, path, target=None, room=None):
+        # offset dari server dibaca task lain yang menjalankan events()
+        transfer_id = next(self.transfer_ids)
+        file_hash = None
+        if self.server_resume:
+            file_hash = await asyncio.to_thread(file_digest, path)
+        offset = 0
+        if file_hash:
+            self.resume_waiters[transfer_id] = (
+                asyncio.get_running_loop().create_future())
+        try:
+            await self.send_frame(FILE_START, file_start_payload(
+                transfer_id, path, target, room, file_hash))
+            if file_hash:
+                offset = await asyncio.wait_for(
+                    self.resume_waiters[transfer_id], RESUME_TIMEOUT)
+        finally:
+            self.resume_waiters.pop(transfer_id, None)
+        if offset is None:
+            return
+        compressible = compressible_name(path)
+        status = END_OK
+        try:
+            with open(path, "rb") as f:
+                f.seek(offset)
+                while chunk := f.read(CHUNK_SIZE):
+                    await self.send_frame(
+                        FILE_CHUNK, TRANSFER_ID.pack(transfer_id) + chunk,
+                        compressible)
+        except OSError:
+            status = END_ABORT
+            raise
+        finally:
+            await self.send_frame(FILE_END,
+                                  FILE_END_BODY.pack(transfer_id, status))
+
+    async def request_file(self, file_hash):
+        offset = 0
+        if self.server_resume:
+            offset = part_offset(self.download_dir, file_hash)
+        self.download_offsets[file_hash] = offset
+        await self.send_frame(FILE_GET, file_get_payload(file_hash, offset))
@@ -0,0 +1,39 @@
+import json
+import os
+import sqlite3
+import tempfile
+
+
+class ChatStore:
+    # Semua entri chat yang pernah tampil, disimpan di disk (sqlite) supaya
+    # widget cukup menampung sebagian saja dan sisanya dimuat saat di-scroll
+    def __init__(self, path=None):
+        if path is None:
+            self.tmp_dir = tempfile.TemporaryDirectory(prefix="chatclient-")
+            path = os.path.join(self.tmp_dir.name, "chat.db")
+        # autocommit tanpa fsync: ini cache lokal, bukan data penting
+        self.db = sqlite3.connect(path, isolation_level=None)
+        self.db.execute("PRAGMA synchronous=OFF")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            "id INTEGER PRIMARY KEY, kind TEXT, data TEXT)")
+        self.last_id = self.db.execute(
+            "SELECT COALESCE(MAX(id), 0) FROM entries").fetchone()[0]
+
+    def append(self, kind, data):
+        cur = self.db.execute("INSERT INTO entries (kind, data) VALUES (?, ?)",
+                              (kind, json.dumps(data)))
+        self.last_id = cur.lastrowid
+        return self.last_id
+
+    def before(self, entry_id, limit):
+        rows = self.db.execute(
+            "SELECT id, kind, data FROM entries WHERE id < ? "
+            "ORDER BY id DESC LIMIT ?", (entry_id, limit)).fetchall()
+        return [(i, kind, json.loads(data)) for i, kind, data in reversed(rows)]
+
+    def after(self, entry_id, limit):
+        rows = self.db.execute(
+            "SELECT id, kind, data FROM entries WHERE id > ? "
+            "ORDER BY id LIMIT ?", (entry_id, limit)).fetchall()
+        return [(i, kind, json.loads(data)) for i, kind, data in rows]
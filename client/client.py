@@ -1,12 +1,27 @@
-import socket
 import threading
+import queue
 import tkinter as tk
 from tkinter import filedialog, simpledialog, scrolledtext, messagebox
-import struct
 import os
 import json
+import shutil
 from datetime import datetime
-import random
+from collections import namedtuple, deque
+
+from chatlib import (ChatConnection, TextMessage, FileMessage, FileOffer,
+                     FileSaved, UserList, UserDelta, RoomList, Control,
+                     TEXT, PRIVATE, FILE, PRIVATE_FILE, DEFAULT_ROOM)
+from chatstore import ChatStore
+from filecache import FileCache, CACHE_BYTES
+
+# Event lokal GUI, lewat antrian yang sama dengan event dari server
+Notice = namedtuple("Notice", "text")
+Disconnected = namedtuple("Disconnected", "text")
+
+UI_FRAME_MS = 30    # antrian event dikuras sekali per frame
+MAX_BATCH = 500     # batas event per frame supaya GUI tetap responsif
+HISTORY_CAP = 500   # jumlah entri maksimal di chat_area
+HISTORY_PAGE = 100  # entri yang dimuat sekali saat scroll ke ujung
 
 
 class ChatClient:
@@ -14,15 +29,36 @@ class ChatClient:
         self.master = tk.Tk()
         self.master.title("Chat Client")
         self.master.minsize(720, 480)
-        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        # framing, handshake dan transfer file ada di chatlib
         self.nickname = self.load_or_ask_nickname()
+        # file tipe 3/4 ditulis ke cache di disk, dibatasi "cache_mb" di config
+        self.conn = ChatConnection(cache=FileCache(
+            max_bytes=self.config.get("cache_mb", CACHE_BYTES // 2**20) * 2**20))
         self.in_pm_mode = False
         self.pm_target = ''
         self.online_users = []
+        # room yang diikuti dan room tujuan pesan/file publik
+        self.rooms = [DEFAULT_ROOM]
+        self.room = DEFAULT_ROOM
+        self.joining = None  # dipilih setelah server mengonfirmasi
         self.file_masuk = {}
         self.file_keluar = {}
+        # Thread jaringan hanya mengisi antrian ini, widget Tk hanya
+        # disentuh dari main loop lewat poll_events
+        self.events = queue.Queue()
+        # chat_area hanya menampung HISTORY_CAP entri (id, tag) terakhir yang
+        # dirender; semua entri tersimpan di ChatStore dan dimuat ulang saat
+        # user scroll ke atas
+        self.store = ChatStore()
+        self.history_cap = HISTORY_CAP
+        self.rendered = deque()
+        self.following = True
+        self.render_at = "end-1c"
+        self.file_links = {}
+        self.scroll_check_pending = False
         self.build_gui()
-        self.connect()
+        if self.connect():
+            self.master.after(UI_FRAME_MS, self.poll_events)
         self.master.mainloop()
 
     def build_gui(self):
@@ -55,10 +91,33 @@ class ChatClient:
             "timestamp", font=("Roboto", 9), foreground="#696969")
         self.chat_area.tag_configure("sender", foreground="#095C00")
 
-        # User Listbox (row 0, column 1)
-        self.user_listbox = tk.Listbox(main_frame)
-        self.user_listbox.grid(
-            row=0, column=1, padx=(0, 10), pady=10, sticky="nsew")
+        # satu set binding untuk semua link file, bukan tiga per file
+        self.chat_area.tag_bind(
+            "filelink", "<Enter>", lambda e: self.chat_area.configure(cursor="hand2"))
+        self.chat_area.tag_bind("filelink", "<Leave>",
+                                lambda e: self.chat_area.configure(cursor=""))
+        self.chat_area.tag_bind("filelink", "<Button-1>", self.click_file_link)
+        self.chat_area.configure(yscrollcommand=self.on_chat_scroll)
+
+        # Panel samping (row 0, column 1): pilihan room di atas user listbox
+        side_frame = tk.Frame(main_frame)
+        side_frame.grid(row=0, column=1, padx=(0, 10), pady=10, sticky="nsew")
+        tk.Label(side_frame, text="Room").pack(anchor="w")
+        self.room_listbox = tk.Listbox(
+            side_frame, height=5, exportselection=False)
+        self.room_listbox.pack(fill=tk.X)
+        self.room_listbox.bind("<<ListboxSelect>>", self.select_room)
+        room_buttons = tk.Frame(side_frame)
+        room_buttons.pack(fill=tk.X, pady=(2, 8))
+        tk.Button(room_buttons, text="Gabung",
+                  command=self.join_room).pack(side=tk.LEFT)
+        tk.Button(room_buttons, text="Keluar",
+                  command=self.leave_room).pack(side=tk.LEFT)
+        self.update_room_list(self.rooms)
+
+        tk.Label(side_frame, text="User").pack(anchor="w")
+        self.user_listbox = tk.Listbox(side_frame)
+        self.user_listbox.pack(fill=tk.BOTH, expand=True)
         self.user_listbox.bind("<Double-Button-1>", self.select_user_for_pm)
 
         # Entry message (row 1, column 0)
@@ -89,97 +148,120 @@ class ChatClient:
             self.port = simpledialog.askinteger(
                 "Connect", "Masukan port server", parent=self.master)
 
-            self.socket.connect((self.host, self.port))
-            res = self.socket.recv(1024).decode('utf-8')
-            if res == "NICK":
-                self.socket.send(self.nickname.encode('utf-8'))
+            self.conn.connect(self.host, self.port, self.nickname)
 
         except Exception as e:
             messagebox.showerror("Error", f"Gagal terhubung ke server: {e}")
             self.master.destroy()
-            return
+            return False
 
         threading.Thread(target=self.receive_messages, daemon=True).start()
+        return True
 
     def receive_messages(self):
+        # Berjalan di thread jaringan: jangan sentuh widget di sini
+        try:
+            for event in self.conn.events():
+                self.events.put(event)
+        except ConnectionResetError:
+            self.events.put(Disconnected("Koneksi ke server terputus."))
+        except Exception as e:
+            self.events.put(Disconnected(f"Error saat menerima pesan: {e}"))
 
-        while True:
+    def poll_events(self):
+        # Semua event yang menumpuk dirender dalam satu batch, dengan satu
+        # kali scroll per batch
+        batch = []
+        try:
+            while len(batch) < MAX_BATCH:
+                batch.append(self.events.get_nowait())
+        except queue.Empty:
+            pass
+        disconnected = None
+        if batch:
+            self.chat_area.configure(state="normal")
             try:
-                header = self.socket.recv(8)
-                if len(header) < 8:
-                    messagebox.showerror(
-                        "Error", "Error saat menerima header.")
-                    break
-                msg_type, msg_len = struct.unpack("!II", header)
-
-                # terima data
-                data = b''
-                while len(data) < msg_len:
-                    more = self.socket.recv(msg_len - len(data))
-                    if not more:
-                        messagebox.showerror(
-                            "Error", "Error saat menerima data.")
+                for event in batch:
+                    if isinstance(event, Disconnected):
+                        disconnected = event
                         break
-                    data += more
-
-                if msg_type in [1, 2]:
-                    message = data.decode('utf-8')
-                    self.show_message(message, msg_type)
-
-                if msg_type in [3, 4]:  # file broadcast
-                    sender, file_name, file_data = data.split(b'|', 2)
-                    sender = sender.decode('utf-8')
-                    file_name = file_name.decode('utf-8')
-                    file_size = len(file_data)
-                    # simpan sementara di ram
-                    self.file_masuk[file_name] = {
-                        "data": file_data, "is_new": True}
-                    # tampilkan di chat
-                    self.show_file(sender, file_name, file_size, msg_type)
-
-                if msg_type == 5:  # control message
-                    data = data.decode('utf-8')
-                    if data.startswith("[USER_LIST]"):
-                        user_list = data.replace(
-                            "[USER_LIST]", "").strip().split(",")
-                        self.update_user_list(user_list)
-                    if data.startswith("[ERROR]"):
-                        messagebox.showerror(
-                            "Error", data.replace("[ERROR]", ""))
-                    if data.startswith("[INFO]"):
-                        messagebox.showinfo(
-                            "Info", data.replace("[INFO]", ""))
-                        if data.replace("[INFO]", "").strip() == "Server shutdown":
-                            self.master.destroy()
-                            self.socket.close()
-            except ConnectionResetError:
-                messagebox.showerror(
-                    "Error", "Koneksi ke server terputus.")
-                self.master.destroy()
-                self.socket.close()
-                break
-            except Exception as e:
-                messagebox.showerror(
-                    "Error", f"Error saat menerima pesan: {e}")
-                self.master.destroy()
-                self.socket.close()
+                    self.handle_event(event)
+            finally:
+                self.chat_area.configure(state="disabled")
+            if self.following:
+                self.chat_area.see(tk.END)
+        if disconnected is not None:
+            messagebox.showerror("Error", disconnected.text)
+            self.master.destroy()
+            self.conn.close()
+            return
+        self.master.after(UI_FRAME_MS, self.poll_events)
+
+    def handle_event(self, event):
+        if isinstance(event, Notice):
+            self.add_entry("message", [event.text, 0, "", ""])
+
+        elif isinstance(event, TextMessage):
+            self.add_entry("message", [
+                event.text, PRIVATE if event.private else TEXT,
+                event.sender, event.timestamp, event.room])
+
+        elif isinstance(event, FileMessage):  # file dari server lama
+            # isi file sudah di cache, di sini hanya metadata
+            self.file_masuk[event.key] = {
+                "cache_key": event.key, "name": event.name, "is_new": True}
+            # tampilkan di chat
+            self.add_entry("file", [
+                event.sender, event.name, event.size,
+                PRIVATE_FILE if event.private else FILE, event.key, now()])
+
+        elif isinstance(event, FileOffer):  # hanya deskriptor, isi diunduh nanti
+            self.file_masuk[event.hash] = {
+                "hash": event.hash, "name": event.name, "is_new": True}
+            self.add_entry("file", [
+                event.sender, event.name, event.size,
+                PRIVATE_FILE if event.private else FILE, event.hash, now(),
+                event.room])
+
+        elif isinstance(event, FileSaved):  # unduhan yang kita minta selesai
+            self.open_downloaded(event)
+
+        elif isinstance(event, UserList):
+            self.update_user_list(event.users)
+
+        elif isinstance(event, UserDelta):
+            self.apply_user_delta(event.changes)
+
+        elif isinstance(event, RoomList):
+            self.update_room_list(event.rooms)
+
+        elif isinstance(event, Control):
+            if event.kind == "ERROR":
+                messagebox.showerror("Error", event.text)
+            if event.kind == "LIMIT":  # bisa sering, jangan pakai dialog
+                self.add_entry("message", [f"⚠️ {event.text}", 0, "", ""])
+            if event.kind == "HISTORY_TRUNCATED":
+                self.add_entry("message", [
+                    "⚠️ Sebagian pesan lama tidak dikirim ulang server",
+                    0, "", ""])
+            if event.kind == "INFO":
+                messagebox.showinfo("Info", event.text)
+                if event.text == "Server shutdown":
+                    self.events.put(Disconnected("Server shutdown"))
 
     def send_message(self, event=None):
         message = self.entry_msg.get().strip()
         if not message:
             return
 
-        if self.in_pm_mode:
-            msg_type = 2
-            message = f"{self.pm_target} {message}"
-        else:
-            msg_type = 1
-
-        data = message.encode('utf-8')
-        msg_len = len(data)
         try:
-            header = struct.pack("!II", msg_type, msg_len)
-            self.socket.send(header + data)
+            if self.in_pm_mode:
+                self.conn.send_private(self.pm_target, message)
+            elif self.room is None:
+                messagebox.showerror("Error", "Gabung ke sebuah room dulu.")
+                return
+            else:
+                self.conn.send_text(message, self.room)
             self.entry_msg.delete(0, tk.END)
         except:
             messagebox.showerror("Error", "Error saat mengirim pesan.")
@@ -196,26 +278,126 @@ class ChatClient:
             if not oke:
                 return
 
-            with open(path, "rb") as f:
-                file_data = f.read()
-            if self.in_pm_mode:
-                msg_type = 4
-                payload = self.pm_target.encode(
-                    'utf-8') + b'|' + file_name.encode('utf-8') + b'|' + file_data
-            else:
-                payload = file_name.encode('utf-8') + b'|' + file_data
-                msg_type = 3
-
-            # header: msg_type, len
-            header = struct.pack("!II", msg_type, len(payload))
-            self.socket.send(header + payload)
+            target = self.pm_target if self.in_pm_mode else None
             self.file_keluar[file_name] = path
+            threading.Thread(target=self.upload_file,
+                             args=(path, target, self.room),
+                             daemon=True).start()
 
         except Exception as e:
             messagebox.showerror("Error", f"Error saat mengirim file: {e}")
 
-    def show_file(self, sender, file_name, file_size, msg_type):
+    def upload_file(self, path, target, room):
+        # Thread upload: error dikirim ke main loop lewat antrian
+        try:
+            self.conn.upload_file(path, target, room)
+        except OSError as e:
+            self.events.put(Control("ERROR", f"Error saat mengirim file: {e}"))
+
+    def add_entry(self, kind, data):
+        entry_id = self.store.append(kind, data)
+        if not self.following:
+            # user sedang membaca pesan lama; dimuat saat scroll ke bawah
+            return
+        self.rendered.append((entry_id, self.render_entry(entry_id, kind, data)))
+        while len(self.rendered) > self.history_cap:
+            self.evict_top()
+
+    def render_entry(self, entry_id, kind, data):
+        # Dirender di posisi self.render_at; awal entri ditandai mark
+        # "entry<id>" supaya bisa dihapus lagi saat keluar dari jendela
+        start = self.chat_area.index(self.render_at)
+        if kind == "file":
+            tags = self.show_file(entry_id, *data)
+        else:
+            tags = self.show_message(*data)
+        mark = f"entry{entry_id}"
+        self.chat_area.mark_set(mark, start)
+        self.chat_area.mark_gravity(mark, "right")
+        return tags
+
+    def forget_entry(self, entry_id, tags):
+        self.chat_area.mark_unset(f"entry{entry_id}")
+        for tag in tags:
+            self.chat_area.tag_delete(tag)
+            self.file_links.pop(tag, None)
+
+    def evict_top(self):
+        entry_id, tags = self.rendered.popleft()
+        end = f"entry{self.rendered[0][0]}" if self.rendered else "end-1c"
+        self.chat_area.delete("1.0", end)
+        self.forget_entry(entry_id, tags)
+
+    def evict_bottom(self):
+        entry_id, tags = self.rendered.pop()
+        self.chat_area.delete(f"entry{entry_id}", "end-1c")
+        self.forget_entry(entry_id, tags)
+
+    def on_chat_scroll(self, first, last):
+        self.chat_area.vbar.set(first, last)
+        if not self.scroll_check_pending:
+            self.scroll_check_pending = True
+            self.master.after_idle(self.check_scroll)
+
+    def check_scroll(self):
+        self.scroll_check_pending = False
+        if not self.rendered:
+            return
+        first, last = self.chat_area.yview()
+        at_latest = self.rendered[-1][0] >= self.store.last_id
+        if first <= 0.0 and self.rendered[0][0] > 1:
+            self.load_older()
+        elif last >= 1.0 and not at_latest:
+            self.load_newer()
+        else:
+            self.following = last >= 1.0 and at_latest
+
+    def load_older(self):
+        oldest = self.rendered[0][0]
+        entries = self.store.before(oldest, HISTORY_PAGE)
+        self.chat_area.configure(state="normal")
+        self.chat_area.mark_set("render_top", "1.0")
+        self.chat_area.mark_gravity("render_top", "right")
+        self.render_at = "render_top"
+        try:
+            loaded = [(i, self.render_entry(i, kind, data))
+                      for i, kind, data in entries]
+        finally:
+            self.render_at = "end-1c"
+            self.chat_area.mark_unset("render_top")
+        self.rendered.extendleft(reversed(loaded))
+        while len(self.rendered) > self.history_cap:
+            self.evict_bottom()
+        self.following = False
+        self.chat_area.configure(state="disabled")
+        self.chat_area.yview(f"entry{oldest}")
+
+    def load_newer(self):
+        newest = self.rendered[-1][0]
+        entries = self.store.after(newest, HISTORY_PAGE)
         self.chat_area.configure(state="normal")
+        for i, kind, data in entries:
+            self.rendered.append((i, self.render_entry(i, kind, data)))
+        while len(self.rendered) > self.history_cap:
+            self.evict_top()
+        self.chat_area.configure(state="disabled")
+        self.following = self.rendered[-1][0] >= self.store.last_id
+        self.chat_area.see(f"entry{newest}")
+
+    def click_file_link(self, event):
+        index = self.chat_area.index(f"@{event.x},{event.y}")
+        for tag in self.chat_area.tag_names(index):
+            if tag in self.file_links:
+                file_key, file_name, own = self.file_links[tag]
+                if own:
+                    self.open_file_from_memory(file_name)
+                else:
+                    self.handle_click_file(file_key, tag)
+                return
+
+    def show_file(self, entry_id, sender, file_name, file_size, msg_type,
+                  file_key, timestamp, room=""):
+        # Dipanggil dengan state chat_area "normal"; mengembalikan tag entri
         # hitung ukuran file dalam KB atau MB
         if file_size < 1024:
             size_str = f"{file_size} bytes"
@@ -231,42 +413,36 @@ class ChatClient:
             tag_sender = "left"
 
         # tampilkan head
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         self.chat_area.insert(
-            tk.END, f"{timestamp}", ("timestamp", tag_sender))
+            self.render_at, f"{timestamp}{room_label(room)}",
+            ("timestamp", tag_sender))
         format_sender = sender
-        if msg_type == 4:
+        if msg_type == PRIVATE_FILE:
             format_sender = f"{sender} 🔏 [PM]"
         self.chat_area.insert(
-            tk.END, f"\t{format_sender}\n" if sender != self.nickname else "\n", ("sender", tag_sender))
+            self.render_at, f"\t{format_sender}\n" if sender != self.nickname else "\n", ("sender", tag_sender))
 
         # tampilkan text di chat area
+        link_start = self.chat_area.index(self.render_at)
         self.chat_area.insert(
-            tk.END, f"{file_name} ({size_str})\n", tag_sender)
+            self.render_at, f"{file_name} ({size_str})\n", tag_sender)
 
-        tag_name = file_name+str(random.randint(1, 1000000))
-        # tambahkan tag seperti hyperlink
+        # tambahkan tag seperti hyperlink; binding ada di tag "filelink"
+        tag_name = f"file{entry_id}"
+        self.chat_area.tag_add(
+            tag_name, link_start, f"{link_start} lineend")
         self.chat_area.tag_add(
-            tag_name, "end-2l linestart", "end-2l lineend")
-        warna = "blue" if self.file_masuk[file_name]["is_new"] else "black"
+            "filelink", link_start, f"{link_start} lineend")
+        # warna sama seperti sebelum entri keluar dari jendela: biru belum
+        # diunduh, ungu sudah diunduh
+        entry = self.file_masuk.get(file_key)
+        warna = "blue" if entry is None or entry["is_new"] else "purple"
         warna = "black" if sender == self.nickname else warna
         self.chat_area.tag_configure(
             tag_name, foreground=warna, underline=True)
-
-        # Tambahkan binding interaktif
-        self.chat_area.tag_bind(
-            tag_name, "<Enter>", lambda e: self.chat_area.configure(cursor="hand2"))
-        self.chat_area.tag_bind(tag_name, "<Leave>",
-                                lambda e: self.chat_area.configure(cursor=""))
-        if sender == self.nickname:
-            self.chat_area.tag_bind(
-                tag_name, "<Button-1>", lambda e, f=file_name: self.open_file_from_memory(f))
-        else:
-            self.chat_area.tag_bind(
-                tag_name, "<Button-1>", lambda e, f=file_name, t=tag_name: self.handle_click_file(f, t))
-
-        self.chat_area.configure(state="disabled")
-        self.chat_area.see(tk.END)
+        self.file_links[tag_name] = (
+            file_key, file_name, sender == self.nickname)
+        return [tag_name]
 
     def open_file_from_memory(self, file_name):
         path = self.file_keluar[file_name]
@@ -275,21 +451,27 @@ class ChatClient:
             return
         os.startfile(path)
 
-    def handle_click_file(self, file_name, tag_name):
+    def handle_click_file(self, file_key, tag_name):
         try:
-            file_data = self.file_masuk[file_name]["data"]
-            if not file_data:
-                messagebox.showerror("Error", "File tidak ditemukan.")
+            entry = self.file_masuk[file_key]
+            if "hash" in entry:
+                self.request_file(entry, tag_name)
+                return
+            if not entry["is_new"]:
+                os.startfile(entry["path"])
+                return
+            cached = self.conn.cache.path(entry["cache_key"])
+            if cached is None:
+                messagebox.showerror(
+                    "Error", "File sudah dihapus dari cache.")
                 return
             save_dir = "downloads"
             os.makedirs(save_dir, exist_ok=True)
-            save_path = os.path.join(save_dir, file_name)
-            if not self.file_masuk[file_name]["is_new"]:
-                os.startfile(save_path)
-                return
-            with open(save_path, "wb") as f:
-                f.write(file_data)
-            self.file_masuk[file_name]["is_new"] = False
+            save_path = os.path.join(save_dir, os.path.basename(entry["name"]))
+            # disalin per blok dari cache, tidak dibaca utuh ke memori
+            shutil.copyfile(cached, save_path)
+            entry["is_new"] = False
+            entry["path"] = save_path
             self.chat_area.after(1000, lambda: self.chat_area.tag_config(
                 tag_name, foreground="purple"))
             # untuk windows
@@ -298,23 +480,44 @@ class ChatClient:
             messagebox.showerror("Error", f"Error saat download file: {e}")
             return
 
+    def request_file(self, entry, tag_name):
+        if not entry["is_new"]:
+            os.startfile(entry["path"])
+            return
+        # Isi file baru diminta ke server saat link diklik
+        entry["tag"] = tag_name
+        self.conn.request_file(entry["hash"])
+
+    def open_downloaded(self, event):
+        entry = self.file_masuk.get(event.hash)
+        if entry is not None:
+            entry["is_new"] = False
+            entry["path"] = event.path
+            tag_name = entry.get("tag")
+            if tag_name:
+                self.chat_area.after(1000, lambda: self.chat_area.tag_config(
+                    tag_name, foreground="purple"))
+        # untuk windows
+        os.startfile(event.path)
+
     def select_user_for_pm(self, event):
         select = self.user_listbox.curselection()
         if select:
             user = self.user_listbox.get(select[0])
             self.in_pm_mode = True
             self.pm_target = user
-            self.show_message(f"🔏 Anda memulai PM dengan {user}")
+            self.events.put(Notice(f"🔏 Anda memulai PM dengan {user}"))
 
     def load_or_ask_nickname(self):
         config_path = "config.json"
+        self.config = {}
 
         # Coba baca dari file config
         if os.path.exists(config_path):
             try:
                 with open(config_path, "r") as f:
-                    config = json.load(f)
-                    nickname = config.get("nickname", "")
+                    self.config = json.load(f)
+                    nickname = self.config.get("nickname", "")
                     if nickname.strip():
                         return nickname
             except Exception as e:
@@ -326,30 +529,21 @@ class ChatClient:
                 "Nickname", "Masukkan nickname Anda:")
             if nickname:
                 try:
+                    self.config["nickname"] = nickname
                     with open(config_path, "w") as f:
-                        json.dump({"nickname": nickname}, f)
+                        json.dump(self.config, f)
                 except Exception as e:
                     print(f"[ERROR] Gagal menyimpan config: {e}")
                 return nickname
             else:
                 messagebox.showerror("Error", "Nickname tidak boleh kosong.")
 
-    def show_message(self, message, msg_type=0):
-        self.chat_area.configure(state="normal")
-
+    def show_message(self, content, msg_type=0, sender="", timestamp="",
+                     room=""):
+        # Dipanggil dengan state chat_area "normal"; entri ini tanpa tag sendiri
         if msg_type == 0:  # jika bukan dari server
-            self.chat_area.insert(tk.END, message + "\n", "center")
-            self.chat_area.configure(state="disabled")
-            return
-
-        # pisahkan timestamp , sender dan content
-        try:
-            timestamp, sender, content = message.split("|", 2)
-        except ValueError:
-            # Kalau format salah, tampilkan seadanya
-            self.chat_area.insert(tk.END, content + "\n", "left")
-            self.chat_area.configure(state="disabled")
-            return
+            self.chat_area.insert(self.render_at, content + "\n", "center")
+            return []
 
         if sender == self.nickname:
             tag_sender = 'right'
@@ -360,29 +554,92 @@ class ChatClient:
 
         tag_pm = None
         format_sender = sender
-        if msg_type == 2:  # jika pm
+        if msg_type == PRIVATE:  # jika pm
             tag_pm = "pm"
             format_sender += " 🔏[PM]"
 
-        self.chat_area.insert(tk.END, timestamp or '',
+        self.chat_area.insert(self.render_at,
+                              (timestamp or '') + room_label(room),
                               (tag_sender, "timestamp"))
         self.chat_area.insert(
-            tk.END, f"\t{format_sender}" if tag_sender == 'left' else '', (tag_sender, "sender"))
-        self.chat_area.insert(tk.END,  "\n" + content +
+            self.render_at, f"\t{format_sender}" if tag_sender == 'left' else '', (tag_sender, "sender"))
+        self.chat_area.insert(self.render_at,  "\n" + content +
                               "\n", (tag_sender, tag_pm))
-        self.chat_area.configure(state="disabled")
-        self.chat_area.yview(tk.END)
+        return []
 
     def update_user_list(self, user):
         self.user_listbox.delete(0, tk.END)
+        self.online_users = []
         for u in user:
-            if u != self.nickname:
+            if u and u != self.nickname:
+                self.online_users.append(u)
                 self.user_listbox.insert(tk.END, u)
 
+    def apply_user_delta(self, changes):
+        # "+nama" bergabung, "-nama" keluar; hanya baris itu yang diubah
+        for change in changes:
+            sign, user = change[:1], change[1:]
+            if not user or user == self.nickname:
+                continue
+            if sign == "+" and user not in self.online_users:
+                self.online_users.append(user)
+                self.user_listbox.insert(tk.END, user)
+            elif sign == "-" and user in self.online_users:
+                index = self.online_users.index(user)
+                del self.online_users[index]
+                self.user_listbox.delete(index)
+
+    def select_room(self, event):
+        select = self.room_listbox.curselection()
+        if select:
+            self.room = self.room_listbox.get(select[0])
+
+    def join_room(self):
+        room = simpledialog.askstring(
+            "Room", "Nama room:", parent=self.master)
+        if not room or not room.strip():
+            return
+        self.joining = room.strip()
+        try:
+            self.conn.join_room(self.joining)
+        except OSError:
+            messagebox.showerror("Error", "Error saat bergabung ke room.")
+
+    def leave_room(self):
+        if self.room is None:
+            return
+        try:
+            self.conn.leave_room(self.room)
+        except OSError:
+            messagebox.showerror("Error", "Error saat keluar dari room.")
+
+    def update_room_list(self, rooms):
+        # Dari [ROOMS] server; room pilihan tetap kalau masih diikuti
+        self.rooms = list(rooms)
+        if self.joining in self.rooms:
+            self.room, self.joining = self.joining, None
+        if self.room not in self.rooms:
+            self.room = (DEFAULT_ROOM if DEFAULT_ROOM in self.rooms
+                         else next(iter(self.rooms), None))
+        self.room_listbox.delete(0, tk.END)
+        for room in self.rooms:
+            self.room_listbox.insert(tk.END, room)
+        if self.room is not None:
+            self.room_listbox.selection_set(self.rooms.index(self.room))
+
     def exit_pm(self):
         self.in_pm_mode = False
         self.pm_target = None
-        self.show_message("🔐 Anda keluar dari PM.")
+        self.events.put(Notice("🔐 Anda keluar dari PM."))
+
+
+def now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def room_label(room):
+    # pesan lobby tanpa label supaya tampilan lama tidak berubah
+    return f"  #{room}" if room and room != DEFAULT_ROOM else ""
 
 
 if __name__ == '__main__':
@@ -0,0 +1,57 @@
+import itertools
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+
+CACHE_BYTES = 256 * 1024 * 1024
+
+
+class FileCache:
+    # File yang diterima lewat frame tipe 3/4 ditulis ke sini, di RAM hanya
+    # ada metadatanya. Total ukuran dibatasi max_bytes; yang paling lama
+    # tidak dibuka dibuang lebih dulu (LRU).
+    def __init__(self, root=None, max_bytes=CACHE_BYTES):
+        if root is None:
+            self.tmp_dir = tempfile.TemporaryDirectory(prefix="chatclient-")
+            root = self.tmp_dir.name
+        os.makedirs(root, exist_ok=True)
+        self.root = root
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.keys = itertools.count(1)
+        self.entries = OrderedDict()  # key -> (path, size)
+        self.total = 0
+
+    def begin(self, name):
+        # Nama file diberi awalan key supaya file bernama sama tidak saling
+        # menimpa; ujung nama (ekstensi) tetap untuk dibuka aplikasi lain
+        with self.lock:
+            key = next(self.keys)
+        name = os.path.basename(name)[-100:]
+        return key, os.path.join(self.root, f"{key}_{name}")
+
+    def add(self, key, path, size):
+        with self.lock:
+            self.entries[key] = (path, size)
+            self.total += size
+            # file terbaru selalu disimpan walau lebih besar dari batas
+            while self.total > self.max_bytes and len(self.entries) > 1:
+                _, (old_path, old_size) = self.entries.popitem(last=False)
+                self.total -= old_size
+                self.remove(old_path)
+
+    def path(self, key):
+        # None kalau sudah dibuang dari cache
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            self.entries.move_to_end(key)
+            return entry[0]
+
+    def remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:  # windows: masih dibuka aplikasi lain
+            pass
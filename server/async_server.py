@@ -0,0 +1,310 @@
+import asyncio
+import threading
+import os
+import logging
+import time
+
+from server import ChatServer, LISTEN_BACKLOG
+from serverlog import stop_logging, env_settings
+from registry import NicknameTaken, DEFAULT_ROOM
+from outbox import AsyncOutbox, STALL
+from protocol import (make_frame, parse_hello, HEADER, FileFrame, V2_HEADER,
+                      VERSION_2, parse_v2_header, CHUNK_SIZE, file_view,
+                      MMAP_SLICE)
+
+
+def raise_nofile_limit():
+    # Ribuan koneksi butuh ribuan file descriptor
+    try:
+        import resource
+    except ImportError:  # windows tidak punya modul resource
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY or soft < hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ValueError, OSError) as e:
+            logging.info(f"Gagal menaikkan batas file descriptor: {e}")
+
+
+class AsyncChatServer(ChatServer):
+    # Satu event loop untuk semua koneksi, bukan satu thread per client.
+    # Format wire tetap sama: header "!II", tipe pesan 1-5 dan handshake NICK.
+    PROFILED_METHODS = ChatServer.PROFILED_METHODS + ("send_file_body",)
+
+    def __init__(self, host, port, backlog=LISTEN_BACKLOG, **kwargs):
+        super().__init__(host, port, **kwargs)
+        self.backlog = backlog
+        self.loop = None
+        self.loop_thread = None
+        self.tasks = set()
+
+    def start(self):
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
+
+    async def serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread = threading.get_ident()
+        self.messages_queue = asyncio.Queue()
+        self.dispatch_open = asyncio.Event()
+        self.dispatch_open.set()
+        try:
+            raise_nofile_limit()
+            self.listen(self.backlog)
+            self.server_socket.setblocking(False)
+            server = await asyncio.start_server(
+                self.handle_client, sock=self.server_socket)
+            self.running = True
+            logging.info(f"Server (asyncio) Berjalan di {self.host}:{self.port}")
+            self.print_commands()
+            self.start_metrics()
+            self.start_idle_ticker()
+        except Exception as e:
+            logging.info(f"Gagal memulai server: {e}")
+            stop_logging()
+            os._exit(1)
+            return
+
+        if self.console:
+            threading.Thread(target=self.handle_admin_input,
+                             daemon=True).start()
+
+        async with server:
+            await self.dispatch_message()
+
+    def broadcast_message(self, sender, message, persist=True,
+                          room=DEFAULT_ROOM, client=None):
+        # Bisa dipanggil dari thread admin maupun dari event loop. Dari
+        # event loop langsung masuk antrian, supaya pembaca pengirimnya
+        # sudah ditahan sebelum frame berikutnya dibaca.
+        item = (sender, message, persist, room, time.perf_counter())
+        if threading.get_ident() == self.loop_thread:
+            self.enqueue_message(item, client)
+        else:
+            self.loop.call_soon_threadsafe(self.enqueue_message, item, client)
+
+    def enqueue_message(self, item, client):
+        # Batas antrian dispatch: notifikasi server dibuang, pesan client
+        # tetap masuk tapi pembaca client itu berhenti membaca frame baru
+        # sampai antrian turun lagi (dispatch_open). Client lain tetap
+        # dibaca; antrian paling banyak lebih satu pesan per client.
+        if self.messages_queue.qsize() >= self.dispatch_queue_size:
+            if client is None:
+                self.metrics.notice_dropped()
+                return
+            self.dispatch_backpressure(client)
+            session = self.clients.session(client)
+            if session is not None:
+                session.dispatch_blocked = True
+            self.dispatch_open.clear()
+        self.messages_queue.put_nowait(item)
+
+    def spawn(self, coro):
+        # Simpan referensi task supaya tidak dibersihkan GC di tengah jalan
+        task = asyncio.create_task(coro)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    def create_outbox(self):
+        return AsyncOutbox(self.outbox_size, self.overflow_policy)
+
+    async def client_writer(self, writer, session):
+        # drain() hanya menunggu client ini, client lain tetap jalan
+        outbox = session.outbox
+        while True:
+            frame = await outbox.get()
+            if frame is None:
+                return
+            try:
+                started = time.perf_counter()
+                if isinstance(frame, FileFrame):
+                    session.streaming = True
+                    writer.write(frame.head)
+                    await writer.drain()
+                    await self.send_file_body(writer, frame)
+                    session.streaming = False
+                else:
+                    # writelines memakai sendmsg, header dan body tidak
+                    # digabung
+                    writer.writelines(frame)
+                    await writer.drain()
+                self.metrics.frame_sent(session, frame, started)
+            except Exception as e:
+                if outbox.closed:  # client sudah dilepas lebih dulu
+                    return
+                logging.error(
+                    f"Error saat mengirim data ke {self.clients.nickname(writer)}: {e}")  # noqa: E128
+                self.remove_client(writer)
+                return
+
+    async def send_file_body(self, writer, frame):
+        # sendfile kalau transport mendukung; kalau tidak (windows, TLS)
+        # potongan memoryview mmap, bukan buffer baca asyncio. File kosong
+        # cukup header saja: loop.sendfile menolak count 0
+        if not frame.size:
+            return
+        try:
+            with open(frame.path, "rb") as f:
+                await self.loop.sendfile(writer.transport, f, frame.offset,
+                                         frame.size, fallback=False)
+            return
+        except asyncio.SendfileNotAvailableError:
+            pass
+        view = file_view(frame.path, frame.offset, frame.size)
+        for start in range(0, len(view), MMAP_SLICE):
+            writer.write(view[start:start + MMAP_SLICE])
+            await writer.drain()
+
+    def close_connection(self, writer):
+        # abort, bukan close: close menunggu buffer kirim habis, yang tidak
+        # akan terjadi untuk peer setengah terbuka
+        writer.transport.abort()
+
+    def enable_keepalive(self, writer):
+        super().enable_keepalive(writer.get_extra_info("socket"))
+
+    def call_later(self, delay, callback):
+        # Timer dijalankan di event loop, bukan thread terpisah
+        self.loop.call_soon_threadsafe(self.loop.call_later, delay, callback)
+
+    def call_soon(self, callback, *args):
+        self.loop.call_soon_threadsafe(callback, *args)
+
+    def start_idle_ticker(self):
+        # tick wheel sebagai callback event loop, dijadwalkan ulang sendiri
+        self.loop.call_later(self.idle_wheel.tick, self.idle_tick)
+
+    def idle_tick(self):
+        self.check_idle()
+        if self.running:
+            self.loop.call_later(self.idle_wheel.tick, self.idle_tick)
+
+    async def run_blocking(self, done, func, *args):
+        # Ditunggu pembaca client pengirimnya saja, koneksi lain tetap
+        # dilayani selama func berjalan di thread pool
+        done(await asyncio.to_thread(func, *args))
+
+    async def dispatch_message(self):
+        while self.running:
+            item = await self.messages_queue.get()
+            if self.messages_queue.qsize() < self.dispatch_queue_size:
+                self.dispatch_open.set()
+            self.deliver_message(*item)
+
+    async def handle_client(self, reader, writer):
+        addr = writer.get_extra_info("peername")
+        nickname = None
+        try:
+            writer.write("NICK".encode('utf-8'))
+            nickname, options = parse_hello(await reader.read(1024))
+            if not nickname:
+                raise ValueError("Nickname kosong")
+            compress, version, caps = self.negotiate(options)
+            outbox = self.create_outbox()
+            if caps:
+                outbox.put(make_frame(5, f"[CAPS] {caps}"))
+            try:
+                session = await self.clients.add_async(
+                    writer, nickname, outbox, addr, compress, version)
+            except NicknameTaken as e:
+                writer.writelines(make_frame(5, f"[ERROR] {e}"))
+                raise
+            session.limiter = self.limits.limiter()
+            session.user_delta = bool(options.get("delta"))
+            session.file_info = bool(options.get("files"))
+            self.track_idle(writer, session, options)
+            if self.capture is not None:
+                self.capture.opened(session)
+            self.metrics.connected()
+            self.spawn(self.client_writer(writer, session))
+            logging.info(f"Client {addr} bergabung dengan nama {nickname}")
+            join_msg = f"{nickname} Bergabung dalam obrolan"
+            self.broadcast_message(self.admin_nickname, join_msg,
+                                   persist=False)
+            self.send_user_list(writer)
+            self.presence_changed(nickname, "+")
+            self.replay_history(writer, nickname, options.get("since"))
+
+            while self.running:
+                try:
+                    if self.overflow_policy == STALL:
+                        # Jangan baca dari client yang belum menguras outbox-nya
+                        await outbox.wait_not_lagging()
+                    if session.dispatch_blocked:
+                        # pesan terakhirnya masuk saat antrian dispatch
+                        # penuh: frame baru ditunggu dulu
+                        await self.dispatch_open.wait()
+                        session.dispatch_blocked = False
+                    # Menerima header dan data pesan dari klien; byte
+                    # pertama header membedakan frame v1 dan v2
+                    header = await reader.readexactly(HEADER.size)
+                    target = None
+                    if header[0] == VERSION_2 and session.version == VERSION_2:
+                        header += await reader.readexactly(
+                            V2_HEADER.size - HEADER.size)
+                        msg_type, _, _, sender_len, target_len, length = (
+                            parse_v2_header(header))
+                        names = await reader.readexactly(
+                            sender_len + target_len)
+                        target = names[sender_len:]
+                        header += names
+                    else:
+                        msg_type, length = HEADER.unpack(header)
+                    session.last_seen = time.monotonic()
+                    self.metrics.frame_received(
+                        session, msg_type, len(header) + length)
+                    ok, wait = self.admit_frame(writer, session, msg_type,
+                                                length)
+                    if wait:
+                        await asyncio.sleep(wait)
+                    if not ok:
+                        await self.discard(reader, length)
+                        continue
+                    data = await reader.readexactly(length)
+
+                    pending = self.handle_frame(writer, nickname, msg_type,
+                                                data, target)
+                    if pending is not None:
+                        await pending
+
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    logging.info(f"Client {nickname} Terputus")
+                    break
+                except Exception as e:
+                    logging.error(f"Error saat menangani {nickname} {addr}: {e}")  # noqa: E128
+                    break
+        except Exception as e:
+            logging.error(f"Error saat menangani {addr}: {e}")
+        finally:
+            self.remove_client(writer)
+            writer.close()
+
+    async def discard(self, reader, n):
+        # Body frame yang ditolak dibaca per potongan lalu dibuang
+        while n:
+            n -= len(await reader.readexactly(min(n, CHUNK_SIZE)))
+
+    def shutdown(self):
+        self.running = False
+        self.loop.call_soon_threadsafe(self.notify_shutdown)
+        time.sleep(5)
+        stop_logging()
+        os._exit(1)
+
+    def notify_shutdown(self):
+        frame = make_frame(5, "[INFO] Server shutdown")
+        for c in self.clients.connections():
+            self.send_frame(c, frame)
+
+
+if __name__ == '__main__':
+    host = input("Server IP Default (127.0.0.1) : ").strip() or "127.0.0.1"
+    port = input("Port Default (65432) : ").strip() or 65432
+    server = AsyncChatServer(host=host, port=port,
+                             metrics_port=os.environ.get("CHAT_METRICS_PORT"),
+                             **env_settings())
+    server.start()
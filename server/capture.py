@@ -0,0 +1,196 @@
+import itertools
+import json
+import os
+import queue
+import struct
+import threading
+import time
+from collections import namedtuple
+
+from protocol import FILE_START, FILE_CHUNK, TRANSFER_ID, VERSION_2
+from registry import DEFAULT_ROOM
+
+# Rekaman semua frame masuk untuk diputar ulang dengan bench/replay.py.
+# File diawali TRACE_HEADER (magic, waktu mulai epoch, flags), disusul
+# record: RECORD (waktu relatif dalam µs, id koneksi, event, msg_type,
+# panjang target, panjang body asli, panjang body yang disimpan), lalu
+# target dan body yang disimpan. Di trace yang diredaksi body yang disimpan
+# hanya bagian strukturnya (nama tujuan PM, id transfer, metadata upload),
+# sisanya diisi ulang saat replay sepanjang body aslinya.
+TRACE_MAGIC = b"CHATCAP1"
+TRACE_HEADER = struct.Struct("!8sdB")
+RECORD = struct.Struct("!QIBIHII")
+REDACTED = 0x01
+OPEN = 1   # target: nickname, body: opsi handshake JSON (+ "rooms" lain)
+FRAME = 2  # frame setelah didekompresi, target hanya dari frame v2
+CLOSE = 3
+# Record yang belum ditulis; kalau penuh record baru dibuang (dihitung)
+# daripada menahan thread client
+CAPTURE_QUEUE_SIZE = 100000
+WRITE_BUFFER = 1024 * 1024
+
+TraceRecord = namedtuple("TraceRecord",
+                         "time_us conn event msg_type target body length")
+
+
+def default_capture_path():
+    return f"capture-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.trace"
+
+
+class Capture:
+    # Dipasang di server.capture selama perekaman. Thread trafik hanya
+    # membuat header record dan put_nowait; file ditulis thread sendiri.
+    def __init__(self, path, redact=False):
+        self.path = path
+        self.redact = redact
+        self.file = open(path, "wb", buffering=WRITE_BUFFER)
+        self.file.write(TRACE_HEADER.pack(TRACE_MAGIC, time.time(),
+                                          REDACTED if redact else 0))
+        self.started = time.perf_counter()
+        self.queue = queue.Queue(CAPTURE_QUEUE_SIZE)
+        # waktu diambil dan record dimasukkan di bawah lock yang sama,
+        # supaya urutan di file sama dengan urutan waktunya
+        self.lock = threading.Lock()
+        self.ids = itertools.count(1)
+        self.conns = {}    # koneksi -> id di trace
+        self.aliases = {}  # nickname -> nama samaran (trace diredaksi)
+        self.records = 0
+        self.dropped = 0
+        self.thread = threading.Thread(target=self.write_records,
+                                       daemon=True)
+        self.thread.start()
+
+    def opened(self, session):
+        # Koneksi baru, atau yang sudah tersambung saat perekaman dimulai.
+        # Opsi handshake disusun ulang dari hasil negosiasinya.
+        with self.lock:
+            conn_id = self.conns.get(session.conn)
+            if conn_id is not None:
+                return conn_id
+            conn_id = self.conns[session.conn] = next(self.ids)
+        options = {"resume": 1}
+        if session.version == VERSION_2:
+            options["proto"] = VERSION_2
+        if session.compress:
+            options["compress"] = ["zlib"]
+        if session.heartbeat:
+            options["ping"] = 1
+        if session.user_delta:
+            options["delta"] = 1
+        if session.file_info:
+            options["files"] = 1
+        rooms = sorted(session.rooms - {DEFAULT_ROOM})
+        if rooms:
+            options["rooms"] = rooms
+        self.put(conn_id, OPEN, 0, self.name(session.nickname),
+                 json.dumps(options).encode('utf-8'))
+        return conn_id
+
+    def closed(self, session):
+        with self.lock:
+            conn_id = self.conns.pop(session.conn, None)
+        if conn_id is not None:
+            self.put(conn_id, CLOSE)
+
+    def frame(self, session, msg_type, data, target=None):
+        if session is None:  # sudah dilepas thread lain
+            return
+        conn_id = self.conns.get(session.conn)
+        if conn_id is None:
+            conn_id = self.opened(session)
+        target = target or b""
+        length = len(data)
+        if self.redact:
+            target, data, length = self.redacted(msg_type, data, target)
+        self.put(conn_id, FRAME, msg_type, bytes(target), data, length)
+
+    def put(self, conn_id, event, msg_type=0, target=b"", body=b"",
+            length=None):
+        if length is None:
+            length = len(body)
+        with self.lock:
+            elapsed = int((time.perf_counter() - self.started) * 1_000_000)
+            head = RECORD.pack(elapsed, conn_id, event, msg_type,
+                               len(target), length, len(body))
+            try:
+                self.queue.put_nowait((head, target, body))
+                self.records += 1
+            except queue.Full:
+                self.dropped += 1
+
+    def name(self, nickname):
+        if not self.redact:
+            return nickname.encode('utf-8')
+        with self.lock:
+            alias = self.aliases.get(nickname)
+            if alias is None:
+                alias = self.aliases[nickname] = f"user{len(self.aliases) + 1}"
+        return alias.encode('utf-8')
+
+    def redacted(self, msg_type, data, target):
+        # (target, bagian body yang disimpan, panjang body asli). Isi pesan
+        # dan file dibuang, nickname diganti nama samaran, struktur yang
+        # dibutuhkan server saat replay tetap ada.
+        if msg_type == 1:
+            return target, b"", len(data)
+        if msg_type == 2:
+            if target:
+                return self.name(target.decode('utf-8')), b"", len(data)
+            name, _, text = bytes(data).partition(b" ")
+            kept = self.name(name.decode('utf-8')) + b" "
+            return target, kept, len(kept) + len(text)
+        if msg_type in (3, 4):
+            parts = bytes(data[:1024]).split(b"|", msg_type - 2)
+            kept = b"file|"
+            if msg_type == 4:
+                kept = self.name(parts[0].decode('utf-8')) + b"|" + kept
+            content = len(data) - sum(len(p) + 1 for p in parts[:-1])
+            return target, kept, len(kept) + content
+        if msg_type == FILE_START:
+            # tanpa hash: isi pengganti saat replay tidak akan cocok
+            meta = json.loads(bytes(data))
+            meta["name"] = "file"
+            meta.pop("hash", None)
+            if meta.get("target"):
+                meta["target"] = self.name(meta["target"]).decode('utf-8')
+            kept = json.dumps(meta).encode('utf-8')
+            return target, kept, len(kept)
+        if msg_type == FILE_CHUNK:
+            return target, bytes(data[:TRANSFER_ID.size]), len(data)
+        return target, bytes(data), len(data)
+
+    def write_records(self):
+        with self.file:
+            while True:
+                parts = self.queue.get()
+                if parts is None:
+                    return
+                for part in parts:
+                    self.file.write(part)
+
+    def stop(self):
+        self.queue.put(None)
+        self.thread.join()
+        return self.records, self.dropped
+
+
+def read_trace(path):
+    # (waktu mulai epoch, flags, iterator TraceRecord); body tersimpan bisa
+    # lebih pendek dari length di trace yang diredaksi
+    f = open(path, "rb")
+    magic, started, flags = TRACE_HEADER.unpack(f.read(TRACE_HEADER.size))
+    if magic != TRACE_MAGIC:
+        f.close()
+        raise ValueError(f"{path} bukan file trace capture")
+
+    def records():
+        with f:
+            while len(head := f.read(RECORD.size)) == RECORD.size:
+                (time_us, conn, event, msg_type, target_len, length,
+                 kept) = RECORD.unpack(head)
+                target = f.read(target_len)
+                body = f.read(kept)
+                yield TraceRecord(time_us, conn, event, msg_type, target,
+                                  body, length)
+
+    return started, flags, records()
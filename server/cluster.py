@@ -0,0 +1,553 @@
+import asyncio
+import itertools
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import socket
+import struct
+import tempfile
+import threading
+
+from protocol import HEADER, recv_exact
+from registry import Registry, NicknameTaken, DEFAULT_ROOM
+from server import ChatServer
+from async_server import AsyncChatServer
+from serverlog import setup_logging, stop_logging, env_settings, LOG_MAX_BYTES
+
+# Bus lokal antar proses (Unix domain socket, header "!II" seperti protokol
+# client). Semua yang harus terlihat client di worker lain dikirim ke hub,
+# lalu hub meneruskannya ke semua worker dalam satu urutan yang sama.
+BUS_HELLO = 1    # worker -> hub: {"worker": i, "last_seq": n}
+BUS_CLAIM = 2    # worker -> hub: {"id": n, "nick": ...}, dijawab BUS_CLAIMED
+BUS_CLAIMED = 3  # hub -> worker: {"id": n, "ok": bool}
+BUS_RELEASE = 4  # worker -> hub: nickname
+BUS_PUBLISH = 5  # worker -> hub: flag "!B" + event JSON
+BUS_EVENT = 6    # hub -> semua worker: seq "!Q" (0 = tanpa seq) + event JSON
+BUS_ADMIN = 7    # hub -> semua worker: perintah admin
+
+PERSIST = 0x01   # event masuk history, hub memberi seq global
+FLAGS = struct.Struct("!B")
+SEQ = struct.Struct("!Q")
+CLAIM_TIMEOUT = 5
+SHUTDOWN_WAIT = 10
+
+
+def bus_message(msg_type, payload):
+    return HEADER.pack(msg_type, len(payload)) + payload
+
+
+def read_bus(sock):
+    msg_type, length = HEADER.unpack(recv_exact(sock, HEADER.size))
+    return msg_type, recv_exact(sock, length)
+
+
+def encode_event(event):
+    return json.dumps(event).encode('utf-8')
+
+
+def presence_event(changes):
+    # changes: [[nickname, "+"/"-"], ...], diteruskan sebagai satu delta
+    return encode_event({"kind": "presence", "changes": changes})
+
+
+class Link:
+    # Sambungan hub ke satu worker. Pesan keluar lewat antrian dan thread
+    # penulis sendiri, jadi hub tidak pernah menunggu worker yang lambat
+    # sambil memegang lock (worker itu mungkin sedang menunggu hub).
+    def __init__(self, sock):
+        self.sock = sock
+        self.outgoing = queue.Queue()
+        threading.Thread(target=self.write_loop, daemon=True).start()
+
+    def send(self, msg_type, payload):
+        self.outgoing.put(bus_message(msg_type, payload))
+
+    def write_loop(self):
+        while True:
+            data = self.outgoing.get()
+            if data is None:
+                return
+            try:
+                self.sock.sendall(data)
+            except OSError:
+                return  # worker mati, dilepas oleh thread pembacanya
+
+    def close(self):
+        self.outgoing.put(None)
+        try:
+            self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.sock.close()
+
+
+class Hub:
+    # Berjalan di proses induk. Seq diberikan dan event dimasukkan ke antrian
+    # semua worker di bawah satu lock, jadi setiap worker melihat event dengan
+    # urutan yang sama (urutan per pengirim ikut terjaga). Hub juga memegang
+    # daftar nickname semua worker supaya satu nickname hanya dipakai sekali.
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.links = []
+        self.claims = {}  # nickname -> link worker pemiliknya
+        self.seq = 0
+        if os.path.exists(path):
+            os.remove(path)
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.bind(path)
+        self.sock.listen()
+
+    def serve(self):
+        while True:
+            sock, _ = self.sock.accept()
+            threading.Thread(target=self.handle_link, args=(Link(sock),),
+                             daemon=True).start()
+
+    def handle_link(self, link):
+        with self.lock:
+            self.links.append(link)
+            # worker baru mengenal nickname yang sudah online di worker lain
+            if self.claims:
+                link.send(BUS_EVENT, SEQ.pack(0) + presence_event(
+                    [[nickname, "+"] for nickname in self.claims]))
+        try:
+            while True:
+                msg_type, data = read_bus(link.sock)
+                self.handle(link, msg_type, data)
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.drop_link(link)
+
+    def handle(self, link, msg_type, data):
+        with self.lock:
+            if msg_type == BUS_HELLO:
+                # seq history dilanjutkan dari worker yang paling jauh
+                self.seq = max(self.seq, json.loads(data)["last_seq"])
+            elif msg_type == BUS_CLAIM:
+                claim = json.loads(data)
+                ok = claim["nick"] not in self.claims
+                if ok:
+                    self.claims[claim["nick"]] = link
+                link.send(BUS_CLAIMED,
+                          encode_event({"id": claim["id"], "ok": ok}))
+            elif msg_type == BUS_RELEASE:
+                nickname = data.decode('utf-8')
+                if self.claims.get(nickname) is link:
+                    del self.claims[nickname]
+            elif msg_type == BUS_PUBLISH:
+                (flags,) = FLAGS.unpack_from(data)
+                self.publish(bytes(data[FLAGS.size:]), flags & PERSIST)
+
+    def publish(self, event, persist=False):
+        # Dipanggil dengan lock dipegang
+        seq = 0
+        if persist:
+            self.seq += 1
+            seq = self.seq
+        payload = SEQ.pack(seq) + event
+        for link in self.links:
+            link.send(BUS_EVENT, payload)
+
+    def broadcast(self, event, persist=False):
+        with self.lock:
+            self.publish(encode_event(event), persist)
+
+    def admin(self, command):
+        with self.lock:
+            for link in self.links:
+                link.send(BUS_ADMIN, command.encode('utf-8'))
+
+    def drop_link(self, link):
+        # Worker mati: nickname-nya dilepas dan worker lain diberi tahu
+        with self.lock:
+            if link in self.links:
+                self.links.remove(link)
+            gone = [n for n, l in self.claims.items() if l is link]
+            for nickname in gone:
+                del self.claims[nickname]
+            if gone:
+                self.publish(presence_event(
+                    [[nickname, "-"] for nickname in gone]))
+        link.close()
+
+    def nicknames(self):
+        with self.lock:
+            return list(self.claims)
+
+    def close(self):
+        self.sock.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class BusClient:
+    # Sambungan satu worker ke hub. Boleh dikirimi dari thread mana saja
+    # (dijaga lock); satu thread membaca event lewat run().
+    def __init__(self, path):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self.send_lock = threading.Lock()
+        self.lock = threading.Lock()
+        self.claim_ids = itertools.count(1)
+        self.waiters = {}  # id claim -> antrian jawaban hub
+        self.online = {}   # nickname di semua worker, urut bergabung
+
+    def send(self, msg_type, payload):
+        with self.send_lock:
+            self.sock.sendall(bus_message(msg_type, payload))
+
+    def hello(self, index, last_seq):
+        self.send(BUS_HELLO,
+                  encode_event({"worker": index, "last_seq": last_seq}))
+
+    def request_claim(self, nickname, resolve):
+        # resolve(ok) dipanggil thread bus saat hub menjawab
+        claim_id = next(self.claim_ids)
+        with self.lock:
+            self.waiters[claim_id] = resolve
+        try:
+            self.send(BUS_CLAIM,
+                      encode_event({"id": claim_id, "nick": nickname}))
+        except BaseException:
+            self.forget_claim(claim_id)
+            raise
+        return claim_id
+
+    def forget_claim(self, claim_id):
+        with self.lock:
+            self.waiters.pop(claim_id, None)
+
+    def claim(self, nickname):
+        answers = queue.Queue(1)
+        claim_id = self.request_claim(nickname, answers.put)
+        try:
+            return answers.get(timeout=CLAIM_TIMEOUT)
+        except queue.Empty:
+            return False
+        finally:
+            self.forget_claim(claim_id)
+
+    async def claim_async(self, nickname):
+        # Untuk engine async: jawaban hub diteruskan ke event loop lewat
+        # call_soon_threadsafe, loop tetap melayani koneksi lain selama
+        # menunggu
+        loop = asyncio.get_running_loop()
+        answer = loop.create_future()
+
+        def resolve(ok):
+            loop.call_soon_threadsafe(
+                lambda: answer.done() or answer.set_result(ok))
+
+        claim_id = self.request_claim(nickname, resolve)
+        try:
+            return await asyncio.wait_for(answer, CLAIM_TIMEOUT)
+        except TimeoutError:
+            return False
+        finally:
+            self.forget_claim(claim_id)
+
+    def release(self, nickname):
+        self.send(BUS_RELEASE, nickname.encode('utf-8'))
+
+    def publish(self, event, persist=False):
+        self.send(BUS_PUBLISH, FLAGS.pack(PERSIST if persist else 0)
+                  + encode_event(event))
+
+    def is_online(self, nickname):
+        with self.lock:
+            return nickname in self.online
+
+    def nicknames(self):
+        with self.lock:
+            return list(self.online)
+
+    def run(self, on_event, on_admin):
+        # Hub hilang berarti proses induk mati: worker ikut berhenti
+        try:
+            while True:
+                msg_type, data = read_bus(self.sock)
+                if msg_type == BUS_CLAIMED:
+                    answer = json.loads(data)
+                    with self.lock:
+                        waiter = self.waiters.get(answer["id"])
+                    if waiter is not None:
+                        waiter(answer["ok"])
+                elif msg_type == BUS_EVENT:
+                    (seq,) = SEQ.unpack_from(data)
+                    event = json.loads(data[SEQ.size:])
+                    if event["kind"] == "presence":
+                        with self.lock:
+                            for nickname, change in event["changes"]:
+                                if change == "+":
+                                    self.online[nickname] = True
+                                else:
+                                    self.online.pop(nickname, None)
+                    on_event(seq or None, event)
+                elif msg_type == BUS_ADMIN:
+                    # perintah yang gagal tidak boleh memutus bus (atau
+                    # dikira bus putus karena OSError)
+                    command = data.decode('utf-8')
+                    try:
+                        on_admin(command)
+                    except Exception as e:
+                        logging.error(
+                            f"Error saat menjalankan {command!r}: {e}")
+        except (ConnectionError, OSError) as e:
+            logging.error(f"Bus ke proses induk terputus: {e}")
+        stop_logging()
+        os._exit(1)
+
+
+class ClusterRegistry(Registry):
+    # Registry lokal satu worker; nickname di-claim dulu di hub supaya
+    # namespace-nya tetap satu untuk semua worker
+    def __init__(self, bus):
+        super().__init__()
+        self.bus = bus
+
+    def add(self, conn, nickname, *args):
+        if not self.bus.claim(nickname):
+            raise NicknameTaken(f"Nickname {nickname} sudah dipakai")
+        return self.add_claimed(conn, nickname, *args)
+
+    async def add_async(self, conn, nickname, *args):
+        if not await self.bus.claim_async(nickname):
+            raise NicknameTaken(f"Nickname {nickname} sudah dipakai")
+        return self.add_claimed(conn, nickname, *args)
+
+    def add_claimed(self, conn, nickname, *args):
+        try:
+            return super().add(conn, nickname, *args)
+        except NicknameTaken:
+            self.bus.release(nickname)
+            raise
+
+    def remove(self, conn):
+        session = super().remove(conn)
+        if session is not None:
+            self.bus.release(session.nickname)
+        return session
+
+    def nicknames(self):
+        # semua worker; yang baru bergabung di sini mungkin belum kembali
+        # dari hub sebagai presence
+        return list(dict.fromkeys(self.bus.nicknames() + super().nicknames()))
+
+
+class ClusterWorker:
+    # Dicampur ke ChatServer atau AsyncChatServer. Pengiriman ke client
+    # (deliver_*, presence) diganti publish ke hub; event yang kembali dari
+    # hub, termasuk milik worker ini sendiri, baru dikirim ke client lokal.
+    # History tiap worker terpisah tapi berisi semua pesan dengan seq dari
+    # hub, jadi "since" tetap berlaku di worker mana pun client tersambung.
+    def __init__(self, index, bus_path, host, port, metrics_port=None,
+                 **kwargs):
+        self.index = index
+        if metrics_port:
+            metrics_port = int(metrics_port) + index
+        super().__init__(host, port, metrics_port=metrics_port,
+                         history_dir=os.path.join("history", f"worker-{index}"),
+                         log_path=f"server-{index}.log", **kwargs)
+        self.reuse_port = True
+        self.console = False
+        self.bus = BusClient(bus_path)
+        self.clients = ClusterRegistry(self.bus)
+        self.bus.hello(index, self.history.last_seq)
+
+    def listen(self, backlog):
+        super().listen(backlog)
+        # bus baru dibaca setelah server (dan event loop-nya) siap
+        threading.Thread(target=self.bus.run,
+                         args=(self.bus_event, self.bus_admin),
+                         daemon=True).start()
+
+    def bus_event(self, seq, event):
+        self.call_soon(self.apply_event, seq, event)
+
+    def apply_event(self, seq, event):
+        kind = event["kind"]
+        if kind == "text":
+            super().deliver_message(event["sender"], event["message"],
+                                    event["persist"], event["room"],
+                                    event.get("queued_at"), seq)
+        elif kind == "pm":
+            super().deliver_private(event["sender"], event["target"],
+                                    event["message"], seq)
+        elif kind == "file_info":
+            super().deliver_file_info(event["info"], event["target"])
+        elif kind == "file":
+            super().deliver_file(event["type"], event["sender"],
+                                 event["name"], event["hash"],
+                                 room=event["room"], target=event["target"])
+        elif kind == "presence":
+            super().presence_changes(event["changes"])
+
+    def bus_admin(self, command):
+        if command.startswith("/exit"):
+            threading.Thread(target=self.shutdown, daemon=True).start()
+            return
+        print(f"--- worker {self.index} (pid {os.getpid()}) ---")
+        self.admin_command(command)
+
+    def deliver_message(self, sender, message, persist, room=DEFAULT_ROOM,
+                        queued_at=None, seq=None):
+        # queued_at dari perf_counter: jam monotonic yang sama di semua
+        # proses, jadi latency dispatch tetap terukur di worker penerima
+        self.bus.publish({"kind": "text", "sender": sender,
+                          "message": message, "persist": persist,
+                          "room": room, "queued_at": queued_at}, persist)
+
+    def deliver_private(self, sender, target, message, seq=None):
+        self.bus.publish({"kind": "pm", "sender": sender, "target": target,
+                          "message": message}, persist=True)
+
+    def deliver_file_info(self, info, target=None):
+        self.bus.publish({"kind": "file_info", "info": info,
+                          "target": target})
+
+    def deliver_file(self, msg_type, sender, file_name, file_hash,
+                     room=None, target=None):
+        # isi file sudah di FileStore bersama, cukup hash-nya yang lewat bus
+        self.bus.publish({"kind": "file", "type": msg_type, "sender": sender,
+                          "name": file_name, "hash": file_hash, "room": room,
+                          "target": target})
+
+    def start_capture(self, path=None, redact=False):
+        # perintah diteruskan ke semua worker: satu file trace per worker,
+        # digabung lagi oleh bench/replay.py
+        if path is not None:
+            root, ext = os.path.splitext(path)
+            path = f"{root}-{self.index}{ext}"
+        super().start_capture(path, redact)
+
+    def presence_changes(self, changes):
+        self.bus.publish({"kind": "presence",
+                          "changes": [list(c) for c in changes]})
+
+    def user_online(self, nickname):
+        return self.bus.is_online(nickname) or super().user_online(nickname)
+
+
+class ClusterChatServer(ClusterWorker, ChatServer):
+    pass
+
+
+class AsyncClusterChatServer(ClusterWorker, AsyncChatServer):
+    pass
+
+
+WORKER_CLASSES = {
+    "thread": ClusterChatServer,
+    "async": AsyncClusterChatServer,
+}
+
+
+def run_worker(index, bus_path, engine, host, port, kwargs):
+    WORKER_CLASSES[engine](index, bus_path, host, port, **kwargs).start()
+
+
+class Cluster:
+    # Proses induk: menjalankan hub dan N worker yang semuanya menerima
+    # koneksi di port yang sama (SO_REUSEPORT, kernel membagi koneksinya),
+    # jadi setiap worker punya GIL dan core sendiri. Perintah admin dibaca
+    # di sini.
+    def __init__(self, host, port, workers=None, engine="thread", **kwargs):
+        self.host = host
+        self.port = port
+        self.workers = int(workers or os.cpu_count() or 1)
+        self.engine = engine
+        self.kwargs = kwargs
+        self.bus_path = os.path.join(tempfile.gettempdir(),
+                                     f"chat-bus-{os.getpid()}.sock")
+        self.hub = None
+        self.processes = []
+        self.stopping = False
+        self.admin_nickname = "SERVER"
+        setup_logging("server.log", kwargs.get("log_json", False),
+                      kwargs.get("log_max_bytes", LOG_MAX_BYTES),
+                      kwargs.get("log_when"))
+
+    def start(self):
+        if not hasattr(socket, "SO_REUSEPORT"):
+            logging.info("Gagal memulai server: mode cluster butuh SO_REUSEPORT")
+            stop_logging()
+            os._exit(1)
+        self.hub = Hub(self.bus_path)
+        threading.Thread(target=self.hub.serve, daemon=True).start()
+        # spawn: worker mulai dari interpreter baru, tanpa thread dan lock
+        # milik proses induk
+        context = multiprocessing.get_context("spawn")
+        for index in range(self.workers):
+            process = context.Process(
+                target=run_worker, daemon=True,
+                args=(index, self.bus_path, self.engine, self.host,
+                      self.port, self.kwargs))
+            process.start()
+            self.processes.append(process)
+        threading.Thread(target=self.watch_workers, daemon=True).start()
+        logging.info(
+            f"Server (cluster, {self.workers} worker {self.engine}) Berjalan di {self.host}:{self.port}")  # noqa: E128
+        print("Daftar Perintah:\n/users\n/rooms\n/queues\n/compression\n/stats\n"
+              "/capture start [file] [redact] | stop\n"
+              "/profile start [ms] | stop\n"
+              "/memtrace start [frames] | dump | stop\n/exit\n")
+        self.handle_admin_input()
+
+    def watch_workers(self):
+        for process in self.processes:
+            process.join()
+            # worker selalu keluar dengan kode 1 saat /exit
+            if process.exitcode and not self.stopping:
+                logging.error(
+                    f"Worker pid {process.pid} berhenti (kode {process.exitcode})")  # noqa: E128
+
+    def handle_admin_input(self):
+        while True:
+            try:
+                admin_input = input().strip()
+            except Exception as e:
+                logging.error(f"Error saat menangani input admin: {e}")
+                break
+            if not admin_input:
+                continue
+            if admin_input.startswith("/exit"):
+                break
+            if admin_input.startswith("/users"):
+                users = '\n'.join(self.hub.nicknames())
+                print(
+                    f"Daftar user online:\n{users if users else "Tidak ada user online"}")
+            elif admin_input.startswith("/"):
+                # statistik per worker, dicetak masing-masing worker
+                self.hub.admin(admin_input)
+            else:
+                self.hub.broadcast({"kind": "text",
+                                    "sender": self.admin_nickname,
+                                    "message": admin_input, "persist": True,
+                                    "room": DEFAULT_ROOM}, persist=True)
+        self.shutdown()
+
+    def shutdown(self):
+        self.stopping = True
+        self.hub.admin("/exit")
+        for process in self.processes:
+            process.join(SHUTDOWN_WAIT)
+        self.hub.close()
+        stop_logging()
+        os._exit(1)
+
+
+if __name__ == '__main__':
+    host = input("Server IP Default (127.0.0.1) : ").strip() or "127.0.0.1"
+    port = input("Port Default (65432) : ").strip() or 65432
+    cluster = Cluster(host=host, port=port,
+                      workers=os.environ.get("CHAT_WORKERS"),
+                      engine=os.environ.get("CHAT_ENGINE", "thread"),
+                      metrics_port=os.environ.get("CHAT_METRICS_PORT"),
+                      **env_settings())
+    cluster.start()
@@ -0,0 +1,202 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: partial hanya dijaga di dalam satu proses
+    fcntl = None
+
+HASH_RE = re.compile(r"^[0-9a-f]{64}$")
+# Upload setengah jalan yang tidak dilanjutkan selama ini dihapus
+PARTIAL_TTL = 24 * 3600
+READ_SIZE = 1024 * 1024
+
+
+class Upload:
+    # File yang sedang ditulis ke area sementara, hash dihitung sambil jalan.
+    # expected: hash yang diumumkan client, dicocokkan saat commit. Upload
+    # partial ditulis ke partial/<hash> (partial: file yang sudah dibuka
+    # dan dikunci FileStore.resume): isi yang sudah ada dari koneksi
+    # sebelumnya dihash ulang dulu, lalu ditambah di ujungnya.
+    def __init__(self, store, expected=None, partial=None):
+        self.store = store
+        self.expected = expected
+        self.partial = partial is not None
+        self.hasher = hashlib.sha256()
+        self.size = 0
+        if partial is None:
+            fd, self.tmp_path = tempfile.mkstemp(dir=store.tmp_dir)
+            self.file = os.fdopen(fd, "wb")
+            return
+        self.tmp_path = partial.name
+        self.file = partial
+        self.file.seek(0)
+        while data := self.file.read(READ_SIZE):
+            self.hasher.update(data)
+            self.size += len(data)
+
+    def write(self, chunk):
+        self.file.write(chunk)
+        self.hasher.update(chunk)
+        self.size += len(chunk)
+
+    def commit(self):
+        # Pindahkan ke nama hash-nya; upload yang identik cukup disimpan sekali
+        file_hash = self.hasher.hexdigest()
+        if self.expected is not None and file_hash != self.expected:
+            self.discard()
+            raise ValueError("Checksum file tidak cocok")
+        path = self.store.path(file_hash)
+        if os.path.exists(path):
+            self.close_after(os.remove, self.tmp_path)
+        else:
+            self.close_after(os.replace, self.tmp_path, path)
+        self.release()
+        return file_hash
+
+    def discard(self):
+        try:
+            self.close_after(os.remove, self.tmp_path)
+        except OSError:
+            pass
+        self.release()
+
+    def close_after(self, action, *args):
+        # Partial dipindah/dihapus selagi kuncinya masih dipegang, supaya
+        # worker lain tidak sempat melanjutkannya. Di Windows file yang
+        # terbuka tidak bisa dipindah, jadi ditutup dulu.
+        if fcntl is None or not self.partial:
+            self.file.close()
+        else:
+            self.file.flush()
+        try:
+            action(*args)
+        finally:
+            self.file.close()
+
+    def suspend(self):
+        # Koneksi putus: upload partial tetap di disk untuk dilanjutkan
+        if not self.partial:
+            self.discard()
+            return
+        self.file.close()
+        self.release()
+
+    def release(self):
+        if self.partial:
+            self.store.release(self.expected)
+
+
+class StoredUpload:
+    # Isi dengan hash ini sudah ada di store, tidak ada yang perlu ditulis
+    def __init__(self, store, file_hash):
+        self.file_hash = file_hash
+        self.size = store.size(file_hash)
+
+    def write(self, chunk):
+        raise ValueError("File sudah lengkap")
+
+    def commit(self):
+        return self.file_hash
+
+    def discard(self):
+        pass
+
+    def suspend(self):
+        pass
+
+
+class FileStore:
+    # Penyimpanan file berdasarkan isi (sha256), bukan nama file
+    def __init__(self, root="received_files"):
+        self.root = root
+        self.tmp_dir = os.path.join(root, "tmp")
+        # upload per hash yang terputus, dilanjutkan dari ukurannya
+        self.partial_dir = os.path.join(root, "partial")
+        os.makedirs(self.tmp_dir, exist_ok=True)
+        os.makedirs(self.partial_dir, exist_ok=True)
+        self.lock = threading.Lock()
+        # hash yang partial-nya sedang ditulis proses ini; antar proses
+        # (worker cluster berbagi partial/) dijaga flock
+        self.active = set()
+        self.prune_partials()
+
+    def path(self, file_hash):
+        return os.path.join(self.root, file_hash)
+
+    def exists(self, file_hash):
+        return bool(HASH_RE.match(file_hash)) and \
+            os.path.isfile(self.path(file_hash))
+
+    def size(self, file_hash):
+        return os.path.getsize(self.path(file_hash))
+
+    def begin(self):
+        return Upload(self)
+
+    def resume(self, file_hash, size):
+        # (upload, offset) untuk upload dengan hash yang diumumkan client.
+        # Partial yang sedang dipakai koneksi lain, di proses ini atau
+        # worker lain, tidak disentuh: upload ini ditulis ke file sementara
+        # sendiri dari awal. Isi partial dihash ulang di sini, jadi engine
+        # async memanggilnya di thread lain.
+        if self.exists(file_hash):
+            upload = StoredUpload(self, file_hash)
+            return upload, upload.size
+        partial = self.lock_partial(file_hash)
+        if partial is None:
+            return Upload(self, file_hash), 0
+        if os.fstat(partial.fileno()).st_size > size:
+            partial.truncate(0)  # bukan potongan file ini, mulai dari awal
+        upload = Upload(self, file_hash, partial)
+        return upload, upload.size
+
+    def lock_partial(self, file_hash):
+        # partial/<hash> yang sudah dibuka dan dikunci, atau None kalau
+        # sedang dipakai
+        with self.lock:
+            if file_hash in self.active:
+                return None
+            self.active.add(file_hash)
+        path = os.path.join(self.partial_dir, file_hash)
+        try:
+            f = open(path, "a+b")
+        except OSError:
+            self.release(file_hash)
+            raise
+        if fcntl is None:
+            return f
+        try:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            # pemegang sebelumnya bisa saja sudah memindahkannya ke store
+            # setelah kita membuka path ini
+            if os.path.samestat(os.fstat(f.fileno()), os.stat(path)):
+                return f
+        except OSError:
+            pass
+        f.close()
+        self.release(file_hash)
+        return None
+
+    def release(self, file_hash):
+        with self.lock:
+            self.active.discard(file_hash)
+
+    def prune_partials(self, max_age=PARTIAL_TTL):
+        cutoff = time.time() - max_age
+        for name in os.listdir(self.partial_dir):
+            path = os.path.join(self.partial_dir, name)
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def put(self, data):
+        upload = self.begin()
+        upload.write(data)
+        return upload.commit()
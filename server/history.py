@@ -0,0 +1,197 @@
+import bisect
+import mmap
+import os
+import struct
+import threading
+
+# seq, msg_type, panjang audience, panjang body
+RECORD = struct.Struct("!QBHI")
+# entri index: seq, offset di dalam segment
+INDEX_ENTRY = struct.Struct("!QQ")
+
+
+class Segment:
+    def __init__(self, root, first_seq):
+        self.first_seq = first_seq
+        self.log_path = os.path.join(root, f"{first_seq:020d}.log")
+        self.idx_path = os.path.join(root, f"{first_seq:020d}.idx")
+        # index jarang: hanya setiap index_every record, cukup untuk bisect
+        self.index_seqs = []
+        self.index_offsets = []
+        if os.path.exists(self.idx_path):
+            with open(self.idx_path, "rb") as f:
+                data = f.read()
+            usable = len(data) - len(data) % INDEX_ENTRY.size
+            for seq, offset in INDEX_ENTRY.iter_unpack(data[:usable]):
+                self.index_seqs.append(seq)
+                self.index_offsets.append(offset)
+
+    def size(self):
+        return os.path.getsize(self.log_path)
+
+    def offset_for(self, seq):
+        # offset record terindeks terakhir yang seq-nya <= seq
+        pos = bisect.bisect_right(self.index_seqs, seq) - 1
+        return self.index_offsets[pos] if pos >= 0 else 0
+
+    def blocks(self):
+        # (offset, seq terkecil, seq awal blok berikutnya atau None) per
+        # entri index, dari yang terbaru
+        starts = list(zip(self.index_offsets, self.index_seqs))
+        if not starts or starts[0][0] != 0:
+            starts.insert(0, (0, self.first_seq))
+        stop_seq = None
+        for offset, first_seq in reversed(starts):
+            yield offset, first_seq, stop_seq
+            stop_seq = first_seq
+
+    def remove(self):
+        for path in (self.log_path, self.idx_path):
+            try:
+                os.remove(path)
+            except OSError:  # windows: masih di-mmap oleh replay
+                pass
+
+
+def iter_records(buf, offset=0):
+    # (seq, msg_type, audience, body, offset berikutnya); body berupa slice
+    # memoryview dari buffer, tidak disalin
+    view = memoryview(buf)
+    end = len(view)
+    while offset + RECORD.size <= end:
+        seq, msg_type, audience_len, body_len = RECORD.unpack_from(view, offset)
+        start = offset + RECORD.size
+        stop = start + audience_len + body_len
+        if stop > end:  # record terpotong (server mati saat menulis)
+            return
+        audience = bytes(view[start:start + audience_len])
+        yield seq, msg_type, audience, view[start + audience_len:stop], stop
+        offset = stop
+
+
+class History:
+    # Log append-only yang dibagi per segment, dengan index kecil per segment.
+    # Dibaca kembali lewat mmap supaya replay tidak menyalin isi pesan.
+    def __init__(self, root="history", segment_bytes=8 * 1024 * 1024,
+                 max_segments=16, index_every=64):
+        self.root = root
+        self.segment_bytes = segment_bytes
+        self.max_segments = max_segments
+        self.index_every = index_every
+        self.lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self.segments = [Segment(root, int(name[:-4]))
+                         for name in sorted(os.listdir(root))
+                         if name.endswith(".log")]
+        self.last_seq = 0
+        if self.segments:
+            self.last_seq = self.recover(self.segments[-1])
+        else:
+            self.segments.append(Segment(root, 1))
+            open(self.segments[-1].log_path, "ab").close()
+        self.open_active()
+
+    def recover(self, segment):
+        # Cari seq terakhir dan buang record terpotong di ujung segment
+        last_seq = segment.first_seq - 1
+        valid_end = offset = segment.offset_for(2 ** 63)
+        with open(segment.log_path, "rb") as f:
+            f.seek(offset)
+            data = f.read()
+        for seq, _, _, _, stop in iter_records(data):
+            last_seq = seq
+            valid_end = offset + stop
+        if valid_end < segment.size():
+            with open(segment.log_path, "r+b") as f:
+                f.truncate(valid_end)
+        return last_seq
+
+    def open_active(self):
+        segment = self.segments[-1]
+        self.log_file = open(segment.log_path, "ab")
+        self.idx_file = open(segment.idx_path, "ab")
+        self.since_index = self.index_every
+
+    def append(self, msg_type, body, audience=(), seq=None):
+        # seq dari luar (bus cluster) dipakai kalau masih lebih besar dari
+        # seq terakhir, supaya nomor pesan sama di semua worker
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        audience = ",".join(audience).encode('utf-8')
+        with self.lock:
+            if self.log_file.tell() >= self.segment_bytes:
+                self.rotate()
+            if seq is None or seq <= self.last_seq:
+                seq = self.last_seq + 1
+            self.last_seq = seq
+            segment = self.segments[-1]
+            offset = self.log_file.tell()
+            if self.since_index >= self.index_every:
+                self.idx_file.write(INDEX_ENTRY.pack(seq, offset))
+                self.idx_file.flush()
+                segment.index_seqs.append(seq)
+                segment.index_offsets.append(offset)
+                self.since_index = 0
+            self.since_index += 1
+            self.log_file.write(
+                RECORD.pack(seq, msg_type, len(audience), len(body)))
+            self.log_file.write(audience)
+            self.log_file.write(body)
+            self.log_file.flush()
+            return seq
+
+    def rotate(self):
+        self.log_file.close()
+        self.idx_file.close()
+        self.segments.append(Segment(self.root, self.last_seq + 1))
+        self.open_active()
+        # Batas retensi: segment paling lama dibuang
+        while len(self.segments) > self.max_segments:
+            self.segments.pop(0).remove()
+
+    def replay(self, nickname, since=None, limit=100, only=None):
+        # limit pesan terakhir dengan seq > since yang boleh dilihat
+        # nickname: (seq, msg_type, audience, body memoryview). Batasnya
+        # dihitung setelah disaring: dibaca per blok index dari yang
+        # terbaru ke belakang sampai cukup. truncated: ada pesan setelah
+        # since yang tidak ikut (lebih dari limit, atau segmentnya sudah
+        # dibuang retensi). only: hanya record dengan audience persis itu
+        # (satu room).
+        with self.lock:
+            segments = list(self.segments)
+            last_seq = self.last_seq
+        floor = since or 0
+        me = nickname.encode('utf-8')
+        records = []
+        for segment in reversed(segments):
+            try:
+                with open(segment.log_path, "rb") as f:
+                    buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):  # file hilang atau masih kosong
+                buf = b""
+            for offset, first_seq, stop_seq in segment.blocks():
+                visible = []
+                for seq, msg_type, audience, body, _ in iter_records(
+                        buf, offset):
+                    if seq > last_seq or (stop_seq is not None
+                                          and seq >= stop_seq):
+                        break
+                    if seq <= floor:
+                        continue
+                    if only is not None:
+                        if audience != only:
+                            continue
+                    elif audience.startswith(b"#"):  # pesan room lain
+                        continue
+                    elif audience and me not in audience.split(b","):
+                        continue
+                    visible.append((seq, msg_type, audience, body))
+                records[:0] = visible
+                if len(records) > limit:
+                    return records[len(records) - limit:], last_seq, True
+                if first_seq <= floor + 1:
+                    return records, last_seq, False
+        # sampai segment tertua: since lebih lama dari retensi?
+        truncated = bool(since) and bool(segments) and (
+            segments[0].first_seq > since + 1)
+        return records, last_seq, truncated
@@ -0,0 +1,98 @@
+import time
+
+from protocol import (COMPRESSED, CHUNK_SIZE, TRANSFER_ID, FILE_START,
+                      FILE_CHUNK, FILE_END, FILE_GET, ROOM_JOIN, ROOM_LEAVE,
+                      PING, PONG)
+
+# Ukuran body maksimal per tipe frame dari client. Frame yang lebih besar
+# dibuang tanpa disimpan di memori dan pengirimnya diberi [LIMIT].
+MAX_FRAME = {
+    1: 64 * 1024,            # pesan text
+    2: 64 * 1024,            # PM
+    3: 16 * 1024 * 1024,     # file lama, body utuh
+    4: 16 * 1024 * 1024,
+    FILE_START: 4096,
+    FILE_CHUNK: TRANSFER_ID.size + CHUNK_SIZE,
+    FILE_END: 64,
+    FILE_GET: 1024,
+    ROOM_JOIN: 256,
+    ROOM_LEAVE: 256,
+    PING: 64,
+    PONG: 64,
+}
+DEFAULT_MAX_FRAME = 4096     # tipe lain yang tidak dikenal
+
+# Token bucket per koneksi: jumlah pesan dan jumlah byte per detik.
+# Potongan upload hanya dihitung di bucket byte.
+MESSAGES_PER_SEC = 20
+MESSAGE_BURST = 50
+BYTES_PER_SEC = 8 * 1024 * 1024
+BYTE_BURST = 16 * 1024 * 1024
+RATE_EXEMPT = (FILE_CHUNK, FILE_END)
+
+# Antrian dispatch global; pembaca client yang menambah saat penuh ditahan
+DISPATCH_QUEUE_SIZE = 10000
+# [LIMIT] ke client yang sama paling sering sekali per interval ini
+NOTICE_INTERVAL = 1.0
+
+
+class TokenBucket:
+    # take() selalu mengambil token (boleh minus) dan mengembalikan lama
+    # menunggu sampai utangnya lunas; pemanggil tidur selama itu, jadi
+    # kecepatan rata-rata tidak melewati rate
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, amount=1):
+        now = time.monotonic()
+        self.tokens = min(self.burst,
+                          self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= amount
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+
+class Limits:
+    # Konfigurasi batas; satu objek dipakai semua koneksi
+    def __init__(self, max_frame=None, messages_per_sec=MESSAGES_PER_SEC,
+                 message_burst=MESSAGE_BURST, bytes_per_sec=BYTES_PER_SEC,
+                 byte_burst=BYTE_BURST):
+        self.frames = dict(MAX_FRAME)
+        self.frames.update(max_frame or {})
+        self.messages_per_sec = messages_per_sec
+        self.message_burst = message_burst
+        self.bytes_per_sec = bytes_per_sec
+        self.byte_burst = byte_burst
+
+    def max_frame(self, msg_type):
+        return self.frames.get(msg_type & ~COMPRESSED, DEFAULT_MAX_FRAME)
+
+    def limiter(self):
+        return ConnectionLimiter(
+            TokenBucket(self.messages_per_sec, self.message_burst),
+            TokenBucket(self.bytes_per_sec, self.byte_burst))
+
+
+class ConnectionLimiter:
+    # Milik satu koneksi, hanya dipakai thread/task pembacanya
+    def __init__(self, messages, data):
+        self.messages = messages
+        self.data = data
+        self.noticed_at = 0.0
+
+    def throttle(self, msg_type, size):
+        # Lama pembaca harus menunggu sebelum membaca body frame ini
+        wait = self.data.take(size)
+        if msg_type & ~COMPRESSED not in RATE_EXEMPT:
+            wait = max(wait, self.messages.take())
+        return wait
+
+    def should_notice(self):
+        now = time.monotonic()
+        if now - self.noticed_at < NOTICE_INTERVAL:
+            return False
+        self.noticed_at = now
+        return True
@@ -0,0 +1,350 @@
+import bisect
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from protocol import COMPRESSED, FileFrame, frame_sizes
+from serverlog import log_dropped
+
+# Kirim yang lebih lama dari ini dihitung sebagai stall client
+STALL_SECONDS = 0.1
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1.0, 2.5, 5.0)
+THROUGHPUT_BUCKETS = (64e3, 256e3, 1e6, 4e6, 16e6, 64e6, 256e6, 1e9)
+# Counter per tipe pesan disimpan di list berukuran tetap; tipe di luar
+# rentang ini dihitung sebagai tipe 0
+MSG_TYPES = 32
+
+
+def type_index(msg_type):
+    msg_type &= ~COMPRESSED
+    return msg_type if msg_type < MSG_TYPES else 0
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.lock = threading.Lock()
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        # (batas, jumlah kumulatif), sum, count
+        with self.lock:
+            counts, total, count = list(self.counts), self.sum, self.count
+        cumulative = []
+        running = 0
+        for bound, n in zip(self.buckets + (float("inf"),), counts):
+            running += n
+            cumulative.append((bound, running))
+        return cumulative, total, count
+
+    def quantile(self, q):
+        # perkiraan kasar: batas bucket tempat kuantil q jatuh
+        cumulative, _, count = self.snapshot()
+        if not count:
+            return 0.0
+        for bound, running in cumulative:
+            if running >= q * count:
+                return bound
+        return float("inf")
+
+
+class SessionStats:
+    # Counter milik satu koneksi. Bagian "in" hanya ditulis thread/task
+    # pembacanya dan bagian "out" hanya oleh writer-nya, jadi tanpa lock.
+    def __init__(self):
+        self.frames_in = [0] * MSG_TYPES
+        self.bytes_in = [0] * MSG_TYPES
+        self.frames_out = [0] * MSG_TYPES
+        self.bytes_out = [0] * MSG_TYPES
+        self.stalls = 0
+        self.stall_seconds = 0.0
+        # batas yang dilanggar client ini (lihat limits.py)
+        self.oversized = 0
+        self.throttled = 0
+        self.throttled_seconds = 0.0
+        self.dispatch_waits = 0
+
+    def limit_hits(self):
+        return self.oversized + self.throttled + self.dispatch_waits
+
+    def merge(self, other):
+        for mine, theirs in ((self.frames_in, other.frames_in),
+                             (self.bytes_in, other.bytes_in),
+                             (self.frames_out, other.frames_out),
+                             (self.bytes_out, other.bytes_out)):
+            for t in range(MSG_TYPES):
+                mine[t] += theirs[t]
+        self.stalls += other.stalls
+        self.stall_seconds += other.stall_seconds
+        self.oversized += other.oversized
+        self.throttled += other.throttled
+        self.throttled_seconds += other.throttled_seconds
+        self.dispatch_waits += other.dispatch_waits
+
+
+class Delivery:
+    # Satu broadcast, dari masuk messages_queue sampai sendall terakhir ke
+    # penerimanya. Penerima yang terputus atau frame-nya dibuang membuat
+    # broadcast ini tidak pernah tercatat.
+    def __init__(self, histogram, queued_at, recipients):
+        self.histogram = histogram
+        self.queued_at = queued_at
+        self.remaining = recipients
+
+    def sent(self):
+        with self.histogram.lock:
+            self.remaining -= 1
+            done = self.remaining == 0
+        if done:
+            self.histogram.observe(time.perf_counter() - self.queued_at)
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.connections = 0
+        # counter dari koneksi yang sudah ditutup
+        self.retired = SessionStats()
+        self.dispatch_latency = Histogram(LATENCY_BUCKETS)
+        self.upload_throughput = Histogram(THROUGHPUT_BUCKETS)
+        self.download_throughput = Histogram(THROUGHPUT_BUCKETS)
+        self.upload_bytes = 0
+        # notifikasi server yang dibuang karena antrian dispatch penuh
+        self.dispatch_dropped = 0
+        # koneksi yang diputus karena tidak menjawab PING
+        self.idle_reaped = 0
+
+    def connected(self):
+        with self.lock:
+            self.connections += 1
+
+    def retire(self, registry, conn):
+        # Dilepas dari registry dan counter-nya dipindah ke retired dalam
+        # satu langkah, supaya snapshot tidak pernah melihat counter turun
+        with self.lock:
+            session = registry.remove(conn)
+            if session is not None:
+                self.retired.merge(session.stats)
+        return session
+
+    def frame_received(self, session, msg_type, size):
+        # size: byte di wire termasuk header
+        stats = session.stats
+        t = type_index(msg_type)
+        stats.frames_in[t] += 1
+        stats.bytes_in[t] += size
+
+    def frame_sent(self, session, frame, started):
+        # Dipanggil writer setelah frame terkirim; started dari perf_counter
+        elapsed = time.perf_counter() - started
+        stats = session.stats
+        if elapsed >= STALL_SECONDS:
+            stats.stalls += 1
+            stats.stall_seconds += elapsed
+        # Satu frame (v1 atau v2) atau beberapa sekaligus (replay)
+        for msg_type, size in frame_sizes(frame):
+            t = type_index(msg_type)
+            stats.frames_out[t] += 1
+            stats.bytes_out[t] += size
+        if isinstance(frame, FileFrame):
+            if elapsed > 0:
+                self.download_throughput.observe(frame.size / elapsed)
+            return
+        delivery = getattr(frame, "delivery", None)
+        if delivery is not None:
+            delivery.sent()
+
+    def notice_dropped(self):
+        with self.lock:
+            self.dispatch_dropped += 1
+
+    def reaped(self, count):
+        with self.lock:
+            self.idle_reaped += count
+
+    def upload_finished(self, size, elapsed):
+        with self.lock:
+            self.upload_bytes += size
+        if elapsed > 0:
+            self.upload_throughput.observe(size / elapsed)
+
+    def snapshot(self, registry):
+        with self.lock:
+            sessions = registry.sessions()
+            total = SessionStats()
+            total.merge(self.retired)
+            for session in sessions:
+                total.merge(session.stats)
+            connections = self.connections
+            upload_bytes = self.upload_bytes
+        return total, sessions, connections, upload_bytes
+
+
+def escape_label(value):
+    # Nilai label Prometheus: backslash, kutip, dan newline di-escape supaya
+    # nickname seperti 'a"b' tidak merusak baris eksposisi
+    return (str(value).replace("\\", "\\\\").replace('"', '\\"')
+            .replace("\n", "\\n"))
+
+
+def format_prometheus(server):
+    total, sessions, connections, upload_bytes = server.metrics.snapshot(
+        server.clients)
+    metrics = server.metrics
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for labels, value in samples:
+            lines.append(f"{name}{labels} {value}")
+
+    def by_nickname(value_of):
+        return [(f'{{nickname="{escape_label(s.nickname)}"}}', value_of(s))
+                for s in sessions]
+
+    def by_type(counts):
+        return [(f'{{type="{t}"}}', n) for t, n in enumerate(counts) if n]
+
+    def histogram(name, help_text, hist):
+        cumulative, total_sum, count = hist.snapshot()
+        samples = [(f'_bucket{{le="{"+Inf" if b == float("inf") else b}"}}', n)
+                   for b, n in cumulative]
+        samples += [("_sum", total_sum), ("_count", count)]
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} histogram")
+        for suffix, value in samples:
+            lines.append(f"{name}{suffix} {value}")
+
+    metric("chat_connections_total", "counter",
+           "Koneksi yang lolos handshake", [("", connections)])
+    metric("chat_clients", "gauge", "Client yang sedang terhubung",
+           [("", len(sessions))])
+    metric("chat_frames_in_total", "counter", "Frame dari client per tipe",
+           by_type(total.frames_in))
+    metric("chat_bytes_in_total", "counter", "Byte dari client per tipe",
+           by_type(total.bytes_in))
+    metric("chat_frames_out_total", "counter", "Frame ke client per tipe",
+           by_type(total.frames_out))
+    metric("chat_bytes_out_total", "counter", "Byte ke client per tipe",
+           by_type(total.bytes_out))
+    metric("chat_messages_queue_depth", "gauge",
+           "Pesan broadcast yang menunggu dispatch",
+           [("", server.messages_queue.qsize())])
+    metric("chat_outbox_depth", "gauge", "Frame di outbox per client",
+           by_nickname(lambda s: len(s.outbox)))
+    metric("chat_send_stalls_total", "counter",
+           f"Pengiriman yang lebih lama dari {STALL_SECONDS}s",
+           [("", total.stalls)])
+    metric("chat_client_send_stalls", "gauge",
+           "Stall kirim per client yang sedang terhubung",
+           by_nickname(lambda s: s.stats.stalls))
+    metric("chat_upload_bytes_total", "counter", "Byte file yang diupload",
+           [("", upload_bytes)])
+    metric("chat_limit_oversized_total", "counter",
+           "Frame client yang melebihi batas ukuran", [("", total.oversized)])
+    metric("chat_limit_throttled_total", "counter",
+           "Frame client yang ditahan token bucket", [("", total.throttled)])
+    metric("chat_limit_throttled_seconds_total", "counter",
+           "Total waktu pembaca ditahan token bucket",
+           [("", total.throttled_seconds)])
+    metric("chat_dispatch_backpressure_total", "counter",
+           "Pesan client yang menunggu antrian dispatch penuh",
+           [("", total.dispatch_waits)])
+    metric("chat_dispatch_dropped_total", "counter",
+           "Notifikasi server yang dibuang karena antrian dispatch penuh",
+           [("", metrics.dispatch_dropped)])
+    metric("chat_idle_reaped_total", "counter",
+           "Koneksi yang diputus karena tidak menjawab PING",
+           [("", metrics.idle_reaped)])
+    metric("chat_heartbeat_tracked", "gauge",
+           "Koneksi yang dipantau heartbeat", [("", len(server.idle_wheel))])
+    metric("chat_client_limit_hits", "gauge",
+           "Batas yang dilanggar per client yang sedang terhubung",
+           by_nickname(lambda s: s.stats.limit_hits()))
+    histogram("chat_dispatch_latency_seconds",
+              "Dari messages_queue sampai sendall terakhir",
+              metrics.dispatch_latency)
+    histogram("chat_upload_bytes_per_second", "Throughput upload per file",
+              metrics.upload_throughput)
+    histogram("chat_download_bytes_per_second",
+              "Throughput unduhan FILE_DATA", metrics.download_throughput)
+    return "\n".join(lines) + "\n"
+
+
+def format_summary(server):
+    # Ringkasan untuk perintah admin /stats
+    total, sessions, connections, upload_bytes = server.metrics.snapshot(
+        server.clients)
+    metrics = server.metrics
+    lat = metrics.dispatch_latency
+    lines = [
+        f"uptime            : {time.time() - metrics.started_at:.0f} s",
+        f"koneksi           : {len(sessions)} aktif, {connections} total",
+        f"messages_queue    : {server.messages_queue.qsize()}",
+        f"dispatch latency  : p50 <= {lat.quantile(0.5) * 1000:g} ms, "
+        f"p99 <= {lat.quantile(0.99) * 1000:g} ms ({lat.count} broadcast)",
+        f"stall kirim       : {total.stalls} ({total.stall_seconds:.2f} s)",
+        f"upload            : {upload_bytes} byte, "
+        f"p50 <= {metrics.upload_throughput.quantile(0.5) / 1e6:g} MB/s",
+        f"log dibuang       : {log_dropped()} record (antrian penuh)",
+        f"limit             : {total.oversized} frame kebesaran, "
+        f"{total.throttled} ditahan rate ({total.throttled_seconds:.2f} s), "
+        f"{total.dispatch_waits} menunggu dispatch, "
+        f"{metrics.dispatch_dropped} notifikasi dibuang",
+        f"heartbeat         : {len(server.idle_wheel)} dipantau, "
+        f"{metrics.idle_reaped} diputus karena diam",
+    ]
+    for t in range(MSG_TYPES):
+        if not total.frames_in[t] and not total.frames_out[t]:
+            continue
+        lines.append(
+            f"tipe {t:<13}: masuk {total.frames_in[t]} frame/"
+            f"{total.bytes_in[t]} byte, keluar {total.frames_out[t]} frame/"
+            f"{total.bytes_out[t]} byte")
+    stalled = [s for s in sessions if s.stats.stalls]
+    for s in stalled:
+        lines.append(f"stall {s.nickname}: {s.stats.stalls} kali "
+                     f"({s.stats.stall_seconds:.2f} s)")
+    for s in sessions:
+        if s.stats.limit_hits():
+            lines.append(f"limit {s.nickname}: {s.stats.oversized} kebesaran, "
+                         f"{s.stats.throttled} ditahan rate, "
+                         f"{s.stats.dispatch_waits} menunggu dispatch")
+    return "\n".join(lines)
+
+
+def serve_metrics(server, host, port):
+    # Endpoint lokal format teks Prometheus, di thread tersendiri
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path not in ("/", "/metrics"):
+                self.send_error(404)
+                return
+            body = format_prometheus(server).encode('utf-8')
+            self.send_response(200)
+            self.send_header("Content-Type",
+                             "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    httpd = ThreadingHTTPServer((host, port), Handler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
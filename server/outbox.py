@@ -0,0 +1,121 @@
+import asyncio
+import collections
+import threading
+
+# Kebijakan saat buffer keluar client penuh
+DROP_OLDEST = "drop_oldest"  # buang frame paling lama
+DISCONNECT = "disconnect"    # putuskan client yang lambat
+STALL = "stall"              # tahan client itu saja (berhenti membaca darinya)
+
+POLICIES = (DROP_OLDEST, DISCONNECT, STALL)
+
+# Pada mode STALL buffer boleh melewati maxlen sampai batas ini
+STALL_FACTOR = 4
+
+
+class Outbox:
+    # Antrian frame keluar milik satu client, dibatasi jumlah frame.
+    # Hanya berisi logika kebijakan overflow, sinkronisasi ada di subclass.
+    def __init__(self, maxlen=256, policy=DROP_OLDEST):
+        if policy not in POLICIES:
+            raise ValueError(f"Kebijakan overflow tidak dikenal: {policy}")
+        self.maxlen = maxlen
+        self.policy = policy
+        self.frames = collections.deque()
+        self.dropped = 0
+        self.closed = False
+
+    def __len__(self):
+        return len(self.frames)
+
+    def lagging(self):
+        return len(self.frames) >= self.maxlen
+
+    def _put(self, frame):
+        # False berarti koneksi harus diputus
+        if len(self.frames) >= self.maxlen:
+            if self.policy == DROP_OLDEST:
+                self.frames.popleft()
+                self.dropped += 1
+            elif self.policy == DISCONNECT:
+                return False
+            elif len(self.frames) >= self.maxlen * STALL_FACTOR:
+                return False
+        self.frames.append(frame)
+        return True
+
+
+class ThreadOutbox(Outbox):
+    # Dipakai ChatServer: banyak thread menulis, satu thread writer membaca
+    def __init__(self, maxlen=256, policy=DROP_OLDEST):
+        super().__init__(maxlen, policy)
+        self.cond = threading.Condition()
+
+    def put(self, frame):
+        with self.cond:
+            if self.closed:
+                return True
+            ok = self._put(frame)
+            self.cond.notify_all()
+            return ok
+
+    def get(self):
+        # Menunggu frame berikutnya, None jika outbox sudah ditutup
+        with self.cond:
+            while not self.frames and not self.closed:
+                self.cond.wait()
+            if self.closed:
+                return None
+            frame = self.frames.popleft()
+            self.cond.notify_all()
+            return frame
+
+    def wait_not_lagging(self):
+        # Mode STALL: thread pembaca client menunggu sampai buffernya longgar
+        with self.cond:
+            while self.lagging() and not self.closed:
+                self.cond.wait()
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.frames.clear()
+            self.cond.notify_all()
+
+
+class AsyncOutbox(Outbox):
+    # Dipakai AsyncChatServer: semua akses dari event loop yang sama
+    def __init__(self, maxlen=256, policy=DROP_OLDEST):
+        super().__init__(maxlen, policy)
+        self.ready = asyncio.Event()
+        self.roomy = asyncio.Event()
+        self.roomy.set()
+
+    def put(self, frame):
+        if self.closed:
+            return True
+        ok = self._put(frame)
+        self.ready.set()
+        if self.lagging():
+            self.roomy.clear()
+        return ok
+
+    async def get(self):
+        while not self.frames and not self.closed:
+            self.ready.clear()
+            await self.ready.wait()
+        if self.closed:
+            return None
+        frame = self.frames.popleft()
+        if not self.lagging():
+            self.roomy.set()
+        return frame
+
+    async def wait_not_lagging(self):
+        await self.roomy.wait()
+
+    def close(self):
+        self.closed = True
+        self.frames.clear()
+        self.ready.set()
+        self.roomy.set()
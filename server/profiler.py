@@ -0,0 +1,270 @@
+import asyncio
+import inspect
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+# Profiling dari konsol admin (/profile, /memtrace) di proses yang sedang
+# berjalan. Selama mati tidak ada yang terpasang: tanpa thread sampler,
+# tanpa pembungkus method, tracemalloc tidak aktif.
+PROFILE_INTERVAL = 0.01  # detik antar sampel stack semua thread
+# Di bawah ini thread sampler hampir tidak pernah tidur dan memakan satu core
+PROFILE_MIN_INTERVAL = 0.001
+# Kedalaman traceback tiap alokasi. Tiap frame tambahan memperlambat
+# semua alokasi; satu frame cukup untuk baris penyebab alokasi
+MEMTRACE_FRAMES = 1
+REPORT_TOP = 30
+# Frame teratas thread yang sedang menunggu (socket, Condition, select,
+# input). Sampelnya hanya dihitung jumlahnya, supaya fungsi terpanas tidak
+# tertutup ribuan thread client yang diam di recv. Di Unix thread yang
+# waktu CPU-nya tidak bertambah sejak sampel sebelumnya juga dilewati.
+IDLE_FRAMES = {("threading.py", "wait"), ("queue.py", "get"),
+               ("selectors.py", "select"), ("socket.py", "accept"),
+               ("protocol.py", "recv_exact"),
+               ("server.py", "handle_admin_input"),
+               ("cluster.py", "handle_admin_input")}
+
+
+def report_path(kind):
+    return f"{kind}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.txt"
+
+
+def code_label(code):
+    return f"{code.co_qualname} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"  # noqa: E501
+
+
+def current_label():
+    # Nama task asyncio (dengan coroutine-nya, seperti nama thread
+    # "Thread-3 (handle_client)"), atau nama thread
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    if task is not None:
+        coro = getattr(task.get_coro(), "__name__", "?")
+        return f"{task.get_name()} ({coro})"
+    return threading.current_thread().name
+
+
+class SamplingProfiler:
+    # Tiap interval mengambil stack semua thread lewat sys._current_frames
+    # dan menghitung fungsi teratas (self) dan semua fungsi di stack
+    # (kumulatif). Tidak memasang trace/profile hook, jadi thread lain
+    # berjalan dengan kecepatan biasa di antara sampel.
+    def __init__(self, interval=PROFILE_INTERVAL):
+        self.interval = interval
+        self.self_counts = Counter()
+        self.total_counts = Counter()
+        self.thread_counts = Counter()
+        self.idle_codes = {}  # code -> frame tunggu?
+        self.cpu_clocks = {}  # ident thread -> (clock CPU, nilai terakhir)
+        self.samples = 0
+        self.idle = 0
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="profiler",
+                                       daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.elapsed = time.perf_counter() - self.started
+
+    def run(self):
+        me = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            frames = sys._current_frames()
+            for ident, frame in frames.items():
+                if ident != me:
+                    self.sample(ident, names.get(ident, str(ident)), frame)
+            for ident in self.cpu_clocks.keys() - frames.keys():
+                del self.cpu_clocks[ident]
+
+    def sample(self, ident, thread_name, frame):
+        code = frame.f_code
+        idle = self.idle_codes.get(code)
+        if idle is None:
+            place = (os.path.basename(code.co_filename), code.co_name)
+            idle = self.idle_codes[code] = place in IDLE_FRAMES
+        if idle or not self.used_cpu(ident):
+            self.idle += 1
+            return
+        self.samples += 1
+        self.self_counts[code] += 1
+        self.thread_counts[thread_name] += 1
+        seen = set()
+        while frame is not None:
+            # fungsi rekursif dihitung sekali per sampel
+            if frame.f_code not in seen:
+                seen.add(frame.f_code)
+                self.total_counts[frame.f_code] += 1
+            frame = frame.f_back
+
+    def used_cpu(self, ident):
+        if not hasattr(time, "pthread_getcpuclockid"):
+            return True
+        try:
+            clock, last = self.cpu_clocks.get(ident, (None, None))
+            if clock is None:
+                clock = time.pthread_getcpuclockid(ident)
+            now = time.clock_gettime(clock)
+        except OSError:  # thread baru saja selesai
+            return False
+        self.cpu_clocks[ident] = (clock, now)
+        return last is not None and now > last
+
+    def report(self, top=REPORT_TOP):
+        lines = [f"Profil CPU {self.elapsed:.1f} s, {self.samples} sampel "
+                 f"(interval {self.interval * 1000:g} ms), {self.idle} "
+                 f"sampel thread yang menunggu atau tidak memakai CPU tidak "
+                 f"dihitung", ""]
+        for title, counts in (("Fungsi terpanas (self)", self.self_counts),
+                              ("Fungsi terpanas (kumulatif)",
+                               self.total_counts)):
+            lines.append(f"{title}:")
+            lines.append(f"{'sampel':>8} {'%':>6}  fungsi")
+            for code, count in counts.most_common(top):
+                lines.append(f"{count:>8} {count / self.samples * 100:>6.1f}"
+                             f"  {code_label(code)}")
+            lines.append("")
+        lines.append("Sampel per thread:")
+        for name, count in self.thread_counts.most_common(top):
+            lines.append(f"{count:>8} {count / self.samples * 100:>6.1f}"
+                         f"  {name}")
+        return lines
+
+
+class MethodTimings:
+    # Waktu wall dan CPU method server per thread/task. Pembungkus dipasang
+    # sebagai atribut instance yang menutupi method kelas, dan dihapus lagi
+    # saat berhenti: di luar profiling pemanggilan method tidak berubah.
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats = {}  # (thread/task, method) -> [panggilan, wall, cpu, max]
+        self.installed = []
+
+    def install(self, target, names):
+        for name in names:
+            setattr(target, name, self.wrap(name, getattr(target, name)))
+            self.installed.append((target, name))
+
+    def remove(self):
+        for target, name in self.installed:
+            delattr(target, name)
+        self.installed = []
+
+    def wrap(self, name, method):
+        if inspect.iscoroutinefunction(method):
+            # CPU thread event loop juga dipakai task lain selama await,
+            # jadi coroutine hanya diukur wall-nya
+            async def timed_async(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await method(*args, **kwargs)
+                finally:
+                    self.add(name, time.perf_counter() - started, None)
+            return timed_async
+
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            cpu = time.thread_time()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.add(name, time.perf_counter() - started,
+                         time.thread_time() - cpu)
+        return timed
+
+    def add(self, name, wall, cpu):
+        key = (current_label(), name)
+        with self.lock:
+            entry = self.stats.get(key)
+            if entry is None:
+                entry = self.stats[key] = [0, 0.0, 0.0, 0.0]
+            entry[0] += 1
+            entry[1] += wall
+            entry[2] += cpu or 0.0
+            entry[3] = max(entry[3], wall)
+
+    def report(self, top=REPORT_TOP):
+        with self.lock:
+            stats = dict(self.stats)
+        methods = {}
+        for (_, name), (calls, wall, cpu, longest) in stats.items():
+            entry = methods.setdefault(name, [0, 0.0, 0.0, 0.0])
+            entry[0] += calls
+            entry[1] += wall
+            entry[2] += cpu
+            entry[3] = max(entry[3], longest)
+        header = (f"{'panggilan':>10} {'wall ms':>10} {'cpu ms':>10} "
+                  f"{'rata2 ms':>9} {'max ms':>9}")
+        lines = ["Waktu method (inklusif: method yang dipanggil method lain "
+                 "ikut terhitung di keduanya):", f"{header}  method"]
+        for name, row in sorted(methods.items(), key=lambda i: -i[1][1]):
+            lines.append(self.format_row(row) + f"  {name}")
+        lines += ["", f"Per thread/task (top {top} menurut wall):",
+                  f"{header}  method @ thread/task"]
+        for (label, name), row in sorted(stats.items(),
+                                         key=lambda i: -i[1][1])[:top]:
+            lines.append(self.format_row(row) + f"  {name} @ {label}")
+        return lines
+
+    def format_row(self, row):
+        calls, wall, cpu, longest = row
+        return (f"{calls:>10} {wall * 1000:>10.1f} {cpu * 1000:>10.1f} "
+                f"{wall / calls * 1000:>9.3f} {longest * 1000:>9.1f}")
+
+
+class MemTrace:
+    # tracemalloc selama /memtrace berjalan; dump membandingkan snapshot
+    # sekarang dengan snapshot saat mulai
+    def __init__(self, frames=MEMTRACE_FRAMES):
+        tracemalloc.start(frames)
+        self.baseline = self.snapshot()
+        self.started = time.perf_counter()
+
+    def snapshot(self):
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+
+    def report(self, top=REPORT_TOP):
+        snapshot = self.snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+        lines = [f"Alokasi Python {time.perf_counter() - self.started:.1f} s "
+                 f"setelah mulai: {current / 1024:.0f} KB sekarang, puncak "
+                 f"{peak / 1024:.0f} KB, overhead tracemalloc "
+                 f"{tracemalloc.get_tracemalloc_memory() / 1024:.0f} KB", "",
+                 "Pertumbuhan sejak mulai:"]
+        for stat in snapshot.compare_to(self.baseline, "lineno")[:top]:
+            lines.append(f"{stat.size_diff / 1024:>+10.1f} KB "
+                         f"{stat.count_diff:>+8} blok  {stat.traceback[0]}")
+        lines += ["", "Alokasi terbesar sekarang:"]
+        for stat in snapshot.statistics("lineno")[:top]:
+            lines.append(f"{stat.size / 1024:>10.1f} KB {stat.count:>8} blok"
+                         f"  {stat.traceback[0]}")
+        if tracemalloc.get_traceback_limit() < 2:
+            return lines
+        lines += ["", "Traceback 5 alokasi terbesar:"]
+        for stat in snapshot.statistics("traceback")[:5]:
+            lines.append(f"{stat.size / 1024:.1f} KB, {stat.count} blok")
+            lines += [f"    {line}" for line in stat.traceback.format()]
+        return lines
+
+    def stop(self):
+        tracemalloc.stop()
+
+
+def write_report(path, lines):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
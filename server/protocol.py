@@ -0,0 +1,388 @@
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from datetime import datetime
+
+HEADER = struct.Struct("!II")
+try:
+    IOV_MAX = os.sysconf("SC_IOV_MAX")
+except (AttributeError, ValueError, OSError):
+    IOV_MAX = 1024
+# Potongan memoryview mmap per write saat sendfile tidak tersedia
+MMAP_SLICE = 1024 * 1024
+
+
+# Kompresi per frame, hanya untuk client yang memintanya saat handshake.
+# Bit teratas msg_type menandai body yang dikompresi zlib.
+COMPRESSED = 0x80000000
+COMPRESS_MIN = 512       # body lebih kecil dari ini tidak dikompresi
+# level 6 hampir tidak lebih kecil tapi CPU ~2x (bench/compression.py)
+COMPRESS_LEVEL = 1
+MAX_INFLATED = 64 * 1024 * 1024
+
+
+# Protokol v2, dinegosiasi lewat opsi handshake "proto": 2. Header tetap:
+# versi, flags, tipe, seq, timestamp epoch-ms, panjang sender, panjang
+# target dan panjang body; disusul sender, target dan body apa adanya.
+# Untuk tipe 3/4 field target berisi nama file. Byte pertama header v1
+# selalu 0x00 atau 0x80, jadi tiap frame bisa dikenali versinya.
+V2_HEADER = struct.Struct("!BBHQQHHI")
+VERSION_2 = 2
+FLAG_COMPRESSED = 0x01
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+_clock = (None, "")
+
+
+def now_ms():
+    return time.time_ns() // 1_000_000
+
+
+def format_timestamp(timestamp_ms):
+    # Timestamp teks untuk frame v1; strftime cukup sekali per detik
+    global _clock
+    second, text = _clock
+    if timestamp_ms // 1000 != second:
+        second = timestamp_ms // 1000
+        text = datetime.fromtimestamp(second).strftime(TIMESTAMP_FORMAT)
+        _clock = (second, text)
+    return text
+
+
+class Frame(tuple):
+    # Tuple (header, body) v1 biasa. Versi v2 dan versi terkompresinya
+    # dibuat sekali saja, saat penerima pertama yang butuh memintanya.
+    version = 1
+    compressible = True
+    packed = None
+    upgraded = None
+    delivery = None  # metrics.Delivery untuk broadcast yang diukur
+    # Field v2 untuk pesan terstruktur: (timestamp ms, sender, target,
+    # offset body v2 di dalam body v1)
+    fields = None
+    seq = 0
+
+    def compressed(self, stats=None):
+        if self.packed is None:
+            packed = self.compress(stats) if self.compressible else self
+            if packed is not self:
+                packed = type(self)(packed)
+                packed.delivery = self.delivery
+            self.packed = packed
+        return self.packed
+
+    def compress(self, stats):
+        return compress_frame(self, stats)
+
+    def v2(self):
+        if self.upgraded is None:
+            header, body = self
+            msg_type = HEADER.unpack(header)[0]
+            timestamp, sender, target, offset = self.fields or (0, b"", b"", 0)
+            # body v2 adalah slice body v1, tidak disalin
+            view = memoryview(body)[offset:] if offset else body
+            frame = FrameV2((V2_HEADER.pack(
+                VERSION_2, 0, msg_type, self.seq, timestamp, len(sender),
+                len(target), len(view)), sender + target, view))
+            frame.compressible = self.compressible
+            frame.delivery = self.delivery
+            self.upgraded = frame
+        return self.upgraded
+
+
+class FrameV2(Frame):
+    # Tuple (header v2, sender + target, body)
+    version = 2
+
+    def compress(self, stats):
+        header, names, body = self
+        fields = list(V2_HEADER.unpack(header))
+        data = deflate(body, stats)
+        if data is None:
+            return self
+        fields[1] |= FLAG_COMPRESSED
+        fields[-1] = len(data)
+        return (V2_HEADER.pack(*fields), names, data)
+
+    def v2(self):
+        return self
+
+
+class Batch(tuple):
+    # Beberapa frame sekaligus dalam satu entri outbox (replay history),
+    # dikirim dengan satu sendmsg
+    def __new__(cls, frames, version=1):
+        batch = super().__new__(cls, [part for f in frames for part in f])
+        batch.version = version
+        return batch
+
+
+def make_frame(msg_type, payload, compressible=True):
+    # Frame dibuat sekali lalu dibagi ke semua penerima.
+    # Berupa tuple (header, body) yang immutable, tidak pernah digabung.
+    if isinstance(payload, str):
+        payload = payload.encode('utf-8')
+    frame = Frame((HEADER.pack(msg_type, len(payload)), bytes(payload)))
+    if not compressible:
+        frame.compressible = False
+    return frame
+
+
+def make_message(msg_type, sender, text, target="", timestamp_ms=None):
+    # Pesan chat tipe 1/2. Body v1 "timestamp|sender|text" dibuat sekali,
+    # body v2 adalah slice text-nya dengan sender/target di field sendiri.
+    timestamp_ms = timestamp_ms or now_ms()
+    prefix = f"{format_timestamp(timestamp_ms)}|{sender}|".encode('utf-8')
+    frame = make_frame(msg_type, prefix + text.encode('utf-8'))
+    frame.fields = (timestamp_ms, sender.encode('utf-8'),
+                    target.encode('utf-8'), len(prefix))
+    return frame
+
+
+def stored_file_message(msg_type, sender, file_name, path, size, version=1):
+    # Frame file lama tipe 3/4 yang isinya dikirim dari salinan di store;
+    # hanya header dan "sender|name|" (v1) atau field nama (v2) yang dibuat
+    sender = sender.encode('utf-8')
+    file_name = file_name.encode('utf-8')
+    if version == VERSION_2:
+        return FileFrame(msg_type, b"", path, size, version,
+                         sender=sender, target=file_name)
+    return FileFrame(msg_type, b"|".join((sender, file_name, b"")), path,
+                     size)
+
+
+def file_view(path, offset, size):
+    # Isi file sebagai memoryview ke mmap, untuk saat sendfile tidak bisa
+    # dipakai: halaman dibaca kernel saat dikirim, tidak disalin ke heap.
+    # mmap ditutup saat view terakhir dilepas.
+    if size == 0:
+        return memoryview(b"")
+    start = offset - offset % mmap.ALLOCATIONGRANULARITY
+    with open(path, "rb") as f:
+        buf = mmap.mmap(f.fileno(), offset + size - start,
+                        access=mmap.ACCESS_READ, offset=start)
+    return memoryview(buf)[offset - start:]
+
+
+def history_frame(seq, msg_type, body, target=b""):
+    # Record history (body v1) sebagai Frame, supaya replay ke client v2
+    # memakai jalur upgrade yang sama dengan pesan baru
+    frame = Frame((HEADER.pack(msg_type, len(body)), body))
+    frame.seq = seq
+    head = bytes(body[:1024])
+    parts = head.split(b"|", 2)
+    if msg_type in (1, 2) and len(parts) == 3:
+        try:
+            timestamp = int(datetime.strptime(
+                parts[0].decode(), TIMESTAMP_FORMAT).timestamp() * 1000)
+        except ValueError:
+            timestamp = 0
+        frame.fields = (timestamp, parts[1], target,
+                        len(parts[0]) + len(parts[1]) + 2)
+    return frame
+
+
+def parse_v2_header(header):
+    # (msg_type dengan bit COMPRESSED bila perlu, seq, timestamp,
+    #  panjang sender, panjang target, panjang body)
+    _, flags, msg_type, seq, timestamp, sender_len, target_len, length = (
+        V2_HEADER.unpack(header))
+    if flags & FLAG_COMPRESSED:
+        msg_type |= COMPRESSED
+    return msg_type, seq, timestamp, sender_len, target_len, length
+
+
+def frame_sizes(frame):
+    # (msg_type, byte di wire) untuk tiap frame di dalam satu entri outbox
+    if isinstance(frame, FileFrame):
+        return [(frame.msg_type, len(frame.head) + frame.size)]
+    if getattr(frame, "version", 1) == VERSION_2:
+        return [(V2_HEADER.unpack(frame[i])[2],
+                 len(frame[i]) + len(frame[i + 1]) + len(frame[i + 2]))
+                for i in range(0, len(frame) - 2, 3)]
+    return [(HEADER.unpack(frame[i])[0], HEADER.size + len(frame[i + 1]))
+            for i in range(0, len(frame) - 1, 2)]
+
+
+def deflate(body, stats=None):
+    # Body terkompresi, atau None kalau terlalu kecil / tidak menghemat
+    if len(body) < COMPRESS_MIN:
+        return None
+    started = time.thread_time()
+    data = zlib.compress(body, COMPRESS_LEVEL)
+    if stats is not None:
+        stats.compressed(time.thread_time() - started)
+    if len(data) >= len(body):
+        return None
+    return data
+
+
+def compress_frame(frame, stats=None):
+    header, body = frame
+    data = deflate(body, stats)
+    if data is None:
+        return frame
+    msg_type = HEADER.unpack(header)[0]
+    return (HEADER.pack(msg_type | COMPRESSED, len(data)), data)
+
+
+def inflate(data, limit=MAX_INFLATED):
+    # Body dari client yang dikompresi; ukuran hasilnya dibatasi
+    inflater = zlib.decompressobj()
+    out = inflater.decompress(data, limit)
+    if inflater.unconsumed_tail or not inflater.eof:
+        raise ValueError("Frame terkompresi tidak valid atau terlalu besar")
+    return out
+
+
+class CompressionStats:
+    # Pengukuran kompresi: CPU yang dipakai vs byte yang dihemat di jaringan
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = 0         # frame yang dicoba dikompresi, sekali per frame
+        self.cpu_seconds = 0.0
+        self.raw_bytes = 0     # per penerima: ukuran body asli
+        self.sent_bytes = 0    # per penerima: ukuran body yang dikirim
+        self.inflated = 0      # frame terkompresi dari client
+
+    def compressed(self, seconds):
+        with self.lock:
+            self.calls += 1
+            self.cpu_seconds += seconds
+
+    def received(self):
+        with self.lock:
+            self.inflated += 1
+
+    def sent(self, raw, packed):
+        with self.lock:
+            self.raw_bytes += raw
+            self.sent_bytes += packed
+
+    def summary(self):
+        with self.lock:
+            saved = self.raw_bytes - self.sent_bytes
+            ratio = saved / self.raw_bytes * 100 if self.raw_bytes else 0.0
+            return (f"{self.calls} frame dikompresi, "
+                    f"CPU {self.cpu_seconds * 1000:.1f} ms, "
+                    f"{saved} byte dihemat ({ratio:.1f}%), "
+                    f"{self.inflated} frame masuk didekompresi")
+
+
+def send_frame(sock, frame):
+    if isinstance(frame, FileFrame):
+        sock.sendall(frame.head)
+        if not frame.size:
+            # file kosong: sendfile menolak count 0, cukup header saja
+            return
+        if hasattr(os, "sendfile"):
+            with open(frame.path, "rb") as f:
+                sock.sendfile(f, frame.offset, frame.size)
+        else:  # windows: sendall langsung dari mmap
+            sock.sendall(file_view(frame.path, frame.offset, frame.size))
+        return
+    # Scatter-gather: header dan body dikirim dalam satu sendmsg tanpa
+    # menyalin body ke buffer baru. Satu "frame" boleh berisi beberapa
+    # pasang header+body sekaligus (misalnya replay history).
+    if not hasattr(sock, "sendmsg"):  # windows tidak punya sendmsg
+        for part in frame:
+            sock.sendall(part)
+        return
+    views = [memoryview(part) for part in frame if part]
+    while views:
+        sent = sock.sendmsg(views[:IOV_MAX])
+        while sent:
+            if sent >= len(views[0]):
+                sent -= len(views.pop(0))
+            else:
+                views[0] = views[0][sent:]
+                sent = 0
+
+
+# Tipe pesan transfer file bertahap (chunked)
+FILE_START = 6  # payload: metadata JSON
+FILE_CHUNK = 7  # payload: id transfer "!I" + potongan data
+FILE_END = 8    # payload: id transfer "!I" + status "!B"
+
+CHUNK_SIZE = 64 * 1024
+TRANSFER_ID = struct.Struct("!I")
+FILE_END_BODY = struct.Struct("!IB")
+END_OK = 0
+END_ABORT = 1
+
+
+def recv_exact(sock, n):
+    # Dibaca langsung ke satu bytearray, tanpa data += more yang kuadratik
+    buf = bytearray(n)
+    view = memoryview(buf)
+    got = 0
+    while got < n:
+        more = sock.recv_into(view[got:])
+        if not more:
+            raise ConnectionError("Koneksi client terputus")
+        got += more
+    return buf
+
+
+def discard_exact(sock, n):
+    # Membuang n byte dari socket tanpa menyimpannya (frame yang ditolak)
+    buf = bytearray(min(n, CHUNK_SIZE))
+    while n:
+        more = sock.recv_into(buf, min(n, len(buf)))
+        if not more:
+            raise ConnectionError("Koneksi client terputus")
+        n -= more
+
+
+# File disimpan per hash dan hanya diunduh saat diminta
+FILE_INFO = 9   # server -> client: deskriptor JSON (hash, name, size, sender)
+FILE_GET = 10   # client -> server: {"hash": ..., "offset": ...}
+# server -> client: digest sha256 (32 byte) + isi file mulai dari offset
+# yang diminta
+FILE_DATA = 11
+
+# Room: client -> server, payload nama room. Pesan publik (tipe 1/3 dan
+# FILE_INFO) hanya dikirim ke anggota room-nya; di frame v2 nama room ada
+# di field target.
+ROOM_JOIN = 12
+ROOM_LEAVE = 13
+
+# Upload yang bisa dilanjutkan: FILE_START berisi "hash" (sha256 seluruh
+# file), server menjawab {"id", "offset"} dengan jumlah byte yang sudah ada.
+# Client mengirim sisanya mulai dari offset; offset null = transfer ditolak.
+FILE_OFFSET = 14
+
+# Heartbeat, dinegosiasi lewat opsi handshake "ping": 1. Server mengirim
+# PING ke client yang diam, client menjawab PONG dengan body yang sama
+# (berlaku juga ke arah sebaliknya).
+PING = 15
+PONG = 16
+
+
+class FileFrame:
+    # Frame yang body-nya diambil langsung dari file di disk saat dikirim.
+    # Hanya header (dan prefix kecil) yang dibuat di userspace.
+    def __init__(self, msg_type, prefix, path, size, version=1, offset=0,
+                 sender=b"", target=b""):
+        if version == VERSION_2:
+            header = V2_HEADER.pack(
+                VERSION_2, 0, msg_type, 0, now_ms(), len(sender),
+                len(target), len(prefix) + size) + sender + target
+        else:
+            header = HEADER.pack(msg_type, len(prefix) + size)
+        self.head = header + prefix
+        self.msg_type = msg_type
+        self.path = path
+        self.size = size
+        self.offset = offset  # posisi awal di file
+
+
+def parse_hello(data):
+    # Jawaban handshake NICK: "nickname" (client lama) atau
+    # "nickname\n{json opsi}" dari client yang mendukung fitur tambahan
+    nickname, _, options = data.decode("utf-8").partition("\n")
+    return nickname, json.loads(options) if options else {}
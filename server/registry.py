@@ -0,0 +1,159 @@
+import threading
+import time
+
+from metrics import SessionStats
+
+
+# Room yang otomatis diikuti setiap client; client lama hanya kenal room ini
+DEFAULT_ROOM = "lobby"
+MAX_ROOMS = 32  # room per client
+
+
+class NicknameTaken(ValueError):
+    pass
+
+
+class Session:
+    # Data satu koneksi yang sudah lolos handshake NICK
+    def __init__(self, conn, nickname, outbox, addr=None, compress=False,
+                 version=1):
+        self.conn = conn
+        self.nickname = nickname
+        self.outbox = outbox
+        self.addr = addr
+        self.joined_at = time.time()
+        # hasil negosiasi handshake: kompresi dan versi protokol
+        self.compress = compress
+        self.version = version
+        self.stats = SessionStats()
+        # room yang diikuti; room aktif menerima pesan tanpa target room
+        # (client v1)
+        self.rooms = set()
+        self.room = None
+        # limits.ConnectionLimiter, dipasang server sebelum membaca frame
+        self.limiter = None
+        # heartbeat: client menjawab PING (opsi handshake "ping"), kapan
+        # frame terakhir diterima (time.monotonic) dan apakah FileFrame
+        # sedang dikirim (diam selama unduhan besar bukan tanda putus)
+        self.heartbeat = False
+        self.last_seen = time.monotonic()
+        self.streaming = False
+        # engine async: pesannya masuk saat antrian dispatch penuh, pembaca
+        # menunggu sampai antrian turun
+        self.dispatch_blocked = False
+        # presence sebagai [USER_DELTA] (opsi handshake "delta"); client lama
+        # menerima [USER_LIST] lengkap tiap ada perubahan
+        self.user_delta = False
+        # file baru sebagai FILE_INFO (opsi handshake "files"); client lama
+        # menerima isi file lengkap tipe 3/4
+        self.file_info = False
+
+
+class Registry:
+    # Indeks dua arah koneksi <-> nickname, ditambah room -> anggota supaya
+    # fan-out pesan publik sebanding dengan isi room, bukan seluruh server.
+    # Semua perubahan di bawah lock, dan iterasi selalu memakai salinan
+    # supaya aman saat ada yang join/keluar.
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.by_conn = {}
+        self.by_nick = {}
+        self.rooms = {}  # room -> {conn: session}
+
+    def __len__(self):
+        return len(self.by_conn)
+
+    def __contains__(self, conn):
+        return conn in self.by_conn
+
+    def add(self, conn, nickname, outbox, addr=None, compress=False,
+            version=1):
+        with self.lock:
+            if nickname in self.by_nick:
+                raise NicknameTaken(f"Nickname {nickname} sudah dipakai")
+            session = Session(conn, nickname, outbox, addr, compress, version)
+            self.by_conn[conn] = session
+            self.by_nick[nickname] = session
+            self.join(conn, DEFAULT_ROOM)
+            return session
+
+    async def add_async(self, conn, nickname, *args):
+        # Dipakai engine async. ClusterRegistry menunggu claim nickname di
+        # hub di sini tanpa menahan event loop.
+        return self.add(conn, nickname, *args)
+
+    def remove(self, conn):
+        with self.lock:
+            session = self.by_conn.pop(conn, None)
+            if session is not None:
+                del self.by_nick[session.nickname]
+                for room in session.rooms:
+                    self.discard_member(room, conn)
+            return session
+
+    def join(self, conn, room):
+        # True kalau baru bergabung; yang sudah anggota hanya jadi room aktif
+        with self.lock:
+            session = self.by_conn.get(conn)
+            if session is None:
+                return False
+            if room in session.rooms:
+                session.room = room
+                return False
+            if len(session.rooms) >= MAX_ROOMS:
+                raise ValueError(f"Maksimal {MAX_ROOMS} room per client")
+            self.rooms.setdefault(room, {})[conn] = session
+            session.rooms.add(room)
+            session.room = room
+            return True
+
+    def leave(self, conn, room):
+        with self.lock:
+            session = self.by_conn.get(conn)
+            if session is None or room not in session.rooms:
+                return False
+            session.rooms.discard(room)
+            self.discard_member(room, conn)
+            if session.room == room:
+                session.room = (DEFAULT_ROOM if DEFAULT_ROOM in session.rooms
+                                else min(session.rooms, default=None))
+            return True
+
+    def discard_member(self, room, conn):
+        members = self.rooms.get(room)
+        if members is not None:
+            members.pop(conn, None)
+            if not members:
+                del self.rooms[room]
+
+    def members(self, room):
+        # koneksi anggota room, O(anggota)
+        with self.lock:
+            return list(self.rooms.get(room, ()))
+
+    def room_sizes(self):
+        with self.lock:
+            return {room: len(members) for room, members in self.rooms.items()}
+
+    def session(self, conn):
+        return self.by_conn.get(conn)
+
+    def nickname(self, conn):
+        session = self.by_conn.get(conn)
+        return session.nickname if session else None
+
+    def find(self, nickname):
+        # O(1), dipakai untuk routing PM
+        return self.by_nick.get(nickname)
+
+    def sessions(self):
+        with self.lock:
+            return list(self.by_conn.values())
+
+    def connections(self):
+        with self.lock:
+            return list(self.by_conn)
+
+    def nicknames(self):
+        with self.lock:
+            return list(self.by_nick)
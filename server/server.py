@@ -2,70 +2,275 @@ import socket
 import threading
 import queue
 import os
+import json
 import logging
-import struct
 import time
-from datetime import datetime
+from functools import partial
+
+from outbox import ThreadOutbox, DROP_OLDEST, STALL
+from protocol import (make_frame, send_frame, recv_exact, discard_exact,
+                      parse_hello, HEADER,
+                      Frame, FileFrame, FILE_START, FILE_CHUNK, FILE_END,
+                      FILE_INFO, FILE_GET, FILE_DATA, TRANSFER_ID,
+                      FILE_END_BODY, END_OK, COMPRESSED, CompressionStats,
+                      inflate, V2_HEADER, VERSION_2, Batch, make_message,
+                      stored_file_message, history_frame, parse_v2_header,
+                      ROOM_JOIN, ROOM_LEAVE, FILE_OFFSET, PING, PONG)
+from transfer import Transfer
+from filestore import FileStore, HASH_RE
+from registry import Registry, NicknameTaken, DEFAULT_ROOM
+from history import History
+from metrics import Metrics, Delivery, format_summary, serve_metrics
+from limits import Limits, DISPATCH_QUEUE_SIZE
+from timerwheel import TimerWheel
+from capture import Capture, default_capture_path
+from profiler import (SamplingProfiler, MethodTimings, MemTrace,
+                      PROFILE_INTERVAL, PROFILE_MIN_INTERVAL,
+                      MEMTRACE_FRAMES, report_path, write_report)
+from serverlog import (setup_logging, stop_logging, env_settings,
+                       LOG_MAX_BYTES)
+
+ROOM_NAME_MAX = 32
+# Client yang diam selama PING_INTERVAL dikirimi PING; yang tetap diam
+# sampai IDLE_TIMEOUT diputus
+PING_INTERVAL = 30
+IDLE_TIMEOUT = 90
+# Antrian accept kernel; lonjakan koneksi (misalnya loadgen yang membuka
+# 50 koneksi sekaligus) tidak boleh meluap selagi thread accept sibuk
+LISTEN_BACKLOG = 1024
+
+
+def valid_room(room):
+    return (0 < len(room) <= ROOM_NAME_MAX and room.isprintable()
+            and not any(c in room for c in " ,|#"))
+
+
+def split_file_payload(payload, fields):
+    # Frame file lama "nama|...|isi": nama-nama di depan di-decode, isinya
+    # memoryview ke payload supaya file besar tidak disalin lagi
+    view = memoryview(payload)
+    names = []
+    start = 0
+    for _ in range(fields):
+        end = payload.index(b"|", start)
+        names.append(str(view[start:end], "utf-8"))
+        start = end + 1
+    return names, view[start:]
+
+
+def admin_number(args, convert, default, minimum):
+    # Argumen angka opsional perintah admin (args[1]); None kalau bukan
+    # angka, di bawah minimum atau tak hingga
+    if len(args) < 2:
+        return default
+    try:
+        value = convert(args[1])
+    except ValueError:
+        return None
+    return value if minimum <= value < float("inf") else None
+
+
+def room_audience(room):
+    # Audience record history: pesan lobby tanpa audience (seperti sebelum
+    # ada room), room lain "#nama"
+    return () if room == DEFAULT_ROOM else (f"#{room}",)
 
 
 class ChatServer:
-    def __init__(self, host, port):
+    # Method yang diukur waktunya per thread selama /profile: frame dari
+    # handle_client, pesan dari dispatch_message, dan jalur file
+    PROFILED_METHODS = ("handle_frame", "deliver_message", "start_transfer",
+                        "receive_chunk", "finish_transfer",
+                        "offer_file", "deliver_file", "broadcast_file",
+                        "send_private_file", "serve_file")
+
+    def __init__(self, host, port, outbox_size=256,
+                 overflow_policy=DROP_OLDEST, presence_window=0.0,
+                 history_replay=50, metrics_port=None, log_json=False,
+                 log_max_bytes=LOG_MAX_BYTES, log_when=None, limits=None,
+                 dispatch_queue_size=DISPATCH_QUEUE_SIZE, history_dir="history",
+                 log_path="server.log", ping_interval=PING_INTERVAL,
+                 idle_timeout=IDLE_TIMEOUT):
         self.host = host
         self.port = port
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.clients = {}
-        self.messages_queue = queue.Queue()
+        # True di mode cluster: beberapa proses menerima di port yang sama
+        self.reuse_port = False
+        # False di worker cluster: perintah admin dibaca proses induk
+        self.console = True
+        # socket <-> nickname <-> session (termasuk outbox-nya)
+        self.clients = Registry()
+        # Buffer keluar per client supaya client lambat tidak menahan yang lain
+        self.outbox_size = outbox_size
+        self.overflow_policy = overflow_policy
+        # Upload bertahap yang sedang berjalan: (socket, id client) -> Transfer
+        self.transfers = {}
+        self.store = FileStore()
+        # Perubahan presence yang belum dikirim: nickname -> "+" / "-".
+        # presence_window > 0 menggabungkan join/leave beruntun jadi satu delta
+        self.presence_window = presence_window
+        self.presence_pending = {}
+        self.presence_lock = threading.Lock()
+        self.presence_scheduled = False
+        # Riwayat pesan publik dan PM, dikirim ulang ke client yang bergabung
+        self.history = History(history_dir)
+        self.history_replay = history_replay
+        # Byte yang dihemat vs CPU yang dipakai untuk kompresi frame
+        self.compression = CompressionStats()
+        # Counter dan histogram runtime: /stats dan endpoint Prometheus
+        # lokal di metrics_port (None = tidak dibuka)
+        self.metrics = Metrics()
+        self.metrics_port = metrics_port
+        # Batas ukuran frame dan token bucket per koneksi; antrian dispatch
+        # dibatasi supaya client yang membanjir ikut ditahan
+        self.limits = limits or Limits()
+        self.dispatch_queue_size = dispatch_queue_size
+        self.messages_queue = queue.Queue(dispatch_queue_size)
+        # Heartbeat: satu timer wheel untuk semua koneksi, bukan timer per
+        # koneksi; frame masuk hanya memperbarui session.last_seen
+        self.ping_interval = ping_interval
+        self.idle_timeout = idle_timeout
+        self.idle_wheel = TimerWheel()
+        self.ping_frame = make_frame(PING, b"", compressible=False)
+        # Perekaman trafik masuk (/capture), None = mati: tiap frame hanya
+        # membayar satu pemeriksaan atribut
+        self.capture = None
+        # /profile dan /memtrace; None = mati, tidak ada yang terpasang
+        self.profiler = None
+        self.method_timings = None
+        self.memtrace = None
         self.running = False
         self.admin_nickname = "SERVER"
-        self.setup_loggin()
+        self.setup_loggin(log_path, log_json, log_max_bytes, log_when)
 
-    def setup_loggin(self):
-        logging.basicConfig(
-            level=logging.INFO,
-            format="[%(asctime)s] [%(levelname)s] %(message)s",
-            handlers=[logging.FileHandler(
-                "server.log"), logging.StreamHandler()],
-        )
+    def setup_loggin(self, path, json_mode=False, max_bytes=LOG_MAX_BYTES,
+                     when=None):
+        # server.log dirotasi per ukuran (atau per waktu kalau when diisi),
+        # ditulis thread listener supaya thread client tidak menunggu disk
+        setup_logging(path, json_mode, max_bytes, when)
 
-    def broadcast_message(self, sender, message):
-        self.messages_queue.put((sender, message))
+    def broadcast_message(self, sender, message, persist=True,
+                          room=DEFAULT_ROOM, client=None):
+        # persist=False untuk notifikasi join/leave, tidak masuk history.
+        # client: pengirim pesan; kalau antrian penuh thread pembacanya
+        # ditahan di sini, notifikasi server (client None) dibuang saja.
+        item = (sender, message, persist, room, time.perf_counter())
+        try:
+            self.messages_queue.put_nowait(item)
+            return
+        except queue.Full:
+            pass
+        if client is None:
+            self.metrics.notice_dropped()
+            return
+        self.dispatch_backpressure(client)
+        self.messages_queue.put(item)
+
+    def dispatch_backpressure(self, client):
+        session = self.clients.session(client)
+        if session is not None:
+            session.stats.dispatch_waits += 1
+            self.limit_notice(client, session,
+                              "Server sibuk, pesan Anda ditahan")
+
+    def admit_frame(self, client, session, msg_type, length):
+        # Dipanggil pembaca setelah header terbaca, sebelum body dibaca:
+        # (body boleh dibaca, detik menunggu dulu karena token bucket)
+        limit = self.limits.max_frame(msg_type)
+        if length > limit:
+            # dibuang tanpa mengambil token, jadi frame berikutnya tidak
+            # ikut ditahan; pemberitahuannya selalu dikirim karena client
+            # kehilangan frame ini
+            session.stats.oversized += 1
+            self.send_text(
+                client, 5,
+                f"[LIMIT] Frame tipe {msg_type & ~COMPRESSED} {length} byte "
+                f"melebihi batas {limit} byte, dibuang")
+            return False, 0.0
+        wait = session.limiter.throttle(msg_type, length)
+        if wait > 0:
+            session.stats.throttled += 1
+            session.stats.throttled_seconds += wait
+            self.limit_notice(client, session,
+                              f"Terlalu cepat, ditahan {wait:.2f} s")
+        return True, wait
+
+    def limit_notice(self, client, session, text):
+        if session.limiter.should_notice():
+            self.send_text(client, 5, f"[LIMIT] {text}")
 
     def send_text(self, client, msg_type, message):
-        try:
-            data = message.encode('utf-8')
-            header = struct.pack("!II", msg_type, len(data))
-            client.sendall(header + data)
-        except:
-            logging.error(
-                f"Error saat mengirim data ke {client.getpeername()}")
-            self.remove_client(client)
-            self.send_file()
+        self.send_frame(client, make_frame(msg_type, message))
 
     def send_file(self, client, msg_type, payload):
-        try:
-            header = struct.pack("!II", msg_type, len(payload))
-            client.sendall(header + payload)
-        except Exception as e:
+        self.send_frame(client, make_frame(msg_type, payload))
+
+    def send_frame(self, client, frame):
+        # Hanya memasukkan frame ke outbox client, pengiriman oleh writer-nya
+        session = self.clients.session(client)
+        if session is None:
+            return
+        if isinstance(frame, Frame):
+            # Versi v2 dan versi terkompresi dibuat sekali per frame,
+            # dipakai semua penerima yang memintanya
+            if session.version == VERSION_2:
+                frame = frame.v2()
+            if session.compress:
+                packed = frame.compressed(self.compression)
+                self.compression.sent(len(frame[-1]), len(packed[-1]))
+                frame = packed
+        if not session.outbox.put(frame):
             logging.error(
-                f"Error saat mengirim file ke {client.getpeername()}: {e}")
+                f"Outbox {session.nickname} penuh, koneksi diputus")
             self.remove_client(client)
 
+    def create_outbox(self):
+        return ThreadOutbox(self.outbox_size, self.overflow_policy)
+
+    def client_writer(self, client_socket, session):
+        outbox = session.outbox
+        while True:
+            frame = outbox.get()
+            if frame is None:
+                return
+            try:
+                started = time.perf_counter()
+                if isinstance(frame, FileFrame):
+                    session.streaming = True
+                send_frame(client_socket, frame)
+                session.streaming = False
+                self.metrics.frame_sent(session, frame, started)
+            except Exception as e:
+                if outbox.closed:  # client sudah dilepas lebih dulu
+                    return
+                logging.error(
+                    f"Error saat mengirim data ke {self.clients.nickname(client_socket)}: {e}")  # noqa: E128
+                self.remove_client(client_socket)
+                return
+
+    def queue_stats(self):
+        # (nickname, kedalaman antrian, frame dibuang) per client
+        return [(s.nickname, len(s.outbox), s.outbox.dropped)
+                for s in self.clients.sessions()]
+
     def start(self):
         try:
-            self.server_socket.setsockopt(
-                socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-            self.server_socket.bind((self.host, self.port))
-            self.server_socket.listen(10)
+            self.listen(LISTEN_BACKLOG)
             self.running = True
             logging.info(f"Server Berjalan di {self.host}:{self.port}")
-            print("Daftar Perintah:\n/users\n/exit\n")
+            self.print_commands()
+            self.start_metrics()
+            self.start_idle_ticker()
         except Exception as e:
             logging.info(f"Gagal memulai server: {e}")
-            os.exit(1)
+            stop_logging()
+            os._exit(1)
             return
 
         threading.Thread(target=self.dispatch_message, daemon=True).start()
-        threading.Thread(target=self.handle_admin_input, daemon=True).start()
+        if self.console:
+            threading.Thread(target=self.handle_admin_input,
+                             daemon=True).start()
 
         while self.running:
             try:
@@ -78,83 +283,201 @@ class ChatServer:
             except Exception as e:
                 logging.error(f"Error saat menangani client: {e}")
 
+    def listen(self, backlog):
+        self.server_socket.setsockopt(
+            socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.reuse_port:
+            # kernel membagi koneksi baru ke semua proses yang listen
+            self.server_socket.setsockopt(
+                socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        self.server_socket.bind((self.host, int(self.port)))
+        self.server_socket.listen(backlog)
+
+    def print_commands(self):
+        if self.console:
+            print("Daftar Perintah:\n/users\n/rooms\n/queues\n/compression\n/stats\n"
+                  "/capture start [file] [redact] | stop\n"
+                  "/profile start [ms] | stop\n"
+                  "/memtrace start [frames] | dump | stop\n/exit\n")
+
+    def start_metrics(self):
+        if self.metrics_port:
+            serve_metrics(self, "127.0.0.1", int(self.metrics_port))
+            logging.info(
+                f"Metrics Prometheus di http://127.0.0.1:{self.metrics_port}/metrics")  # noqa: E128
+
     def dispatch_message(self):
         while self.running:
             try:
-                sender, message = self.messages_queue.get(timeout=1)
-                timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                formatted_msg = f"{timestamp}|{sender}|{message}"
-                for c in self.clients.keys():
-                    # Mengirim pesan ke semua klien
-                    self.send_text(c, 1, formatted_msg)
+                item = self.messages_queue.get(timeout=1)
+                self.deliver_message(*item)
             except queue.Empty:
                 continue
 
+    def deliver_message(self, sender, message, persist, room=DEFAULT_ROOM,
+                        queued_at=None, seq=None):
+        # seq: nomor dari bus di mode cluster, supaya sama di semua worker
+        frame = make_message(1, sender, message, target=room)
+        if persist:
+            frame.seq = self.history.append(1, frame[1],
+                                            audience=room_audience(room),
+                                            seq=seq)
+        # hanya anggota room, bukan semua client
+        recipients = self.clients.members(room)
+        if queued_at is not None and recipients:
+            frame.delivery = Delivery(self.metrics.dispatch_latency,
+                                      queued_at, len(recipients))
+        for c in recipients:
+            # Mengirim pesan ke semua klien
+            self.send_frame(c, frame)
+
     def handle_admin_input(self):
         while self.running:
             try:
                 admin_input = input().strip()
-                if not admin_input:
-                    continue
-                if admin_input.startswith('/users'):
-                    users = '\n'.join(self.clients.values())
-                    print(
-                        f"Daftar user online:\n{users if users else "Tidak ada user online"}")
-                elif admin_input.startswith("/exit"):
-                    self.shutdown()
-                    return
-                else:
-                    self.broadcast_message(self.admin_nickname, admin_input)
             except Exception as e:
                 logging.error(f"Error saat menangani input admin: {e}")
                 self.shutdown()
                 return
+            if not admin_input:
+                continue
+            if admin_input.startswith("/exit"):
+                self.shutdown()
+                return
+            try:
+                self.admin_command(admin_input)
+            except Exception as e:
+                # perintah yang gagal tidak menghentikan server
+                logging.error(f"Error saat menjalankan {admin_input!r}: {e}")
+
+    def admin_command(self, admin_input):
+        if admin_input.startswith('/users'):
+            users = '\n'.join(self.clients.nicknames())
+            print(
+                f"Daftar user online:\n{users if users else "Tidak ada user online"}")
+        elif admin_input.startswith('/rooms'):
+            for room, size in sorted(self.clients.room_sizes().items()):
+                print(f"{room}: {size} anggota")
+        elif admin_input.startswith('/queues'):
+            for nickname, depth, dropped in self.queue_stats():
+                lag = " (tertinggal)" if depth >= self.outbox_size else ""
+                print(f"{nickname}: {depth} frame, {dropped} dibuang{lag}")
+        elif admin_input.startswith('/compression'):
+            print(self.compression.summary())
+        elif admin_input.startswith('/stats'):
+            print(format_summary(self))
+        elif admin_input.startswith('/capture'):
+            args = admin_input.split()[1:]
+            if args[:1] == ["start"]:
+                redact = "redact" in args[1:]
+                path = next((a for a in args[1:] if a != "redact"), None)
+                self.start_capture(path, redact)
+            elif args[:1] == ["stop"]:
+                self.stop_capture()
+            else:
+                print("Pemakaian: /capture start [file] [redact] | /capture stop")
+        elif admin_input.startswith('/profile'):
+            args = admin_input.split()[1:]
+            ms = None
+            if args[:1] == ["start"]:
+                ms = admin_number(args, float, PROFILE_INTERVAL * 1000,
+                                  PROFILE_MIN_INTERVAL * 1000)
+            if ms is not None:
+                self.start_profile(ms / 1000)
+            elif args[:1] == ["stop"]:
+                self.stop_profile()
+            else:
+                print(f"Pemakaian: /profile start [ms, minimal "
+                      f"{PROFILE_MIN_INTERVAL * 1000:g}] | /profile stop")
+        elif admin_input.startswith('/memtrace'):
+            args = admin_input.split()[1:]
+            frames = None
+            if args[:1] == ["start"]:
+                frames = admin_number(args, int, MEMTRACE_FRAMES, 1)
+            if frames is not None:
+                self.start_memtrace(frames)
+            elif args[:1] in (["dump"], ["stop"]):
+                self.dump_memtrace(stop=args[0] == "stop")
+            else:
+                print("Pemakaian: /memtrace start [frames, minimal 1] | "
+                      "dump | stop")
+        else:
+            self.broadcast_message(self.admin_nickname, admin_input)
 
     def handle_client(self, client_socket, addr):
         try:
             client_socket.send("NICK".encode('utf-8'))
-            nickname = client_socket.recv(1024).decode("utf-8")
+            nickname, options = parse_hello(client_socket.recv(1024))
             if not nickname:
                 raise ValueError("Nickname kosong")
-            self.clients[client_socket] = nickname
+            compress, version, caps = self.negotiate(options)
+            outbox = self.create_outbox()
+            if caps:
+                outbox.put(make_frame(5, f"[CAPS] {caps}"))
+            try:
+                session = self.clients.add(client_socket, nickname, outbox,
+                                           addr, compress, version)
+            except NicknameTaken as e:
+                send_frame(client_socket, make_frame(5, f"[ERROR] {e}"))
+                raise
+            session.limiter = self.limits.limiter()
+            session.user_delta = bool(options.get("delta"))
+            session.file_info = bool(options.get("files"))
+            self.track_idle(client_socket, session, options)
+            if self.capture is not None:
+                self.capture.opened(session)
+            self.metrics.connected()
+            threading.Thread(
+                target=self.client_writer,
+                args=(client_socket, session),
+                daemon=True,
+            ).start()
             logging.info(f"Client {addr} bergabung dengan nama {nickname}")
             join_msg = f"{nickname} Bergabung dalam obrolan"
-            self.broadcast_message(self.admin_nickname, join_msg)
-            self.update_user_list()
+            self.broadcast_message(self.admin_nickname, join_msg,
+                                   persist=False)
+            self.send_user_list(client_socket)
+            self.presence_changed(nickname, "+")
+            self.replay_history(client_socket, nickname, options.get("since"))
 
             while self.running:
                 try:
-                    # Menerima header pesan dari klien
-                    header = client_socket.recv(8)
-                    if len(header) < 8:
-                        logging.error(f"Header dari {nickname, addr} tidak valid")  # noqa: E128
-                    msg_type, length = struct.unpack("!II", header)
-
-                    # Membaca data pesan dari klien
-                    data = b""
-                    while len(data) < length:
-                        more = client_socket.recv(length - len(data))
-                        if not more:
-                            raise ConnectionError("Koneksi client terputus")
-                        data += more
-
-                    # Memeriksa tipe pesan
-                    if msg_type == 1:  # pesan text
-                        message = data.decode("utf-8")
-                        self.broadcast_message(nickname, message)
-                    elif msg_type == 2:  # private message
-                        message = data.decode("utf-8")
-                        target, message = message.split(maxsplit=1)
-                        self.send_private_message(
-                            client_socket, nickname, target, message)
-                    elif msg_type == 3:  # file
-                        self.broadcast_file(
-                            client_socket, nickname, data)
-                    if msg_type == 4:  # file private
-                        self.send_private_file(
-                            client_socket, nickname, data)
-
-                except ConnectionResetError:
+                    if self.overflow_policy == STALL:
+                        # Jangan baca dari client yang belum menguras outbox-nya
+                        outbox.wait_not_lagging()
+                    # Menerima header dan data pesan dari klien; byte
+                    # pertama header membedakan frame v1 dan v2
+                    header = recv_exact(client_socket, HEADER.size)
+                    target = None
+                    if header[0] == VERSION_2 and session.version == VERSION_2:
+                        header += recv_exact(client_socket,
+                                             V2_HEADER.size - HEADER.size)
+                        msg_type, _, _, sender_len, target_len, length = (
+                            parse_v2_header(header))
+                        names = recv_exact(client_socket,
+                                           sender_len + target_len)
+                        target = bytes(names[sender_len:])
+                        header += names
+                    else:
+                        msg_type, length = HEADER.unpack(header)
+                    session.last_seen = time.monotonic()
+                    self.metrics.frame_received(
+                        session, msg_type, len(header) + length)
+                    # Body baru dibaca setelah lolos batas ukuran dan rate;
+                    # selama menunggu, data client tertahan di buffer TCP
+                    ok, wait = self.admit_frame(client_socket, session,
+                                                msg_type, length)
+                    if wait:
+                        time.sleep(wait)
+                    if not ok:
+                        discard_exact(client_socket, length)
+                        continue
+                    data = recv_exact(client_socket, length)
+
+                    self.handle_frame(client_socket, nickname, msg_type, data,
+                                      target)
+
+                except ConnectionError:
                     logging.info(f"Client {nickname} Terputus")
                     break
                 except Exception as e:
@@ -164,79 +487,637 @@ class ChatServer:
             logging.error(f"Error saat menangani {addr}: {e}")
         finally:
             self.remove_client(client_socket)
+            self.close_connection(client_socket)
 
-    def send_private_message(self, sender_socket, sender, target, message):
-        for c, n in self.clients.items():
-            if n == target:
-                timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                formatted_msg = f"{timestamp}|{sender}|{message}"
-                self.send_text(c, 2, formatted_msg)
-                self.send_text(sender_socket, 2, formatted_msg)
+    def negotiate(self, options):
+        # Client baru menyebut kemampuannya di JSON handshake. Yang disetujui
+        # dijawab dengan [CAPS], yang masuk outbox sebelum session terlihat
+        # thread lain: selalu frame pertama client dan masih berformat v1.
+        compress = "zlib" in options.get("compress", ())
+        version = VERSION_2 if options.get("proto") == VERSION_2 else 1
+        caps = []
+        if compress:
+            caps.append("compress=zlib")
+        if version == VERSION_2:
+            caps.append(f"proto={VERSION_2}")
+        if options.get("resume"):
+            caps.append("resume=1")
+        if options.get("ping"):
+            caps.append("ping=1")
+        if options.get("delta"):
+            caps.append("delta=1")
+        if options.get("files"):
+            caps.append("files=1")
+        return compress, version, " ".join(caps)
+
+    def handle_frame(self, client_socket, nickname, msg_type, data,
+                     target=None):
+        # target hanya ada di frame v2 (field tersendiri). Di engine async
+        # frame file bisa mengembalikan coroutine (lihat run_blocking) yang
+        # ditunggu pembaca sebelum frame berikutnya dibaca.
+        if msg_type & COMPRESSED:
+            session = self.clients.session(client_socket)
+            if session is None or not session.compress:
+                raise ValueError("Frame terkompresi tanpa negosiasi")
+            data = inflate(data, self.limits.max_frame(msg_type))
+            msg_type &= ~COMPRESSED
+            self.compression.received()
+        capture = self.capture
+        if capture is not None:
+            capture.frame(self.clients.session(client_socket), msg_type,
+                          data, target)
+        # Memeriksa tipe pesan
+        if msg_type == 1:  # pesan text ke room (v2: target, v1: room aktif)
+            message = data.decode("utf-8")
+            room = self.target_room(
+                client_socket, target.decode("utf-8") if target else None)
+            if room is not None:
+                self.broadcast_message(nickname, message, room=room,
+                                       client=client_socket)
+        elif msg_type == 2:  # private message
+            message = data.decode("utf-8")
+            if target is None:
+                target, message = message.split(maxsplit=1)
+            else:
+                target = target.decode("utf-8")
+            self.send_private_message(
+                client_socket, nickname, target, message)
+        elif msg_type == 3:  # file
+            return self.broadcast_file(
+                client_socket, nickname, data)
+        if msg_type == 4:  # file private
+            return self.send_private_file(
+                client_socket, nickname, data)
+        elif msg_type == FILE_START:
+            return self.start_transfer(client_socket, nickname, data)
+        elif msg_type == FILE_CHUNK:
+            self.receive_chunk(client_socket, data)
+        elif msg_type == FILE_END:
+            self.finish_transfer(client_socket, data)
+        elif msg_type == FILE_GET:
+            self.serve_file(client_socket, data)
+        elif msg_type == ROOM_JOIN:
+            self.join_room(client_socket, nickname, data.decode("utf-8"))
+        elif msg_type == ROOM_LEAVE:
+            self.leave_room(client_socket, nickname, data.decode("utf-8"))
+        elif msg_type == PING:
+            self.send_frame(client_socket, make_frame(PONG, data, False))
+        # PONG cukup tercatat di session.last_seen
+
+    def target_room(self, client_socket, room=None):
+        # Room tujuan pesan publik; None (dengan [ERROR]) kalau client
+        # bukan anggotanya
+        session = self.clients.session(client_socket)
+        if session is None:
+            return None
+        room = room or session.room
+        if room not in session.rooms:
+            self.send_text(client_socket, 5,
+                           f"[ERROR] Anda belum bergabung di room {room}")
+            return None
+        return room
+
+    def join_room(self, client_socket, nickname, room):
+        if not valid_room(room):
+            self.send_text(client_socket, 5,
+                           f"[ERROR] Nama room tidak valid: {room}")
+            return
+        try:
+            joined = self.clients.join(client_socket, room)
+        except ValueError as e:
+            self.send_text(client_socket, 5, f"[ERROR] {e}")
+            return
+        self.send_rooms(client_socket)
+        if joined:
+            self.replay_history(client_socket, nickname, room=room)
+            self.broadcast_message(self.admin_nickname,
+                                   f"{nickname} masuk room {room}",
+                                   persist=False, room=room)
+
+    def leave_room(self, client_socket, nickname, room):
+        if not self.clients.leave(client_socket, room):
+            self.send_text(client_socket, 5,
+                           f"[ERROR] Anda belum bergabung di room {room}")
+            return
+        self.send_rooms(client_socket)
+        self.broadcast_message(self.admin_nickname,
+                               f"{nickname} keluar dari room {room}",
+                               persist=False, room=room)
+
+    def send_rooms(self, client_socket):
+        session = self.clients.session(client_socket)
+        if session is not None:
+            self.send_text(client_socket, 5,
+                           f"[ROOMS] {','.join(sorted(session.rooms))}")
+
+    def start_transfer(self, client_socket, sender, data):
+        meta = json.loads(data)
+        file_name = os.path.basename(meta["name"])
+        target = meta.get("target")
+        # Client yang menyebut hash file bisa melanjutkan upload yang
+        # terputus; dia menunggu FILE_OFFSET sebelum mengirim potongan
+        file_hash = meta.get("hash")
+        if file_hash is not None and not HASH_RE.match(file_hash):
+            raise ValueError("Hash file tidak valid")
+        room = None
+        if target and not self.user_online(target):
+            self.send_text(client_socket, 5,
+                           f"[ERROR] {target} tidak ditemukan")
+            self.reject_transfer(client_socket, meta["id"], file_hash)
+            return
+        if not target:
+            room = self.target_room(client_socket, meta.get("room"))
+            if room is None:
+                self.reject_transfer(client_socket, meta["id"], file_hash)
                 return
-        self.send_text(sender_socket, 5, f"[ERROR] {target} tidak ditemukan")
+        transfer = Transfer(sender, file_name, meta["size"], None,
+                            private=bool(target), target=target, room=room)
+        if file_hash is None:
+            transfer.upload = self.store.begin()
+            self.transfers[(client_socket, meta["id"])] = transfer
+            return
+        return self.run_blocking(
+            partial(self.resume_transfer, client_socket, meta["id"],
+                    transfer),
+            self.store.resume, file_hash, meta["size"])
 
-    def broadcast_file(self, sender_socket, sender, payload):
-        file_name, file_data = payload.split(b"|", 1)
-        file_name = file_name.decode("utf-8")
-        save_dir = "received_files"
-        os.makedirs(save_dir, exist_ok=True)
-        save_path = os.path.join(save_dir, file_name)
-        with open(save_path, "wb") as f:
-            f.write(file_data)
+    def resume_transfer(self, client_socket, transfer_id, transfer, resumed):
+        transfer.upload, offset = resumed
+        if self.clients.session(client_socket) is None:
+            transfer.suspend()  # putus selama partial dihash
+            return
+        self.send_frame(client_socket, make_frame(FILE_OFFSET, json.dumps(
+            {"id": transfer_id, "offset": offset})))
+        self.transfers[(client_socket, transfer_id)] = transfer
+
+    def reject_transfer(self, client_socket, transfer_id, file_hash):
+        # potongan untuk transfer ini akan diabaikan
+        self.transfers[(client_socket, transfer_id)] = None
+        if file_hash is not None:
+            self.send_frame(client_socket, make_frame(FILE_OFFSET, json.dumps(
+                {"id": transfer_id, "offset": None})))
+
+    def receive_chunk(self, client_socket, data):
+        (transfer_id,) = TRANSFER_ID.unpack_from(data)
+        transfer = self.transfers.get((client_socket, transfer_id))
+        if transfer is None:
+            return
+        transfer.write(memoryview(data)[TRANSFER_ID.size:])
+
+    def finish_transfer(self, client_socket, data):
+        transfer_id, status = FILE_END_BODY.unpack(data)
+        transfer = self.transfers.pop((client_socket, transfer_id), None)
+        if transfer is None:
+            return
+        if status != END_OK:
+            transfer.abort()
+            return
+        if transfer.upload.size != transfer.size:
+            transfer.abort()
+            self.send_text(client_socket, 5,
+                           f"[ERROR] {transfer.file_name} tidak lengkap")
+            return
+        try:
+            file_hash = transfer.finish()
+        except ValueError:
+            self.send_text(client_socket, 5,
+                           f"[ERROR] Checksum {transfer.file_name} tidak cocok")
+            return
+        self.metrics.upload_finished(
+            transfer.size, time.perf_counter() - transfer.started_at)
         logging.info(
-            f"File {file_name} diterima dari {sender} berhasil disimpan")
-        payload = sender.encode('utf8') + b"|" + file_name.encode("utf-8") + b"|" + file_data  # noqa: E128
-        for c in self.clients.keys():
-            self.send_file(c, 3, payload)
-        self.send_text(sender_socket, 5,
-                       f"[INFO] {file_name} berhasil terkirim")
+            f"File {transfer.file_name} diterima dari {transfer.sender} berhasil disimpan")  # noqa: E128
+        if transfer.private and not self.user_online(transfer.target):
+            self.send_text(client_socket, 5,
+                           f"[ERROR] {transfer.target} tidak ditemukan")
+            return
+        self.deliver_file_info({
+            "hash": file_hash, "name": transfer.file_name,
+            "size": self.store.size(file_hash), "sender": transfer.sender,
+            "private": transfer.private, "room": transfer.room,
+        }, transfer.target)
+        info = f"[INFO] {transfer.file_name} berhasil terkirim"
+        if transfer.private:
+            info += f" ke {transfer.target}"
+        self.send_text(client_socket, 5, info)
+
+    def deliver_file_info(self, info, target=None):
+        self.offer_file(info, target)
+
+    def offer_file(self, info, target=None):
+        # Frame dipilih per penerima. Client yang meminta "files" hanya
+        # menerima deskriptor dan mengambil isinya lewat FILE_GET saat link
+        # diklik; client lama menerima file lengkap tipe 3/4 dari store.
+        path = self.store.path(info["hash"])
+        msg_type = 4 if info["private"] else 3
+        if info["private"]:
+            recipients = self.local_connections(target, info["sender"])
+        else:
+            recipients = self.clients.members(info["room"])
+        frames = {}  # versi protokol, atau FILE_INFO -> frame
+        for c in recipients:
+            session = self.clients.session(c)
+            if session is None:
+                continue
+            key = FILE_INFO if session.file_info else session.version
+            frame = frames.get(key)
+            if frame is None:
+                if session.file_info:
+                    frame = make_frame(FILE_INFO, json.dumps(info))
+                else:
+                    # isi dikirim writer penerima langsung dari salinan di
+                    # store (sendfile); seperti FILE_DATA tidak dikompresi
+                    frame = stored_file_message(
+                        msg_type, info["sender"], info["name"], path,
+                        info["size"], session.version)
+                frames[key] = frame
+            self.send_frame(c, frame)
+
+    def local_connections(self, *nicknames):
+        # koneksi nickname yang terhubung ke proses ini
+        sessions = [self.clients.find(n) for n in dict.fromkeys(nicknames)]
+        return [s.conn for s in sessions if s is not None]
+
+    def user_online(self, nickname):
+        return self.clients.find(nickname) is not None
+
+    def serve_file(self, client_socket, data):
+        request = json.loads(data)
+        file_hash = request["hash"]
+        if not self.store.exists(file_hash):
+            self.send_text(client_socket, 5, "[ERROR] File tidak ditemukan")
+            return
+        session = self.clients.session(client_socket)
+        if session is None:
+            return
+        # Download yang terputus dilanjutkan dari offset milik client;
+        # client memeriksa digest terhadap seluruh file setelah digabung
+        size = self.store.size(file_hash)
+        offset = min(max(int(request.get("offset") or 0), 0), size)
+        digest = bytes.fromhex(file_hash)
+        if offset == size:
+            # .part milik client sudah lengkap: FILE_DATA tanpa body, file
+            # tidak dibuka; client tetap memeriksa sha256 lalu mengganti nama
+            self.send_frame(client_socket, FileFrame(
+                FILE_DATA, digest, None, 0, session.version))
+            return
+        # Body dikirim dari disk dengan sendfile oleh writer client
+        self.send_frame(client_socket, FileFrame(
+            FILE_DATA, digest, self.store.path(file_hash),
+            size - offset, session.version, offset))
+
+    def abort_transfers(self, client_socket):
+        # Koneksi putus: upload dengan hash disimpan sebagai partial
+        for key in [k for k in list(self.transfers) if k[0] is client_socket]:
+            transfer = self.transfers.pop(key, None)
+            if transfer is not None:
+                transfer.suspend()
+
+    def send_private_message(self, sender_socket, sender, target, message):
+        if not self.user_online(target):
+            self.send_text(sender_socket, 5, f"[ERROR] {target} tidak ditemukan")
+            return
+        self.deliver_private(sender, target, message)
+
+    def deliver_private(self, sender, target, message, seq=None):
+        frame = make_message(2, sender, message, target=target)
+        frame.seq = self.history.append(2, frame[1],
+                                        audience=(sender, target), seq=seq)
+        for c in self.local_connections(target, sender):
+            self.send_frame(c, frame)
+
+    def broadcast_file(self, sender_socket, sender, payload):
+        (file_name,), file_data = split_file_payload(payload, 1)
+        room = self.target_room(sender_socket)
+        if room is None:
+            return
+        # Frame lama (tipe 3/4) dari client versi lama, tetap disimpan per hash
+        return self.run_blocking(
+            partial(self.legacy_file_stored, sender_socket, sender,
+                    file_name, room, None),
+            self.store.put, file_data)
 
     def send_private_file(self, sender_socket, sender, payload):
-        target, file_name, file_data = payload.split(b"|", 2)
-        target = target.decode("utf-8")
-        file_name = file_name.decode("utf-8")
-
-        save_dir = "received_files"
-        os.makedirs(save_dir, exist_ok=True)
-        save_path = os.path.join(save_dir, file_name)
-        with open(save_path, "wb") as f:
-            f.write(file_data)
+        (target, file_name), file_data = split_file_payload(payload, 2)
+        if not self.user_online(target):
+            self.send_text(sender_socket, 5, f"[ERROR] {target} tidak ditemukan")
+            return
+        # Frame lama (tipe 3/4) dari client versi lama, tetap disimpan per hash
+        return self.run_blocking(
+            partial(self.legacy_file_stored, sender_socket, sender,
+                    file_name, None, target),
+            self.store.put, file_data)
+
+    def legacy_file_stored(self, sender_socket, sender, file_name, room,
+                           target, file_hash):
         logging.info(
             f"File {file_name} diterima dari {sender} berhasil disimpan")
-        payload = sender.encode('utf8') + b"|" + file_name.encode("utf-8") + b"|" + file_data  # noqa: E128
-        for c, n in self.clients.items():
-            if n == target:
-                self.send_file(c, 4, payload)
-                self.send_file(sender_socket, 4, payload)
-                self.send_text(sender_socket, 5, f"[INFO] {file_name} berhasil terkirim ke {target}")  # noqa: E128)
-                return
-        self.send_text(sender_socket, 5, f"[ERROR] {target} tidak ditemukan")
+        if target is None:
+            self.deliver_file(3, sender, file_name, file_hash, room=room)
+            self.send_text(sender_socket, 5,
+                           f"[INFO] {file_name} berhasil terkirim")
+        else:
+            self.deliver_file(4, sender, file_name, file_hash, target=target)
+            self.send_text(sender_socket, 5,
+                           f"[INFO] {file_name} berhasil terkirim ke {target}")
+
+    def deliver_file(self, msg_type, sender, file_name, file_hash,
+                     room=None, target=None):
+        # Upload lama tipe 3/4 diumumkan seperti upload FILE_START: client
+        # baru juga hanya menerima FILE_INFO, bukan isi file lengkap
+        self.offer_file({
+            "hash": file_hash, "name": file_name,
+            "size": self.store.size(file_hash), "sender": sender,
+            "private": msg_type == 4, "room": room,
+        }, target)
 
     def shutdown(self):
         self.running = False
-        for c in self.clients.keys():
-            self.send_text(c, 5, "[INFO] Server shutdown")
+        frame = make_frame(5, "[INFO] Server shutdown")
+        for c in self.clients.connections():
+            self.send_frame(c, frame)
         time.sleep(5)
+        stop_logging()
         os._exit(1)
 
-    def remove_client(self, client_socket):
-        if client_socket in self.clients:
-            nickname = self.clients[client_socket]
-            client_socket.close()
-            del self.clients[client_socket]
+    def remove_client(self, client_socket, presence=True):
+        # presence=False: pemanggil mengirim presence-nya sendiri (reaper)
+        self.abort_transfers(client_socket)
+        self.idle_wheel.cancel(client_socket)
+        session = self.metrics.retire(self.clients, client_socket)
+        if session is not None:
+            capture = self.capture
+            if capture is not None:
+                capture.closed(session)
+            session.outbox.close()
+            self.close_connection(client_socket)
             self.broadcast_message(self.admin_nickname,
-                                   f"{nickname} Meninggalkan obrolan")
-            self.update_user_list()
+                                   f"{session.nickname} Meninggalkan obrolan",
+                                   persist=False)
+            if presence:
+                self.presence_changed(session.nickname, "-")
+        return session
+
+    def start_capture(self, path=None, redact=False):
+        if self.capture is not None:
+            print(f"Capture sudah berjalan ke {self.capture.path}")
+            return
+        try:
+            capture = Capture(path or default_capture_path(), redact)
+        except OSError as e:
+            print(f"Capture tidak bisa dimulai: {e}")
+            return
+        # koneksi yang sudah ada direkam mulai sekarang, dengan room-nya
+        for session in self.clients.sessions():
+            capture.opened(session)
+        self.capture = capture
+        mode = " (diredaksi)" if redact else ""
+        logging.info(f"Capture trafik ke {capture.path}{mode}")
+
+    def stop_capture(self):
+        capture, self.capture = self.capture, None
+        if capture is None:
+            print("Capture tidak berjalan")
+            return
+        records, dropped = capture.stop()
+        logging.info(f"Capture {capture.path} selesai: {records} record, "
+                     f"{dropped} dibuang")
+
+    def start_profile(self, interval=PROFILE_INTERVAL):
+        if self.profiler is not None:
+            print("Profiling sudah berjalan")
+            return
+        self.method_timings = MethodTimings()
+        self.method_timings.install(self, self.PROFILED_METHODS)
+        self.profiler = SamplingProfiler(interval)
+        self.profiler.start()
+        logging.info(f"Profiling dimulai (sampel tiap {interval * 1000:g} ms)")
+
+    def stop_profile(self):
+        profiler, self.profiler = self.profiler, None
+        if profiler is None:
+            print("Profiling tidak berjalan")
+            return
+        timings, self.method_timings = self.method_timings, None
+        timings.remove()
+        profiler.stop()
+        path = report_path("profile")
+        write_report(path, profiler.report() + [""] + timings.report())
+        logging.info(f"Profil CPU ditulis ke {path}")
+
+    def start_memtrace(self, frames=MEMTRACE_FRAMES):
+        if self.memtrace is not None:
+            print("Memtrace sudah berjalan")
+            return
+        self.memtrace = MemTrace(frames)
+        logging.info(f"Memtrace dimulai ({frames} frame per alokasi)")
+
+    def dump_memtrace(self, stop=False):
+        memtrace = self.memtrace
+        if memtrace is None:
+            print("Memtrace tidak berjalan")
+            return
+        path = report_path("memtrace")
+        write_report(path, memtrace.report())
+        if stop:
+            self.memtrace = None
+            memtrace.stop()
+        logging.info(f"Snapshot alokasi ditulis ke {path}")
+
+    def close_connection(self, client_socket):
+        # shutdown dulu supaya recv di thread handle_client ikut berhenti
+        try:
+            client_socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        client_socket.close()
+
+    def replay_history(self, client, nickname, since=None, room=None):
+        # Semua pesan lama dikirim sebagai satu entri outbox, body berupa
+        # slice mmap dari segment log (v2 juga, lewat Frame.v2). Dengan room:
+        # hanya pesan room itu, untuk client yang baru bergabung ke sana.
+        session = self.clients.session(client)
+        if session is None:
+            return
+        only = None
+        if room is not None:
+            only = ",".join(room_audience(room)).encode('utf-8')
+        records, last_seq, truncated = self.history.replay(
+            nickname, since, self.history_replay, only)
+        if since is not None and truncated:
+            # pesan setelah since yang lebih lama dari ini tidak dikirim
+            first = records[0][0] if records else last_seq + 1
+            self.send_text(client, 5, f"[HISTORY_TRUNCATED] {first}")
+        frames = []
+        for seq, msg_type, audience, body in records:
+            # target v2: nama room, atau tujuan PM ("pengirim,tujuan")
+            names = audience.split(b",")
+            if audience.startswith(b"#"):
+                target = audience[1:]
+            elif len(names) == 2:
+                target = names[1]
+            else:
+                target = DEFAULT_ROOM.encode('utf-8')
+            frame = history_frame(seq, msg_type, body, target)
+            frames.append(frame.v2() if session.version == VERSION_2
+                          else frame)
+        if frames:
+            self.send_frame(client, Batch(frames, session.version))
+        if room is None:
+            self.send_text(client, 5, f"[HISTORY] {last_seq}")
+
+    def send_user_list(self, client):
+        # Snapshot lengkap hanya untuk client yang baru bergabung
+        user_list = ",".join(self.clients.nicknames())
+        self.send_text(client, 5, f"[USER_LIST] {user_list}")
+
+    def presence_changed(self, nickname, change):
+        self.presence_changes([(nickname, change)])
+
+    def presence_changes(self, changes):
+        # Beberapa perubahan sekaligus menjadi satu [USER_DELTA]
+        with self.presence_lock:
+            for nickname, change in changes:
+                if self.presence_pending.get(nickname, change) != change:
+                    # join lalu leave (atau sebaliknya) dalam satu jendela:
+                    # batal
+                    del self.presence_pending[nickname]
+                else:
+                    self.presence_pending[nickname] = change
+            if self.presence_window <= 0:
+                flush_now = True
+            else:
+                flush_now = False
+                if not self.presence_scheduled:
+                    self.presence_scheduled = True
+                    self.call_later(self.presence_window, self.flush_presence)
+        if flush_now:
+            self.flush_presence()
+
+    def flush_presence(self):
+        with self.presence_lock:
+            pending = self.presence_pending
+            self.presence_pending = {}
+            self.presence_scheduled = False
+        if not pending:
             return
+        delta = ",".join(change + nickname
+                         for nickname, change in pending.items())
+        frame = make_frame(5, f"[USER_DELTA] {delta}")
+        snapshot = None
+        for session in self.clients.sessions():
+            if session.user_delta:
+                self.send_frame(session.conn, frame)
+                continue
+            # client lama hanya mengerti [USER_LIST]: snapshot lengkap,
+            # dibuat sekali untuk semuanya
+            if snapshot is None:
+                user_list = ",".join(self.clients.nicknames())
+                snapshot = make_frame(5, f"[USER_LIST] {user_list}")
+            self.send_frame(session.conn, snapshot)
+
+    def track_idle(self, client, session, options):
+        # Client dengan heartbeat dipantau lewat timer wheel. Client lama
+        # tidak mengenal PING, jadi koneksinya memakai keepalive TCP supaya
+        # yang setengah terbuka tetap diputus kernel.
+        if options.get("ping"):
+            session.heartbeat = True
+            self.idle_wheel.schedule(client,
+                                     session.last_seen + self.ping_interval)
+        else:
+            self.enable_keepalive(client)
+
+    def enable_keepalive(self, client_socket):
+        try:
+            client_socket.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            if hasattr(socket, "TCP_KEEPIDLE"):
+                probes = 3
+                interval = max(1, (self.idle_timeout - self.ping_interval)
+                               // probes)
+                client_socket.setsockopt(socket.IPPROTO_TCP,
+                                         socket.TCP_KEEPIDLE,
+                                         self.ping_interval)
+                client_socket.setsockopt(socket.IPPROTO_TCP,
+                                         socket.TCP_KEEPINTVL, interval)
+                client_socket.setsockopt(socket.IPPROTO_TCP,
+                                         socket.TCP_KEEPCNT, probes)
+        except OSError as e:
+            logging.info(f"Gagal mengaktifkan keepalive: {e}")
+
+    def check_idle(self):
+        # Dipanggil tiap tick wheel. Entri yang jatuh tempo diperiksa:
+        # ada frame baru -> dijadwalkan ulang, diam -> PING, masih diam
+        # setelah PING -> diputus.
+        now = time.monotonic()
+        idle = []
+        try:
+            for client in self.idle_wheel.advance(now):
+                session = self.clients.session(client)
+                if session is None:
+                    continue
+                silent = now - session.last_seen
+                if silent < self.ping_interval:
+                    self.idle_wheel.schedule(
+                        client, session.last_seen + self.ping_interval)
+                elif session.streaming:
+                    self.idle_wheel.schedule(client, now + self.ping_interval)
+                elif silent < self.idle_timeout:
+                    self.send_frame(client, self.ping_frame)
+                    self.idle_wheel.schedule(
+                        client, session.last_seen + self.idle_timeout)
+                else:
+                    idle.append(client)
+            if idle:
+                self.reap_idle(idle)
+        except Exception as e:
+            logging.error(f"Error saat memeriksa client yang diam: {e}")
+
+    def start_idle_ticker(self):
+        # Satu thread yang hidup selama server berjalan menggerakkan wheel,
+        # bukan threading.Timer baru tiap tick
+        threading.Thread(target=self.idle_ticker, name="idle-wheel",
+                         daemon=True).start()
+
+    def idle_ticker(self):
+        while self.running:
+            time.sleep(self.idle_wheel.tick)
+            self.check_idle()
+
+    def reap_idle(self, clients):
+        # Semua yang habis waktunya dilepas lewat remove_client, presence
+        # mereka dikirim sebagai satu delta
+        gone = []
+        for client in clients:
+            session = self.remove_client(client, presence=False)
+            if session is not None:
+                logging.info(
+                    f"Client {session.nickname} tidak menjawab PING, koneksi diputus")  # noqa: E128
+                gone.append((session.nickname, "-"))
+        self.metrics.reaped(len(gone))
+        if gone:
+            self.presence_changes(gone)
+
+    def call_later(self, delay, callback):
+        timer = threading.Timer(delay, callback)
+        timer.daemon = True
+        timer.start()
+
+    def call_soon(self, callback, *args):
+        # Menjalankan callback di konteks server; di sini langsung di thread
+        # pemanggil, AsyncChatServer memindahkannya ke event loop
+        callback(*args)
 
-    def update_user_list(self):
-        user_list = ",".join(self.clients.values())
-        for c in self.clients.keys():
-            self.send_text(c, 5, f"[USER_LIST] {user_list}")
+    def run_blocking(self, done, func, *args):
+        # Kerja disk yang lama (menghash isi file), lalu done(hasil). Di
+        # sini langsung di thread pembaca client; AsyncChatServer
+        # menjalankan func di thread pool supaya event loop tidak tertahan
+        done(func(*args))
 
 
 if __name__ == '__main__':
     host = input("Server IP Default (127.0.0.1) : ").strip() or "127.0.0.1"
     port = input("Port Default (65432) : ").strip() or 65432
-    server = ChatServer(host=host, port=port)
+    server = ChatServer(host=host, port=port,
+                        metrics_port=os.environ.get("CHAT_METRICS_PORT"),
+                        **env_settings())
     server.start()
@@ -0,0 +1,111 @@
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import time
+
+LOG_FILE = "server.log"
+LOG_MAX_BYTES = 10 * 1024 * 1024
+LOG_BACKUPS = 5
+# Record yang belum ditulis; kalau penuh (disk macet) record baru dibuang
+# daripada menahan thread client
+LOG_QUEUE_SIZE = 10000
+TEXT_FORMAT = "[%(asctime)s] [%(levelname)s] %(message)s"
+
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    # Satu objek JSON per baris
+    def format(self, record):
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S",
+                                  time.localtime(record.created))
+            + f".{int(record.msecs):03d}",
+            "level": record.levelname,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    # Di thread trafik hanya ada put_nowait; format dan I/O dikerjakan
+    # thread listener
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Pesan di repo ini f-string tanpa args, jadi cukup getMessage;
+        # tidak perlu memformat ulang record seperti QueueHandler bawaan
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def file_handler(path, max_bytes, when):
+    # when ("midnight", "H", ...) = rotasi per waktu, selain itu per ukuran
+    if when:
+        return logging.handlers.TimedRotatingFileHandler(
+            path, when=when, backupCount=LOG_BACKUPS, encoding="utf-8")
+    return logging.handlers.RotatingFileHandler(
+        path, maxBytes=max_bytes, backupCount=LOG_BACKUPS, encoding="utf-8")
+
+
+def setup_logging(path=LOG_FILE, json_mode=False, max_bytes=LOG_MAX_BYTES,
+                  when=None):
+    # Root logger hanya diberi QueueHandler; file dan terminal ditulis oleh
+    # QueueListener di thread tersendiri. Dipanggil lagi tidak apa-apa.
+    global _listener
+    if _listener is not None:
+        return
+    to_file = file_handler(path, max_bytes, when)
+    to_file.setFormatter(JsonFormatter() if json_mode
+                         else logging.Formatter(TEXT_FORMAT))
+    to_console = logging.StreamHandler()
+    to_console.setFormatter(logging.Formatter(TEXT_FORMAT))
+    handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    root = logging.getLogger()
+    root.setLevel(logging.INFO)
+    for old in root.handlers[:]:
+        root.removeHandler(old)
+    root.addHandler(handler)
+    _listener = logging.handlers.QueueListener(
+        handler.queue, to_file, to_console)
+    _listener.start()
+
+
+def stop_logging():
+    # Menulis sisa antrian sebelum proses berhenti (os._exit tidak
+    # menjalankan atexit)
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def log_dropped():
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, DroppingQueueHandler):
+            return handler.dropped
+    return 0
+
+
+def env_settings():
+    # CHAT_LOG_JSON=1, CHAT_LOG_MAX_MB=<n>, CHAT_LOG_ROTATE=midnight|H|...
+    settings = {"log_json": os.environ.get("CHAT_LOG_JSON") == "1",
+                "log_when": os.environ.get("CHAT_LOG_ROTATE") or None}
+    if os.environ.get("CHAT_LOG_MAX_MB"):
+        settings["log_max_bytes"] = int(
+            float(os.environ["CHAT_LOG_MAX_MB"]) * 1024 * 1024)
+    return settings
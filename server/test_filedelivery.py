@@ -0,0 +1,128 @@
+import hashlib
+import json
+import logging
+import os
+import socket
+import struct
+import tempfile
+import threading
+import time
+import unittest
+
+from async_server import AsyncChatServer
+from protocol import FILE_DATA, FILE_GET
+from server import ChatServer
+
+HEADER = struct.Struct("!II")
+
+
+class FileDeliveryTest(unittest.TestCase):
+    # Server asli (thread dan asyncio) di port acak, diajak bicara lewat
+    # socket mentah seperti client versi lama. Satu direktori sementara
+    # untuk history dan received_files; thread server daemon, ikut mati
+    # bersama proses test.
+    @classmethod
+    def setUpClass(cls):
+        logging.disable(logging.INFO)
+        cls.cwd = os.getcwd()
+        cls.tmp = tempfile.TemporaryDirectory()
+        os.chdir(cls.tmp.name)
+        cls.ports = {}
+        for engine in (ChatServer, AsyncChatServer):
+            server = engine("127.0.0.1", 0)
+            server.console = False
+            threading.Thread(target=server.start, daemon=True).start()
+            deadline = time.monotonic() + 5
+            while not server.running and time.monotonic() < deadline:
+                time.sleep(0.01)
+            cls.ports[engine] = server.server_socket.getsockname()[1]
+
+    @classmethod
+    def tearDownClass(cls):
+        os.chdir(cls.cwd)
+        cls.tmp.cleanup()
+        logging.disable(logging.NOTSET)
+
+    def connect(self, engine, nickname):
+        sock = socket.create_connection(("127.0.0.1", self.ports[engine]))
+        sock.settimeout(5)
+        self.addCleanup(sock.close)
+        self.assertEqual(self.recv_exact(sock, 4), b"NICK")
+        sock.sendall(nickname.encode())
+        # pengumuman bergabung milik sendiri: session sudah terdaftar
+        joined = f"{nickname} Bergabung dalam obrolan".encode()
+        while self.wait_message(sock, b"SERVER") != joined:
+            pass
+        return sock
+
+    def recv_exact(self, sock, n):
+        data = b""
+        while len(data) < n:
+            more = sock.recv(n - len(data))
+            if not more:
+                self.fail("koneksi ditutup server")
+            data += more
+        return data
+
+    def wait_frame(self, sock, wanted):
+        # lewati pesan sistem, daftar user, dan sejenisnya
+        while True:
+            header = self.recv_exact(sock, HEADER.size)
+            msg_type, length = HEADER.unpack(header)
+            body = self.recv_exact(sock, length)
+            if msg_type == wanted:
+                return body
+
+    def wait_message(self, sock, sender):
+        # pesan teks "waktu|pengirim|isi"; pengumuman SERVER dilewati
+        while True:
+            _, name, message = self.wait_frame(sock, 1).split(b"|", 2)
+            if name == sender:
+                return message
+
+    def send(self, sock, msg_type, body):
+        sock.sendall(HEADER.pack(msg_type, len(body)) + body)
+
+    def check_engine(self, engine):
+        sender = self.connect(engine, "old")
+        other = self.connect(engine, "old2")
+        # upload tipe 3 file kosong: semua client lama menerima frame
+        # tipe 3 tanpa isi, tidak ada yang diputus
+        self.send(sender, 3, b"empty.txt|")
+        for sock in (sender, other):
+            self.assertEqual(self.wait_frame(sock, 3), b"old|empty.txt|")
+        # FILE_GET file kosong: FILE_DATA hanya berisi digest
+        digest = hashlib.sha256(b"").digest()
+        request = json.dumps({"hash": digest.hex(), "offset": 0}).encode()
+        self.send(other, FILE_GET, request)
+        self.assertEqual(self.wait_frame(other, FILE_DATA), digest)
+        # koneksi masih hidup setelah itu
+        self.send(other, 1, b"masih ada")
+        self.assertEqual(self.wait_message(sender, b"old2"), b"masih ada")
+
+    def check_complete_part(self, engine):
+        # download dilanjutkan dari offset == ukuran file (.part client
+        # sudah lengkap): FILE_DATA hanya berisi digest
+        sock = self.connect(engine, "resume")
+        self.send(sock, 3, b"full.txt|isi file")
+        self.wait_frame(sock, 3)
+        digest = hashlib.sha256(b"isi file").digest()
+        request = json.dumps({"hash": digest.hex(), "offset": 8}).encode()
+        self.send(sock, FILE_GET, request)
+        self.assertEqual(self.wait_frame(sock, FILE_DATA), digest)
+        # offset sebelum akhir file tetap mengirim sisanya
+        request = json.dumps({"hash": digest.hex(), "offset": 4}).encode()
+        self.send(sock, FILE_GET, request)
+        self.assertEqual(self.wait_frame(sock, FILE_DATA), digest + b"file")
+
+    def test_thread_engine(self):
+        self.check_engine(ChatServer)
+        self.check_complete_part(ChatServer)
+
+    def test_async_engine(self):
+        self.check_engine(AsyncChatServer)
+        self.check_complete_part(AsyncChatServer)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import os
+import tempfile
+import unittest
+
+from history import History, RECORD
+
+
+class HistoryTest(unittest.TestCase):
+    # Segment dan index kecil supaya rotasi dan pembacaan per blok index
+    # terjadi dengan beberapa puluh record saja
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = tmp.name
+
+    def open(self, **kwargs):
+        kwargs.setdefault("index_every", 4)
+        history = History(self.root, **kwargs)
+        self.addCleanup(self.close, history)
+        return history
+
+    def close(self, history):
+        history.log_file.close()
+        history.idx_file.close()
+
+    def bodies(self, records):
+        return [bytes(body).decode() for _, _, _, body in records]
+
+    def test_replay_limit_and_since(self):
+        history = self.open()
+        for i in range(1, 21):
+            self.assertEqual(history.append(1, f"m{i}"), i)
+        records, last_seq, truncated = history.replay("a", limit=5)
+        self.assertEqual(self.bodies(records), ["m16", "m17", "m18", "m19",
+                                                "m20"])
+        self.assertEqual(last_seq, 20)
+        self.assertTrue(truncated)
+        records, _, truncated = history.replay("a", since=17, limit=5)
+        self.assertEqual([seq for seq, *_ in records], [18, 19, 20])
+        self.assertFalse(truncated)
+        records, _, truncated = history.replay("a", since=20)
+        self.assertEqual(records, [])
+        self.assertFalse(truncated)
+
+    def test_limit_counts_visible_records_only(self):
+        history = self.open()
+        history.append(1, "publik")
+        history.append(2, "untuk a", audience=("b", "a"))
+        for i in range(10):
+            history.append(2, f"bukan untuk a {i}", audience=("b", "c"))
+            history.append(1, f"room {i}", audience=("#dev",))
+        records, _, truncated = history.replay("a", limit=2)
+        self.assertEqual(self.bodies(records), ["publik", "untuk a"])
+        self.assertFalse(truncated)
+        records, _, _ = history.replay("a", limit=2, only=b"#dev")
+        self.assertEqual(self.bodies(records), ["room 8", "room 9"])
+
+    def test_recover_truncated_tail(self):
+        history = self.open()
+        for i in range(1, 4):
+            history.append(1, f"m{i}")
+        self.close(history)
+        log_path = history.segments[-1].log_path
+        size = os.path.getsize(log_path)
+        # server mati di tengah menulis record ke-3
+        with open(log_path, "r+b") as f:
+            f.truncate(size - 2)
+        history = self.open()
+        self.assertEqual(history.last_seq, 2)
+        self.assertEqual(os.path.getsize(log_path),
+                         2 * (RECORD.size + 2))
+        self.assertEqual(history.append(1, "baru"), 3)
+        records, _, _ = history.replay("a")
+        self.assertEqual(self.bodies(records), ["m1", "m2", "baru"])
+
+    def test_recover_partial_header(self):
+        history = self.open()
+        history.append(1, "m1")
+        self.close(history)
+        with open(history.segments[-1].log_path, "ab") as f:
+            f.write(b"\x00" * (RECORD.size - 1))
+        history = self.open()
+        self.assertEqual(history.last_seq, 1)
+        self.assertEqual(history.append(1, "m2"), 2)
+
+    def test_reopen_keeps_seq(self):
+        history = self.open()
+        for i in range(10):
+            history.append(1, f"m{i}")
+        self.close(history)
+        history = self.open()
+        self.assertEqual(history.last_seq, 10)
+        self.assertEqual(len(history.replay("a", limit=100)[0]), 10)
+
+    def test_retention_marks_truncated(self):
+        history = self.open(segment_bytes=64, max_segments=2)
+        for i in range(1, 31):
+            history.append(1, f"pesan {i:02d}")
+        self.assertEqual(len(history.segments), 2)
+        oldest = history.segments[0].first_seq
+        records, _, truncated = history.replay("a", since=1, limit=100)
+        self.assertEqual(records[0][0], oldest)
+        self.assertEqual(records[-1][0], 30)
+        self.assertTrue(truncated)
+
+    def test_external_seq(self):
+        # seq dari hub cluster dipakai kalau lebih besar dari seq terakhir
+        history = self.open()
+        self.assertEqual(history.append(1, "a", seq=10), 10)
+        self.assertEqual(history.append(1, "b", seq=5), 11)
+
+
+if __name__ == '__main__':
+    unittest.main()
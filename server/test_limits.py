@@ -0,0 +1,182 @@
+import socket
+import threading
+import unittest
+from unittest import mock
+
+import limits
+from limits import (DEFAULT_MAX_FRAME, MAX_FRAME, NOTICE_INTERVAL, Limits,
+                    TokenBucket)
+from protocol import (CHUNK_SIZE, COMPRESSED, FILE_CHUNK, HEADER,
+                      discard_exact, recv_exact)
+from registry import Session
+from server import ChatServer
+
+
+class Clock:
+    # pengganti time.monotonic yang hanya maju kalau digeser test
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+class LimitsTestCase(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        patcher = mock.patch.object(limits, "time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class TokenBucketTest(LimitsTestCase):
+    def test_burst_then_wait(self):
+        bucket = TokenBucket(rate=10, burst=5)
+        for _ in range(5):
+            self.assertEqual(bucket.take(), 0.0)
+        # token boleh minus: waktu tunggu sampai utangnya lunas
+        self.assertAlmostEqual(bucket.take(), 0.1)
+        self.assertAlmostEqual(bucket.take(), 0.2)
+
+    def test_refill_capped_at_burst(self):
+        bucket = TokenBucket(rate=10, burst=5)
+        bucket.take(5)
+        self.clock.now += 60
+        self.assertEqual(bucket.take(5), 0.0)
+        self.assertAlmostEqual(bucket.take(), 0.1)
+
+    def test_debt_repaid_over_time(self):
+        bucket = TokenBucket(rate=100, burst=100)
+        self.assertAlmostEqual(bucket.take(300), 2.0)
+        self.clock.now += 2.0
+        self.assertEqual(bucket.take(0), 0.0)
+
+
+class LimiterTest(LimitsTestCase):
+    def test_max_frame(self):
+        config = Limits(max_frame={1: 10})
+        self.assertEqual(config.max_frame(1), 10)
+        self.assertEqual(config.max_frame(1 | COMPRESSED), 10)
+        self.assertEqual(config.max_frame(2), MAX_FRAME[2])
+        self.assertEqual(config.max_frame(99), DEFAULT_MAX_FRAME)
+        # override tidak mengubah tabel bawaan
+        self.assertEqual(Limits().max_frame(1), MAX_FRAME[1])
+
+    def test_chunks_only_use_byte_bucket(self):
+        limiter = Limits(messages_per_sec=1, message_burst=1).limiter()
+        self.assertEqual(limiter.throttle(1, 10), 0.0)
+        for _ in range(10):
+            self.assertEqual(limiter.throttle(FILE_CHUNK, 10), 0.0)
+        self.assertAlmostEqual(limiter.throttle(1, 10), 1.0)
+
+    def test_byte_bucket(self):
+        limiter = Limits(bytes_per_sec=100, byte_burst=100).limiter()
+        self.assertEqual(limiter.throttle(FILE_CHUNK, 100), 0.0)
+        self.assertAlmostEqual(limiter.throttle(FILE_CHUNK, 50), 0.5)
+
+    def test_notice_interval(self):
+        limiter = Limits().limiter()
+        self.assertTrue(limiter.should_notice())
+        self.assertFalse(limiter.should_notice())
+        self.clock.now += NOTICE_INTERVAL
+        self.assertTrue(limiter.should_notice())
+
+
+class AdmitFrameTest(LimitsTestCase):
+    # admit_frame milik ChatServer tanpa socket: pesan ke client dicatat
+    class Server:
+        admit_frame = ChatServer.admit_frame
+        limit_notice = ChatServer.limit_notice
+
+        def __init__(self, config):
+            self.limits = config
+            self.sent = []
+
+        def send_text(self, client, msg_type, message):
+            self.sent.append(message)
+
+    def setUp(self):
+        super().setUp()
+        self.server = self.Server(Limits(max_frame={1: 100},
+                                         messages_per_sec=1, message_burst=2))
+        self.session = Session(None, "a", None)
+        self.session.limiter = self.server.limits.limiter()
+
+    def admit(self, msg_type, length):
+        return self.server.admit_frame(None, self.session, msg_type, length)
+
+    def test_empty_and_exact_size(self):
+        self.assertEqual(self.admit(1, 0), (True, 0.0))
+        self.assertEqual(self.admit(1, 100), (True, 0.0))
+        self.assertEqual(self.server.sent, [])
+
+    def test_oversize_dropped_without_tokens(self):
+        for _ in range(3):
+            self.assertEqual(self.admit(1, 101), (False, 0.0))
+        self.assertEqual(self.session.stats.oversized, 3)
+        # tiap frame yang dibuang diberi tahu, tidak dibatasi interval
+        self.assertEqual(len(self.server.sent), 3)
+        self.assertTrue(self.server.sent[0].startswith("[LIMIT] Frame tipe 1"))
+        # bucket tidak tersentuh: dua pesan berikutnya lolos tanpa menunggu
+        self.assertEqual(self.admit(1, 10), (True, 0.0))
+        self.assertEqual(self.admit(1, 10), (True, 0.0))
+
+    def test_compressed_flag_uses_base_limit(self):
+        ok, _ = self.admit(1 | COMPRESSED, 101)
+        self.assertFalse(ok)
+
+    def test_throttled(self):
+        self.admit(1, 1)
+        self.admit(1, 1)
+        ok, wait = self.admit(1, 1)
+        self.assertTrue(ok)
+        self.assertAlmostEqual(wait, 1.0)
+        self.assertEqual(self.session.stats.throttled, 1)
+        self.assertEqual(len(self.server.sent), 1)
+        self.assertTrue(self.server.sent[0].startswith("[LIMIT] Terlalu"))
+        # pemberitahuan berikutnya ditahan sampai NOTICE_INTERVAL lewat
+        self.admit(1, 1)
+        self.assertEqual(self.session.stats.throttled, 2)
+        self.assertEqual(len(self.server.sent), 1)
+
+
+class DiscardTest(unittest.TestCase):
+    # Body frame yang ditolak dibuang dari socket; frame sesudahnya tetap
+    # terbaca utuh
+    def pair(self):
+        left, right = socket.socketpair()
+        self.addCleanup(left.close)
+        self.addCleanup(right.close)
+        return left, right
+
+    def test_discard_keeps_stream_aligned(self):
+        left, right = self.pair()
+        body = b"x" * (CHUNK_SIZE * 2 + 3)
+        # pengirim di thread lain: body lebih besar dari buffer socket
+        sender = threading.Thread(target=right.sendall, args=(
+            HEADER.pack(1, len(body)) + body + HEADER.pack(1, 2) + b"ok",))
+        sender.start()
+        self.addCleanup(sender.join)
+        _, length = HEADER.unpack(recv_exact(left, HEADER.size))
+        discard_exact(left, length)
+        msg_type, length = HEADER.unpack(recv_exact(left, HEADER.size))
+        self.assertEqual((msg_type, bytes(recv_exact(left, length))),
+                         (1, b"ok"))
+
+    def test_empty_body(self):
+        left, right = self.pair()
+        right.sendall(HEADER.pack(1, 0))
+        _, length = HEADER.unpack(recv_exact(left, HEADER.size))
+        self.assertEqual(recv_exact(left, length), b"")
+        discard_exact(left, 0)
+
+    def test_peer_closed_mid_body(self):
+        left, right = self.pair()
+        right.sendall(b"abc")
+        right.close()
+        with self.assertRaises(ConnectionError):
+            discard_exact(left, 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
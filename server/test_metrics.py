@@ -0,0 +1,22 @@
+import unittest
+
+from metrics import escape_label
+
+
+class EscapeLabelTest(unittest.TestCase):
+    # Nickname dipakai apa adanya sebagai nilai label {nickname="..."}
+    def test_plain_nickname_unchanged(self):
+        self.assertEqual(escape_label("budi"), "budi")
+
+    def test_special_characters(self):
+        self.assertEqual(escape_label('a"b'), 'a\\"b')
+        self.assertEqual(escape_label("a\\b"), "a\\\\b")
+        self.assertEqual(escape_label("a\nb"), "a\\nb")
+
+    def test_backslash_escaped_first(self):
+        # escape kutip tidak boleh ikut di-escape ulang
+        self.assertEqual(escape_label('\\"\n'), '\\\\\\"\\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
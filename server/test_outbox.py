@@ -0,0 +1,124 @@
+import asyncio
+import threading
+import unittest
+
+from outbox import (AsyncOutbox, DISCONNECT, DROP_OLDEST, STALL,
+                    STALL_FACTOR, ThreadOutbox)
+
+
+class ThreadOutboxTest(unittest.TestCase):
+    # Outbox kecil (3 frame) supaya overflow terjadi setelah beberapa put
+    def test_fifo(self):
+        outbox = ThreadOutbox(3)
+        for frame in ("a", "b", "c"):
+            self.assertTrue(outbox.put(frame))
+        self.assertEqual([outbox.get() for _ in range(3)], ["a", "b", "c"])
+        self.assertEqual(len(outbox), 0)
+
+    def test_drop_oldest(self):
+        outbox = ThreadOutbox(3, DROP_OLDEST)
+        for frame in "abcde":
+            self.assertTrue(outbox.put(frame))
+        self.assertEqual(outbox.dropped, 2)
+        self.assertEqual([outbox.get() for _ in range(3)], ["c", "d", "e"])
+
+    def test_disconnect(self):
+        outbox = ThreadOutbox(3, DISCONNECT)
+        for frame in "abc":
+            self.assertTrue(outbox.put(frame))
+        # frame yang tidak muat ditolak, isi lama tidak diubah
+        self.assertFalse(outbox.put("d"))
+        self.assertEqual(len(outbox), 3)
+        self.assertEqual(outbox.dropped, 0)
+
+    def test_stall_grows_until_factor(self):
+        outbox = ThreadOutbox(3, STALL)
+        limit = 3 * STALL_FACTOR
+        for i in range(limit):
+            self.assertTrue(outbox.put(i))
+        self.assertTrue(outbox.lagging())
+        self.assertFalse(outbox.put("lewat"))
+        self.assertEqual(len(outbox), limit)
+
+    def test_stall_reader_waits_until_drained(self):
+        outbox = ThreadOutbox(2, STALL)
+        outbox.put("a")
+        outbox.put("b")
+        resumed = threading.Event()
+
+        def reader():
+            outbox.wait_not_lagging()
+            resumed.set()
+
+        threading.Thread(target=reader, daemon=True).start()
+        self.assertFalse(resumed.wait(0.1))
+        outbox.get()
+        self.assertTrue(resumed.wait(1))
+
+    def test_close_wakes_writer(self):
+        outbox = ThreadOutbox(3)
+        got = []
+        writer = threading.Thread(target=lambda: got.append(outbox.get()))
+        writer.start()
+        outbox.close()
+        writer.join(1)
+        self.assertEqual(got, [None])
+        # put setelah close diabaikan, bukan alasan memutus koneksi
+        self.assertTrue(outbox.put("a"))
+        self.assertEqual(len(outbox), 0)
+
+    def test_unknown_policy(self):
+        with self.assertRaises(ValueError):
+            ThreadOutbox(3, "abaikan")
+
+
+class AsyncOutboxTest(unittest.TestCase):
+    # Kebijakan overflow sama dengan ThreadOutbox; yang diuji di sini event
+    # ready/roomy yang dipakai writer dan pembaca di event loop
+    def run_async(self, coro):
+        return asyncio.run(asyncio.wait_for(coro, 1))
+
+    def test_drop_oldest_and_disconnect(self):
+        async def scenario():
+            drop = AsyncOutbox(2, DROP_OLDEST)
+            for frame in "abc":
+                self.assertTrue(drop.put(frame))
+            self.assertEqual([await drop.get(), await drop.get()], ["b", "c"])
+            disconnect = AsyncOutbox(2, DISCONNECT)
+            disconnect.put("a")
+            disconnect.put("b")
+            self.assertFalse(disconnect.put("c"))
+
+        self.run_async(scenario())
+
+    def test_stall_roomy(self):
+        async def scenario():
+            outbox = AsyncOutbox(2, STALL)
+            outbox.put("a")
+            outbox.put("b")
+            self.assertFalse(outbox.roomy.is_set())
+            waiter = asyncio.ensure_future(outbox.wait_not_lagging())
+            await asyncio.sleep(0)
+            self.assertFalse(waiter.done())
+            self.assertEqual(await outbox.get(), "a")
+            await waiter
+
+        self.run_async(scenario())
+
+    def test_get_waits_for_put_and_close(self):
+        async def scenario():
+            outbox = AsyncOutbox(2)
+            getter = asyncio.ensure_future(outbox.get())
+            await asyncio.sleep(0)
+            outbox.put("a")
+            self.assertEqual(await getter, "a")
+            getter = asyncio.ensure_future(outbox.get())
+            await asyncio.sleep(0)
+            outbox.close()
+            self.assertIsNone(await getter)
+
+        self.run_async(scenario())
+
+
+if __name__ == '__main__':
+    unittest.main()
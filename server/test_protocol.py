@@ -0,0 +1,165 @@
+import os
+import unittest
+import zlib
+
+from protocol import (COMPRESS_MIN, COMPRESSED, FLAG_COMPRESSED, HEADER,
+                      V2_HEADER, VERSION_2, Batch, CompressionStats,
+                      FileFrame, compress_frame, deflate, frame_sizes,
+                      history_frame, inflate, make_frame, make_message,
+                      parse_hello, parse_v2_header, stored_file_message)
+from server import ChatServer
+
+
+class CompressionTest(unittest.TestCase):
+    # Kompresi per frame: hanya body yang cukup besar dan benar-benar
+    # mengecil yang dikirim dengan bit COMPRESSED
+    def test_round_trip(self):
+        body = b"halo semua " * 200
+        frame = make_frame(1, body)
+        header, data = compress_frame(frame)
+        msg_type, length = HEADER.unpack(header)
+        self.assertEqual(msg_type, 1 | COMPRESSED)
+        self.assertEqual(length, len(data))
+        self.assertLess(len(data), len(body))
+        self.assertEqual(inflate(data), body)
+
+    def test_small_and_empty_bodies_untouched(self):
+        for body in (b"", b"x" * (COMPRESS_MIN - 1)):
+            frame = make_frame(1, body)
+            self.assertIs(compress_frame(frame), frame)
+        self.assertEqual(make_frame(1, b"")[0], HEADER.pack(1, 0))
+
+    def test_incompressible_body_untouched(self):
+        self.assertIsNone(deflate(os.urandom(4096)))
+
+    def test_compressed_is_cached(self):
+        stats = CompressionStats()
+        frame = make_frame(1, b"a" * 4096)
+        packed = frame.compressed(stats)
+        self.assertIs(frame.compressed(stats), packed)
+        self.assertEqual(stats.calls, 1)
+        self.assertTrue(HEADER.unpack(packed[0])[0] & COMPRESSED)
+
+    def test_not_compressible(self):
+        frame = make_frame(15, b"a" * 4096, compressible=False)
+        self.assertIs(frame.compressed(), frame)
+
+    def test_inflate_limit(self):
+        data = zlib.compress(b"a" * 10000)
+        self.assertEqual(len(inflate(data, 10000)), 10000)
+        with self.assertRaises(ValueError):
+            inflate(data, 9999)
+
+    def test_inflate_invalid(self):
+        with self.assertRaises(zlib.error):
+            inflate(b"bukan zlib")
+        # stream yang terpotong juga ditolak
+        with self.assertRaises(ValueError):
+            inflate(zlib.compress(b"a" * 1000)[:-4])
+
+
+class NegotiationTest(unittest.TestCase):
+    # negotiate tidak memakai state server
+    def negotiate(self, options):
+        return ChatServer.negotiate(None, options)
+
+    def test_legacy_client(self):
+        nickname, options = parse_hello(b"budi")
+        self.assertEqual((nickname, options), ("budi", {}))
+        self.assertEqual(self.negotiate(options), (False, 1, ""))
+
+    def test_compress_requested(self):
+        nickname, options = parse_hello(b'budi\n{"compress": ["zlib"]}')
+        self.assertEqual(nickname, "budi")
+        self.assertEqual(self.negotiate(options),
+                         (True, 1, "compress=zlib"))
+
+    def test_unknown_codec_ignored(self):
+        self.assertEqual(self.negotiate({"compress": ["brotli"]}),
+                         (False, 1, ""))
+
+    def test_proto_2(self):
+        self.assertEqual(self.negotiate({"proto": 2, "compress": ["zlib"]}),
+                         (True, VERSION_2, "compress=zlib proto=2"))
+        self.assertEqual(self.negotiate({"proto": 3}), (False, 1, ""))
+
+
+class V2HeaderTest(unittest.TestCase):
+    # Frame v1 yang sama di-upgrade ke v2 untuk client yang memintanya:
+    # sender, target dan timestamp pindah ke header, body tinggal isi pesan
+    def unpack(self, frame):
+        header, names, body = frame
+        fields = parse_v2_header(header)
+        return fields, bytes(names), bytes(body)
+
+    def test_message_round_trip(self):
+        frame = make_message(2, "budi", "halo", target="ani",
+                             timestamp_ms=1700000000123)
+        frame.seq = 42
+        fields, names, body = self.unpack(frame.v2())
+        self.assertEqual(fields, (2, 42, 1700000000123, 4, 3, 4))
+        self.assertEqual(names, b"budiani")
+        self.assertEqual(body, b"halo")
+        self.assertIs(frame.v2(), frame.v2())
+        # body v1 tidak berubah
+        self.assertTrue(frame[1].endswith(b"|budi|halo"))
+
+    def test_first_byte_tells_version(self):
+        v1 = make_message(1, "budi", "halo")
+        self.assertIn(v1[0][0], (0x00, 0x80))
+        self.assertEqual(v1.v2()[0][0], VERSION_2)
+        self.assertEqual(len(v1.v2()[0]), V2_HEADER.size)
+
+    def test_empty_message(self):
+        fields, names, body = self.unpack(make_message(1, "budi", "").v2())
+        self.assertEqual(fields[-1], 0)
+        self.assertEqual((names, body), (b"budi", b""))
+
+    def test_plain_frame_without_fields(self):
+        fields, names, body = self.unpack(make_frame(5, "[INFO] x").v2())
+        self.assertEqual(fields, (5, 0, 0, 0, 0, 8))
+        self.assertEqual((names, body), (b"", b"[INFO] x"))
+
+    def test_compressed_flag(self):
+        frame = make_message(1, "budi", "halo " * 500)
+        packed = frame.v2().compressed()
+        fields, names, body = self.unpack(packed)
+        self.assertEqual(fields[0], 1 | COMPRESSED)
+        self.assertEqual(V2_HEADER.unpack(packed[0])[1], FLAG_COMPRESSED)
+        self.assertEqual(names, b"budi")
+        self.assertEqual(inflate(body), b"halo " * 500)
+
+    def test_history_frame(self):
+        original = make_message(1, "budi", "halo|dunia",
+                                timestamp_ms=1700000000000)
+        frame = history_frame(7, 1, original[1])
+        fields, names, body = self.unpack(frame.v2())
+        self.assertEqual(fields[:3], (1, 7, 1700000000000))
+        self.assertEqual((names, body), (b"budi", b"halo|dunia"))
+
+    def test_file_frames(self):
+        frame = stored_file_message(3, "budi", "a.txt", "/tidak/dibuka", 10,
+                                    VERSION_2)
+        fields = parse_v2_header(frame.head[:V2_HEADER.size])
+        self.assertEqual(fields[0], 3)
+        self.assertEqual(fields[3:], (4, 5, 10))
+        self.assertEqual(frame.head[V2_HEADER.size:], b"budia.txt")
+        v1 = stored_file_message(3, "budi", "a.txt", "/tidak/dibuka", 10)
+        self.assertEqual(v1.head, HEADER.pack(3, 21) + b"budi|a.txt|")
+        self.assertEqual(frame_sizes(v1), [(3, len(v1.head) + 10)])
+        empty = FileFrame(11, b"d" * 32, None, 0, VERSION_2)
+        self.assertEqual(parse_v2_header(empty.head[:V2_HEADER.size])[-1], 32)
+
+    def test_frame_sizes(self):
+        a = make_message(1, "budi", "halo")
+        b = make_frame(5, "[INFO] x")
+        self.assertEqual(frame_sizes(Batch([a, b])),
+                         [(1, len(a[0]) + len(a[1])), (5, HEADER.size + 8)])
+        batch = Batch([a.v2(), b.v2()], VERSION_2)
+        self.assertEqual(frame_sizes(batch),
+                         [(1, V2_HEADER.size + 4 + 4),
+                          (5, V2_HEADER.size + 8)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import asyncio
+import unittest
+
+from registry import DEFAULT_ROOM, MAX_ROOMS, NicknameTaken, Registry
+
+
+class RegistryTest(unittest.TestCase):
+    # Koneksi cukup objek apa saja yang hashable; outbox tidak dipakai
+    # registry sehingga diisi None
+    def registry(self, *nicknames):
+        registry = Registry()
+        conns = {}
+        for nickname in nicknames:
+            conns[nickname] = object()
+            registry.add(conns[nickname], nickname, None)
+        return registry, conns
+
+    def test_indexes_both_ways(self):
+        registry, conns = self.registry("a", "b")
+        self.assertEqual(len(registry), 2)
+        self.assertIn(conns["a"], registry)
+        self.assertEqual(registry.nickname(conns["b"]), "b")
+        self.assertIs(registry.find("a").conn, conns["a"])
+        self.assertIs(registry.session(conns["a"]), registry.find("a"))
+        self.assertIsNone(registry.find("c"))
+        self.assertIsNone(registry.nickname(object()))
+
+    def test_nickname_taken(self):
+        registry, conns = self.registry("a")
+        with self.assertRaises(NicknameTaken):
+            registry.add(object(), "a", None)
+        self.assertEqual(len(registry), 1)
+        self.assertIs(registry.find("a").conn, conns["a"])
+
+    def test_add_async(self):
+        registry = Registry()
+        conn = object()
+        session = asyncio.run(registry.add_async(conn, "a", None))
+        self.assertIs(registry.find("a"), session)
+
+    def test_remove_frees_nickname_and_rooms(self):
+        registry, conns = self.registry("a", "b")
+        registry.join(conns["a"], "dev")
+        session = registry.remove(conns["a"])
+        self.assertEqual(session.nickname, "a")
+        self.assertIsNone(registry.find("a"))
+        self.assertNotIn(conns["a"], registry)
+        # room yang kosong ikut hilang dari indeks
+        self.assertEqual(registry.room_sizes(), {DEFAULT_ROOM: 1})
+        self.assertIsNone(registry.remove(conns["a"]))
+        registry.add(object(), "a", None)
+        self.assertEqual(sorted(registry.nicknames()), ["a", "b"])
+
+    def test_default_room(self):
+        registry, conns = self.registry("a", "b")
+        self.assertEqual(registry.find("a").room, DEFAULT_ROOM)
+        self.assertEqual(set(registry.members(DEFAULT_ROOM)),
+                         {conns["a"], conns["b"]})
+
+    def test_join_and_leave(self):
+        registry, conns = self.registry("a", "b")
+        self.assertTrue(registry.join(conns["a"], "dev"))
+        # sudah anggota: hanya jadi room aktif
+        self.assertFalse(registry.join(conns["a"], "dev"))
+        session = registry.find("a")
+        self.assertEqual(session.room, "dev")
+        self.assertEqual(registry.members("dev"), [conns["a"]])
+        self.assertEqual(registry.room_sizes(),
+                         {DEFAULT_ROOM: 2, "dev": 1})
+        self.assertTrue(registry.leave(conns["a"], "dev"))
+        self.assertFalse(registry.leave(conns["a"], "dev"))
+        self.assertEqual(session.room, DEFAULT_ROOM)
+        self.assertEqual(registry.members("dev"), [])
+
+    def test_leave_default_room_picks_another(self):
+        registry, conns = self.registry("a")
+        registry.join(conns["a"], "zeta")
+        registry.join(conns["a"], "alpha")
+        registry.leave(conns["a"], DEFAULT_ROOM)
+        registry.leave(conns["a"], "alpha")
+        self.assertEqual(registry.find("a").room, "zeta")
+        registry.leave(conns["a"], "zeta")
+        self.assertIsNone(registry.find("a").room)
+
+    def test_room_limit(self):
+        registry, conns = self.registry("a")
+        for i in range(MAX_ROOMS - 1):
+            registry.join(conns["a"], f"room{i}")
+        with self.assertRaises(ValueError):
+            registry.join(conns["a"], "satu lagi")
+
+    def test_join_unknown_connection(self):
+        registry = Registry()
+        self.assertFalse(registry.join(object(), "dev"))
+        self.assertEqual(registry.room_sizes(), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import random
+import unittest
+
+from timerwheel import TimerWheel
+
+
+class TimerWheelTest(unittest.TestCase):
+    # Wheel kecil (4 slot, 3 level: jangkauan 64 tick) supaya cascade dari
+    # level 1 dan 2 terjadi dalam beberapa puluh tick. Waktu dimulai dari 0
+    # dan advance dipanggil per tick, seperti check_idle.
+    def wheel(self):
+        wheel = TimerWheel(tick=1.0, slots=4, levels=3)
+        wheel.started = 0.0
+        return wheel
+
+    def run_until(self, wheel, last_tick):
+        # tick -> key yang keluar di tick itu
+        fired = {}
+        for tick in range(1, last_tick + 1):
+            for key in wheel.advance(float(tick)):
+                fired.setdefault(tick, []).append(key)
+        return fired
+
+    def test_expires_on_deadline_tick(self):
+        wheel = self.wheel()
+        wheel.schedule("a", 2.5)
+        self.assertEqual(self.run_until(wheel, 5), {3: ["a"]})
+        self.assertEqual(len(wheel), 0)
+
+    def test_cascade_from_upper_levels(self):
+        wheel = self.wheel()
+        # 6 dan 13 di level 1, 40 di level 2: turun ke level di bawahnya
+        # sebelum keluar tepat di tick-nya
+        for key, deadline in (("l1", 5.0), ("l1b", 12.0), ("l2", 39.0)):
+            wheel.schedule(key, deadline)
+        fired = self.run_until(wheel, 64)
+        self.assertEqual(fired, {6: ["l1"], 13: ["l1b"], 40: ["l2"]})
+
+    def test_deadline_beyond_range_is_clamped(self):
+        wheel = self.wheel()
+        wheel.schedule("far", 1000.0)
+        fired = self.run_until(wheel, 100)
+        self.assertEqual(fired, {63: ["far"]})
+
+    def test_cancel(self):
+        wheel = self.wheel()
+        wheel.schedule("a", 3.0)
+        wheel.schedule("b", 20.0)
+        wheel.cancel("a")
+        wheel.cancel("b")
+        wheel.cancel("missing")
+        self.assertEqual(len(wheel), 0)
+        self.assertEqual(self.run_until(wheel, 64), {})
+
+    def test_reschedule_replaces_deadline(self):
+        wheel = self.wheel()
+        wheel.schedule("later", 3.0)
+        wheel.schedule("later", 30.0)
+        wheel.schedule("sooner", 30.0)
+        wheel.schedule("sooner", 3.0)
+        self.assertEqual(len(wheel), 2)
+        fired = self.run_until(wheel, 64)
+        self.assertEqual(fired, {4: ["sooner"], 31: ["later"]})
+
+    def test_reschedule_while_advancing(self):
+        # seperti check_idle: key yang keluar langsung dijadwalkan lagi
+        wheel = self.wheel()
+        wheel.schedule("a", 7.0)
+        fired = []
+        for tick in range(1, 40):
+            for key in wheel.advance(float(tick)):
+                fired.append(tick)
+                wheel.schedule(key, tick + 7.0)
+        self.assertEqual(fired, [8, 16, 24, 32])
+
+    def test_past_deadline_fires_on_next_tick(self):
+        wheel = self.wheel()
+        self.run_until(wheel, 10)
+        wheel.schedule("late", 2.0)
+        self.assertEqual(wheel.advance(11.0), ["late"])
+
+    def test_random_schedule_matches_deadlines(self):
+        rng = random.Random(1)
+        wheel = self.wheel()
+        expected = {}
+        for key in range(300):
+            deadline = rng.uniform(0, 63)
+            wheel.schedule(key, deadline)
+            expected[key] = int(deadline) + 1
+        for key in rng.sample(range(300), 50):
+            wheel.cancel(key)
+            del expected[key]
+        fired = {}
+        for tick, keys in self.run_until(wheel, 64).items():
+            for key in keys:
+                fired[key] = tick
+        self.assertEqual(fired, expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import threading
+import time
+
+WHEEL_SLOTS = 64
+WHEEL_LEVELS = 3
+
+
+class TimerWheel:
+    # Timer wheel bertingkat untuk timeout ribuan koneksi. Satu entri per
+    # key, bukan satu Timer per koneksi: schedule/cancel O(1), advance
+    # hanya menyentuh slot yang lewat. Level 0 berisi slot per tick, level
+    # berikutnya per slots^level tick dan diturunkan (cascade) ke level di
+    # bawahnya saat gilirannya tiba. Jangkauan maksimal slots^levels tick
+    # (64^3 detik dengan tick 1 detik), lebih jauh dari itu dipotong.
+    def __init__(self, tick=1.0, slots=WHEEL_SLOTS, levels=WHEEL_LEVELS):
+        self.tick = tick
+        self.slots = slots
+        self.wheels = [[{} for _ in range(slots)] for _ in range(levels)]
+        self.where = {}  # key -> slot (dict) tempatnya sekarang
+        self.current = 0  # tick terakhir yang sudah diproses
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.where)
+
+    def schedule(self, key, deadline):
+        # deadline dalam detik time.monotonic(); jadwal lama key diganti
+        expires = int((deadline - self.started) / self.tick) + 1
+        with self.lock:
+            self.remove(key)
+            self.place(key, max(expires, self.current + 1))
+
+    def cancel(self, key):
+        with self.lock:
+            self.remove(key)
+
+    def advance(self, now=None):
+        # Key yang deadline-nya sudah lewat, dikeluarkan dari wheel
+        now = time.monotonic() if now is None else now
+        target = int((now - self.started) / self.tick)
+        expired = []
+        with self.lock:
+            while self.current < target:
+                self.current += 1
+                self.cascade()
+                slot = self.wheels[0][self.current % self.slots]
+                for key in slot:
+                    del self.where[key]
+                expired.extend(slot)
+                slot.clear()
+        return expired
+
+    def place(self, key, expires):
+        delta = expires - self.current
+        last = len(self.wheels) - 1
+        level = 0
+        while level < last and delta >= self.slots ** (level + 1):
+            level += 1
+        if delta >= self.slots ** (last + 1):
+            expires = self.current + self.slots ** (last + 1) - 1
+        slot = self.wheels[level][(expires // self.slots ** level)
+                                  % self.slots]
+        slot[key] = expires
+        self.where[key] = slot
+
+    def remove(self, key):
+        slot = self.where.pop(key, None)
+        if slot is not None:
+            del slot[key]
+
+    def cascade(self):
+        # Level atas dulu: entri yang turun dari level 2 bisa jatuh ke slot
+        # level 1 yang diturunkan di tick yang sama
+        for level in range(len(self.wheels) - 1, 0, -1):
+            span = self.slots ** level
+            if self.current % span:
+                continue
+            slot = self.wheels[level][(self.current // span) % self.slots]
+            entries = list(slot.items())
+            slot.clear()
+            for key, expires in entries:
+                self.place(key, expires)
@@ -0,0 +1,29 @@
+import time
+
+
+class Transfer:
+    # Satu upload bertahap: potongan langsung ditulis ke FileStore,
+    # jadi memori yang dipakai hanya sebesar satu potongan.
+    def __init__(self, sender, file_name, size, upload,
+                 private=False, target=None, room=None):
+        self.sender = sender
+        self.file_name = file_name
+        self.size = size
+        self.upload = upload
+        self.private = private
+        self.target = target
+        self.room = room
+        self.started_at = time.perf_counter()
+
+    def write(self, chunk):
+        self.upload.write(chunk)
+
+    def finish(self):
+        return self.upload.commit()
+
+    def abort(self):
+        self.upload.discard()
+
+    def suspend(self):
+        # koneksi putus: upload dengan hash disimpan untuk dilanjutkan
+        self.upload.suspend()